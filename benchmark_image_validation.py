@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+图片校验性能对比脚本
+
+对比上传时用Pillow完整打开并verify图片（原有方式）与只解析文件头（users.image_sniffing）的耗时。
+
+用法: python benchmark_image_validation.py [--repeat 200]
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import django
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 设置Django环境
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangotutorial.settings')
+django.setup()
+
+from PIL import Image
+from users.image_sniffing import validate_image_header, get_sniff_bytes
+
+
+def make_samples():
+    """生成不同格式和尺寸的测试图片"""
+    samples = []
+    for width, height in [(640, 480), (1920, 1080), (4000, 3000)]:
+        image = Image.effect_noise((width, height), 40).convert('RGB')
+        for image_format in ['JPEG', 'PNG', 'GIF', 'WEBP']:
+            buffer = io.BytesIO()
+            image.save(buffer, format=image_format)
+            samples.append((f'{image_format} {width}x{height}', buffer.getvalue()))
+    return samples
+
+
+def pil_verify(data):
+    """原有方式：Image.open + verify（BinaryImageUploadSerializer、RawBinaryImageUploadView）"""
+    img = Image.open(io.BytesIO(data))
+    img.verify()
+
+
+def django_image_field(data):
+    """DRF ImageField 的方式：Django forms.ImageField 打开、verify 后再次打开读取格式"""
+    img = Image.open(io.BytesIO(data))
+    img.verify()
+    Image.open(io.BytesIO(data)).format
+
+
+def sniff(data):
+    """新方式：只解析文件头"""
+    validate_image_header(data[:get_sniff_bytes()])
+
+
+def measure(func, data, repeat):
+    """返回单次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(data)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片校验性能对比')
+    parser.add_argument('--repeat', type=int, default=200, help='每项测试的重复次数')
+    args = parser.parse_args()
+
+    print(f"{'图片':<20}{'大小':>10}{'PIL verify':>14}{'ImageField':>14}{'文件头解析':>12}{'加速比':>10}")
+    for name, data in make_samples():
+        verify_us = measure(pil_verify, data, args.repeat)
+        field_us = measure(django_image_field, data, args.repeat)
+        sniff_us = measure(sniff, data, args.repeat)
+        print(f"{name:<20}{len(data) // 1024:>8}KB{verify_us:>12.1f}us{field_us:>12.1f}us{sniff_us:>10.1f}us{verify_us / sniff_us:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -19,6 +19,9 @@ python manage.py collectstatic --noinput
 # 数据库迁移
 python manage.py migrate
 
+# 创建数据库缓存表（CACHES 中的 shared 缓存）
+python manage.py createcachetable
+
 # 停止现有的Gunicorn进程
 if [ -f logs/gunicorn.pid ]; then
     kill -TERM $(cat logs/gunicorn.pid)
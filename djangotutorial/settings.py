@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # 添加CORS中间件
+    'users.middleware.RequestSizeLimitMiddleware',  # 按接口限制请求体大小，超过时不读取请求体直接返回413
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -83,6 +85,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # 测试使用文件数据库：内存数据库的共享缓存模式遇到锁时直接报错，无法测试并发请求
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -131,7 +135,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework 设置
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -172,9 +176,62 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_SAMESITE': 'Lax',  # SameSite 策略
 }
 
+# refresh token 撤销记录（刷新轮换和登出时撤销，保存在共享缓存中，TTL为令牌剩余有效期）
+TOKEN_BLACKLIST_CACHE_ALIAS = 'shared'  # 撤销记录使用的缓存，必须是多进程共享的缓存（系统检查 users.E001）
+TOKEN_BLACKLIST_SYNC_INTERVAL = 1  # 每个进程同步其他进程撤销记录的间隔（秒）
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 100000  # 进程内布隆过滤器的初始容量
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.01  # 布隆过滤器的误判率
+
 # 短信验证码设置
 SMS_CODE_EXPIRE_MINUTES = 5  # 验证码有效期（分钟）
 SMS_CODE_LENGTH = 6  # 验证码长度
+# 验证码存储：users.sms_codes.DatabaseSmsCodeStore（SmsCode表）/ users.sms_codes.CacheSmsCodeStore（共享缓存，生产环境建议使用Redis）
+SMS_CODE_STORE = 'users.sms_codes.DatabaseSmsCodeStore'
+SMS_CODE_CACHE_ALIAS = 'shared'  # CacheSmsCodeStore 使用的缓存，必须是多进程共享的缓存（系统检查 users.E001）
+# 发送验证码的滑动窗口限流：[(次数, 窗口秒数), ...]，计数保存在 RateLimitCounter 表中
+SMS_RATE_LIMITS = {
+    'phone': [(1, 60), (5, 3600), (10, 86400)],  # 每个手机号每分钟1次、每小时5次、每天10次
+    'ip': [(20, 3600), (100, 86400)],  # 每个IP每小时20次、每天100次
+}
+
+# 短信异步发送（发送验证码接口只写入队列，不等待短信网关）
+SMS_PROVIDER = 'users.sms_dispatch.StubSmsProvider'  # 短信服务商，自定义服务商继承 users.sms_dispatch.BaseSmsProvider
+SMS_DISPATCH_WORKER = 'local'  # local：当前进程的线程池发送；command：由 run_sms_worker 命令发送
+SMS_DISPATCH_LOCAL_WORKERS = 1  # local 模式下每个worker进程的发送线程数
+SMS_DISPATCH_BATCH_SIZE = 100  # 每次领取的短信条数（按模板分组后批量发送）
+SMS_DISPATCH_MAX_ATTEMPTS = 5  # 每条短信最多发送次数
+SMS_DISPATCH_RETRY_BASE_DELAY = 2  # 重试退避的基准时间（秒）
+SMS_DISPATCH_RETRY_MAX_DELAY = 60  # 单次重试等待上限（秒）
+SMS_MESSAGE_RETENTION_DAYS = 7  # purge_sms_messages 删除多少天之前已发送或失败的短信记录
+SMS_DISPATCH_STALE_TIMEOUT = 300  # 发送中超过多久视为worker已退出，可被重新领取（秒）
+SMS_DISPATCH_POLL_INTERVAL = 1  # run_sms_worker 队列为空时的轮询间隔（秒）
+SMS_STUB_LATENCY = 0  # 模拟服务商每次调用的延迟（秒）
+SMS_STUB_FAILURE_RATE = 0  # 模拟服务商的失败概率
+SMS_STUB_BATCH_SIZE = 100  # 模拟服务商一次批量发送的最大条数
+
+# 缓存设置（默认为进程内缓存；多个worker进程共享数据时改为Redis）
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379/0',
+#     }
+# }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # 所有worker进程共享的缓存（限流计数、令牌撤销记录），未配置Redis时使用数据库缓存表，部署时执行 python manage.py createcachetable
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+}
+
+# JWT认证的用户缓存（用户保存或删除时自动失效）
+USER_CACHE_ALIAS = 'default'  # 第二级缓存（默认的进程内缓存每个进程一份，配置Redis后各进程共享）
+USER_CACHE_TIMEOUT = 60  # 第二级缓存有效期（秒），使用进程内缓存时其他进程修改用户后最多延迟这么久生效
+USER_CACHE_LOCAL_TIMEOUT = 5  # 进程内缓存有效期（秒），第二级缓存为共享缓存时其他进程修改用户后最多延迟这么久生效
+USER_CACHE_LOCAL_SIZE = 10000  # 每个worker进程缓存的用户数
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -225,3 +282,93 @@ OSS_BUCKET_NAME='home-memory-image-storage'
 OSS_REGION_ID='cn-hangzhou'
 OSS_ENDPOINT='https://oss-cn-hangzhou.aliyuncs.com'
 OSS_URL_PREFIX='https://home-memory-image-storage.oss-cn-hangzhou.aliyuncs.com'
+
+# 私有模式：上传的对象为私有ACL，get_file_url 返回签名URL
+OSS_PRIVATE_OBJECTS = False
+OSS_SIGNED_URL_EXPIRES = 3600  # 签名URL有效期（秒）
+OSS_SIGNED_URL_MIN_REMAINING = 600  # 返回的签名URL至少剩余的有效期（秒），同一时间窗口内URL保持不变
+OSS_SIGNED_URL_CACHE_SIZE = 10000  # 每个worker进程缓存的签名URL数量
+
+# 批量上传并发数（每个worker进程内的线程池大小，1表示逐个上传）
+OSS_UPLOAD_CONCURRENCY = 4
+
+# 分片上传设置（超过阈值自动使用分片并行上传）
+OSS_MULTIPART_THRESHOLD = 10 * 1024 * 1024  # 10MB
+OSS_MULTIPART_PART_SIZE = 5 * 1024 * 1024  # 每个分片5MB
+OSS_MULTIPART_CONCURRENCY = 4  # 每个worker进程内的分片上传线程数
+OSS_MULTIPART_PART_RETRIES = 3  # 单个分片失败重试次数
+OSS_STREAM_CHUNK_SIZE = 64 * 1024  # 流式上传时每次从请求体读取并转发的块大小
+
+# 按内容SHA-256去重，相同图片只存储一次
+OSS_DEDUP_ENABLED = False
+IMAGE_DELETE_TIMEOUT = 300  # 删除图片超过多久未完成视为处理进程已退出，可重新删除（秒）
+
+# 衍生图设置（缩略图、中图等在进程池中生成，与原图一起上传）
+IMAGE_DERIVATIVES_ENABLED = False
+IMAGE_DERIVATIVES = {
+    # max_size 为 None 时只重新编码不缩放
+    'thumbnail': {'max_size': (320, 320), 'format': 'WEBP', 'quality': 80},
+    'medium': {'max_size': (1280, 1280), 'format': 'WEBP', 'quality': 85},
+}
+IMAGE_PROCESS_WORKERS = 2  # 每个worker进程的图片处理进程数
+IMAGE_PROCESS_TIMEOUT = 30  # 单张图片衍生图生成超时（秒）
+
+# 上传图片校验（只解析文件头，不解码整张图片）
+IMAGE_MAX_PIXELS = 40_000_000  # 最大像素数（宽x高），防止解压炸弹
+IMAGE_SNIFF_BYTES = 256 * 1024  # 解析文件头时最多读取的字节数（JPEG的EXIF/ICC元数据较大时需要）
+
+# 客户端直传OSS设置
+OSS_DIRECT_UPLOAD_EXPIRES = 300  # 签名有效期（秒）
+OSS_DIRECT_UPLOAD_MAX_SIZE = 5 * 1024 * 1024  # 直传文件最大5MB
+
+# 断点续传上传会话
+UPLOAD_SESSION_DIR = BASE_DIR / 'upload_sessions'  # 分块暂存目录（多台服务器部署时需共享）
+UPLOAD_SESSION_CHUNK_SIZE = 256 * 1024  # 分块大小
+UPLOAD_SESSION_MAX_SIZE = 5 * 1024 * 1024  # 文件最大5MB
+UPLOAD_SESSION_EXPIRE = 24 * 3600  # 最后一个分块之后会话的有效期（秒），过期后由 purge_upload_sessions 清理
+UPLOAD_SESSION_COMPLETE_TIMEOUT = 300  # 合并超过多久视为处理进程已退出，可重新调用完成接口（秒）
+UPLOAD_SESSION_CHUNK_TIMEOUT = 60  # 分块写入暂存文件超过多久视为处理进程已退出，可被重发的请求重新领取（秒）
+
+# 上传接口的请求大小限制（RequestSizeLimitMiddleware），键为带命名空间的URL名称，值为请求体最大字节数
+UPLOAD_FILE_MAX_SIZE = 5 * 1024 * 1024  # multipart请求中单个文件的最大大小，解析过程中超过即停止
+REQUEST_SIZE_LIMITS = {
+    'users:upload-image': 5 * 1024 * 1024 + 64 * 1024,  # 5MB文件加表单字段
+    'users:upload-images': 10 * 5 * 1024 * 1024 + 640 * 1024,  # 最多10个5MB文件
+    'users:upload-binary-image': 7 * 1024 * 1024,  # 5MB图片的Base64编码约6.7MB
+    'users:upload-raw-binary-image': 5 * 1024 * 1024 + 64 * 1024,
+    'users:upload-session-chunk': UPLOAD_SESSION_CHUNK_SIZE,  # 每个分块的请求体就是一个分块
+    'users:aio-upload-image': 5 * 1024 * 1024 + 64 * 1024,
+    'users:aio-upload-images': 10 * 5 * 1024 * 1024 + 640 * 1024,
+    'users:aio-upload-binary-image': 7 * 1024 * 1024,
+    'users:aio-upload-raw-binary-image': 5 * 1024 * 1024 + 64 * 1024,
+}
+
+# 后台上传任务（上传接口传 async_upload=true 时立即返回202）
+UPLOAD_JOB_WORKER = 'local'  # local：在Web进程的线程池中执行；command：由 manage.py run_upload_worker 执行
+UPLOAD_JOB_LOCAL_WORKERS = 2  # local模式下每个worker进程的上传线程数
+UPLOAD_JOB_SPOOL_DIR = BASE_DIR / 'upload_spool'  # 上传文件暂存目录（Web进程和worker进程需共享）
+UPLOAD_JOB_MAX_ATTEMPTS = 3  # 有文件上传失败时任务最多执行次数
+UPLOAD_JOB_RETRY_BASE_DELAY = 5  # 重试退避的基准时间（秒）
+UPLOAD_JOB_RETRY_MAX_DELAY = 300  # 单次重试等待上限（秒）
+UPLOAD_JOB_STALE_TIMEOUT = 600  # 任务处理超过多久视为worker已退出，可被重新领取（秒）
+UPLOAD_JOB_POLL_INTERVAL = 2  # run_upload_worker 队列为空时的轮询间隔（秒）
+
+# 存储后端（本地开发和压测可以切换为本地磁盘或内存存储）
+# users.oss_service.AlibabaCloudOSSService / users.storage.LocalFileStorageService / users.storage.InMemoryStorageService
+STORAGE_BACKEND = 'users.oss_service.AlibabaCloudOSSService'
+STORAGE_LOCAL_ROOT = BASE_DIR / 'media'  # 本地磁盘存储目录
+STORAGE_LOCAL_URL_PREFIX = '/media'  # 本地磁盘存储的访问URL前缀（DEBUG模式下由Django提供）
+STORAGE_MEMORY_LATENCY = 0  # 内存存储每次操作的模拟延迟（秒）
+STORAGE_MEMORY_LATENCY_JITTER = 0  # 内存存储模拟延迟的随机抖动上限（秒）
+
+# OSS调用超时、重试和熔断设置
+OSS_CONNECT_TIMEOUT = 5  # 连接超时（秒）
+OSS_READ_TIMEOUT = 30  # 读写超时（秒）
+OSS_CONNECTION_POOL_SIZE = None  # 每个worker进程的OSS keep-alive连接池大小，None时按下面的请求线程数和各线程池大小计算
+OSS_REQUEST_THREADS = int(os.environ.get('GUNICORN_THREADS', 1))  # 每个worker进程处理请求的线程数，与 gunicorn_config.py 的 threads 读取同一个环境变量
+OSS_RETRIES = 2  # 幂等操作（上传到固定key、删除、查询）遇到网络错误、限流或5xx时的重试次数
+OSS_RETRY_BASE_DELAY = 0.2  # 重试随机退避的基准时间（秒）
+OSS_RETRY_MAX_DELAY = 5  # 单次重试等待时间上限（秒）
+OSS_CIRCUIT_FAILURE_THRESHOLD = 5  # 连续失败多少次后打开熔断器
+OSS_CIRCUIT_RECOVERY_TIMEOUT = 30  # 熔断器打开多久后半开探测（秒）
+OSS_CIRCUIT_HALF_OPEN_MAX_CALLS = 1  # 半开状态允许的探测请求数
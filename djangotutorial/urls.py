@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include, re_path
 from rest_framework import permissions
@@ -43,3 +45,7 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
+
+# 本地磁盘存储后端的文件在DEBUG模式下由Django直接提供
+if settings.STORAGE_BACKEND == 'users.storage.LocalFileStorageService':
+    urlpatterns += static(settings.STORAGE_LOCAL_URL_PREFIX + '/', document_root=settings.STORAGE_LOCAL_ROOT)
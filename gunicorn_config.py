@@ -10,6 +10,9 @@ workers = multiprocessing.cpu_count() * 2 + 1
 # 工作模式
 worker_class = 'sync'
 
+# 每个工作进程的请求线程数（大于1时gunicorn使用gthread工作模式），Django的 OSS_REQUEST_THREADS 读取同一个环境变量
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
 # 最大客户端并发数量
 worker_connections = 2000  # 增加并发连接数
 
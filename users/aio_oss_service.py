@@ -0,0 +1,508 @@
+"""
+阿里云OSS异步服务封装（用于ASGI部署）
+"""
+import asyncio
+import hashlib
+import logging
+import weakref
+from typing import Optional, Dict, Any, List, Tuple, Union, IO, Iterable, AsyncIterable, AsyncIterator
+
+from asgiref.sync import sync_to_async, async_to_sync
+from django.conf import settings
+import alibabacloud_oss_v2 as oss
+
+from . import image_processing
+from .oss_service import AlibabaCloudOSSService, oss_service, oss_circuit_breaker, is_retryable_oss_error, get_object_acl
+from .resilience import async_call_with_retry
+from .storage import BaseStorageService, AsyncStorageAdapter, claim_duplicate, register_content, release_and_delete
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAlibabaCloudOSSService:
+    """
+    阿里云OSS异步服务类
+
+    基于 alibabacloud_oss_v2.aio（aiohttp）实现非阻塞上传和删除，
+    一个事件循环内可以同时处理大量上传而不占用线程。
+    """
+
+    # 对象key和URL的生成规则与同步服务保持一致
+    generate_object_key = AlibabaCloudOSSService.generate_object_key
+    get_derivative_urls = AlibabaCloudOSSService.get_derivative_urls
+    compute_content_hash = staticmethod(AlibabaCloudOSSService.compute_content_hash)
+    read_for_processing = staticmethod(AlibabaCloudOSSService.read_for_processing)
+
+    def __init__(self):
+        """初始化OSS配置，异步客户端在事件循环中按需创建"""
+        try:
+            # aio 子模块依赖 aiohttp，未安装时在这里报错
+            from alibabacloud_oss_v2 import aio  # noqa: F401
+
+            credentials_provider = oss.credentials.EnvironmentVariableCredentialsProvider()
+            cfg = oss.config.load_default()
+            cfg.credentials_provider = credentials_provider
+            cfg.endpoint = getattr(settings, 'OSS_ENDPOINT', 'oss-cn-hangzhou.aliyuncs.com')
+            cfg.region = getattr(settings, 'OSS_REGION_ID', 'cn-hangzhou')
+            cfg.connect_timeout = getattr(settings, 'OSS_CONNECT_TIMEOUT', 5)
+            cfg.readwrite_timeout = getattr(settings, 'OSS_READ_TIMEOUT', 30)
+            # 重试由 _call 统一处理，SDK内部不再重试
+            cfg.retryer = oss.retry.NopRetryer()
+            self.cfg = cfg
+            self.bucket_name = getattr(settings, 'OSS_BUCKET_NAME', '')
+            self.url_prefix = getattr(settings, 'OSS_URL_PREFIX', '')
+            # aiohttp会话绑定事件循环，每个事件循环使用独立的客户端
+            self._clients = weakref.WeakKeyDictionary()
+            logger.info("阿里云OSS异步客户端初始化成功")
+
+        except Exception as e:
+            logger.error(f"初始化阿里云OSS异步客户端失败: {str(e)}")
+            raise
+
+    def get_file_url(self, object_key: str) -> str:
+        """获取文件的访问URL（私有模式下的签名和缓存由同步服务完成）"""
+        return oss_service.get_file_url(object_key)
+
+    @property
+    def oss_client(self):
+        """获取当前事件循环的异步OSS客户端"""
+        from alibabacloud_oss_v2 import aio
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = aio.AsyncClient(self.cfg)
+            self._clients[loop] = client
+        return client
+
+    async def _call(self, method: str, request, retries: Optional[int] = None):
+        """
+        经过熔断器调用异步OSS接口，可重试错误按随机指数退避重试
+
+        熔断器与同步服务共用，同一进程内的同步和异步调用共同决定熔断状态。
+
+        Args:
+            method: 异步客户端的方法名
+            request: 请求对象
+            retries: 最多重试次数，默认取 OSS_RETRIES，非幂等操作传0
+
+        Returns:
+            接口返回结果
+        """
+        if retries is None:
+            retries = getattr(settings, 'OSS_RETRIES', 2)
+        return await async_call_with_retry(
+            getattr(self.oss_client, method), request,
+            breaker=oss_circuit_breaker,
+            is_retryable=is_retryable_oss_error,
+            retries=retries,
+            base_delay=getattr(settings, 'OSS_RETRY_BASE_DELAY', 0.2),
+            max_delay=getattr(settings, 'OSS_RETRY_MAX_DELAY', 5),
+        )
+
+    async def upload_file(self, file_content: Union[bytes, IO, Iterable[bytes], AsyncIterable[bytes]], filename: str, folder: str = 'uploads', dedup: Optional[bool] = None, derivatives: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        异步上传文件到OSS
+
+        与 AlibabaCloudOSSService.upload_file 行为一致：超过 OSS_MULTIPART_THRESHOLD 时分片并行上传，
+        开启去重时相同内容直接返回已有对象，开启衍生图时在进程池中生成衍生图并一起上传。
+
+        Args:
+            file_content: 文件内容（字节、文件对象、字节块迭代器或异步迭代器）
+            filename: 原始文件名
+            folder: 存储文件夹
+            dedup: 是否按内容去重，默认取 OSS_DEDUP_ENABLED
+            derivatives: 是否生成衍生图，默认取 IMAGE_DERIVATIVES_ENABLED
+
+        Returns:
+            包含文件信息的字典
+        """
+        try:
+            if dedup is None:
+                dedup = getattr(settings, 'OSS_DEDUP_ENABLED', False)
+            if derivatives is None:
+                derivatives = getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', False)
+
+            content_hash = None
+            hasher = None
+            if dedup:
+                if hasattr(file_content, '__aiter__'):
+                    content_hash = None
+                else:
+                    content_hash = await sync_to_async(self.compute_content_hash, thread_sensitive=False)(file_content)
+                if content_hash:
+                    existing = await sync_to_async(claim_duplicate)(content_hash)
+                    if existing:
+                        logger.info(f"内容重复，复用已有对象: {existing.object_key}")
+                        result = {
+                            'success': True,
+                            'object_key': existing.object_key,
+                            'file_url': self.get_file_url(existing.object_key),
+                            'original_filename': filename,
+                            'size': existing.size,
+                            'deduplicated': True,
+                            'content_hash': content_hash,
+                        }
+                        if derivatives:
+                            # 已有对象的衍生图在首次上传时已经生成
+                            result['derivatives'] = self.get_derivative_urls(existing.object_key)
+                        return result
+                else:
+                    # 无法回退的数据流：上传过程中边读边计算哈希，上传完成后登记
+                    hasher = hashlib.sha256()
+
+            # 衍生图在进程池中生成，与原图上传同时进行
+            derivative_future = None
+            if derivatives:
+                image_bytes = None
+                if not hasattr(file_content, '__aiter__'):
+                    image_bytes = await sync_to_async(self.read_for_processing, thread_sensitive=False)(file_content)
+                if image_bytes is not None:
+                    derivative_future = asyncio.wrap_future(image_processing.submit_derivatives(image_bytes))
+                else:
+                    logger.warning(f"数据流无法回退，跳过衍生图生成: {filename}")
+
+            # 生成对象key
+            object_key = self.generate_object_key(filename, folder)
+            logger.info(f"async upload to bucket_name: {self.bucket_name}, object_key: {object_key}")
+
+            size = await self._store_object(object_key, file_content, hasher)
+
+            result = {
+                'success': True,
+                'object_key': object_key,
+                'file_url': self.get_file_url(object_key),
+                'original_filename': filename,
+                'size': size,
+            }
+            if dedup:
+                result['content_hash'] = content_hash or hasher.hexdigest()
+                recorded_key = await sync_to_async(register_content)(result['content_hash'], object_key, size)
+                if recorded_key != object_key:
+                    # 相同内容已被并发上传，删除本次上传的重复对象
+                    logger.info(f"内容已被并发上传，删除重复对象: {object_key}")
+                    await self._call('delete_object', oss.DeleteObjectRequest(bucket=self.bucket_name, key=object_key))
+                    result['object_key'] = recorded_key
+                    result['file_url'] = self.get_file_url(recorded_key)
+                    result['deduplicated'] = True
+            if derivative_future is not None:
+                result['derivatives'] = await self.upload_derivatives(result['object_key'], derivative_future)
+            return result
+
+        except Exception as e:
+            logger.error(f"文件异步上传失败: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    async def upload_derivatives(self, object_key: str, derivative_future) -> Dict[str, Dict[str, Any]]:
+        """
+        等待衍生图生成完成并并发上传，失败只记录日志
+
+        Args:
+            object_key: 原图对象key
+            derivative_future: 包装为asyncio Future的衍生图生成任务
+
+        Returns:
+            {名称: 衍生图信息}
+        """
+        try:
+            rendered = await asyncio.wait_for(derivative_future, getattr(settings, 'IMAGE_PROCESS_TIMEOUT', 30))
+        except Exception as e:
+            logger.error(f"衍生图生成失败: {object_key}, {str(e)}")
+            return {}
+
+        async def upload_one(name, derivative):
+            key = image_processing.derivative_key(object_key, name, derivative['format'])
+            try:
+                size = await self._store_object(key, derivative['content'])
+            except Exception as e:
+                logger.error(f"衍生图上传失败: {key}, {str(e)}")
+                return name, None
+            return name, {
+                'object_key': key,
+                'file_url': self.get_file_url(key),
+                'width': derivative['width'],
+                'height': derivative['height'],
+                'size': size,
+            }
+
+        uploaded = await asyncio.gather(*(upload_one(name, derivative) for name, derivative in rendered.items()))
+        return {name: info for name, info in uploaded if info is not None}
+
+    async def upload_files(self, files: List[Tuple[Union[bytes, IO, Iterable[bytes]], str]], folder: str = 'uploads') -> List[Dict[str, Any]]:
+        """
+        异步批量上传文件，最多 OSS_UPLOAD_CONCURRENCY 个同时进行
+
+        Args:
+            files: (文件内容或文件对象, 原始文件名) 列表
+            folder: 存储文件夹
+
+        Returns:
+            每个文件的上传结果列表，顺序与传入顺序一致
+        """
+        semaphore = asyncio.Semaphore(max(1, getattr(settings, 'OSS_UPLOAD_CONCURRENCY', 4)))
+
+        async def upload_one(file, filename):
+            async with semaphore:
+                result = await self.upload_file(file, filename, folder)
+            result.setdefault('original_filename', filename)
+            return result
+
+        return await asyncio.gather(*(upload_one(file, filename) for file, filename in files))
+
+    async def _store_object(self, object_key: str, file_content, hasher=None) -> int:
+        """
+        把内容写入指定的对象key，按大小选择普通上传或分片上传
+
+        Args:
+            object_key: 对象key
+            file_content: 文件内容
+            hasher: 需要同时更新的哈希对象
+
+        Returns:
+            上传的字节数
+        """
+        threshold = getattr(settings, 'OSS_MULTIPART_THRESHOLD', 10 * 1024 * 1024)
+        part_size = getattr(settings, 'OSS_MULTIPART_PART_SIZE', 5 * 1024 * 1024)
+
+        if isinstance(file_content, (bytes, bytearray)) and len(file_content) <= threshold:
+            if hasher is not None:
+                hasher.update(file_content)
+            body = bytes(file_content)
+        else:
+            # 预读不超过阈值的数据，判断是否需要分片上传
+            parts = self._aiter_parts(file_content, part_size, hasher)
+            head = []
+            head_size = 0
+            async for part in parts:
+                head.append(part)
+                head_size += len(part)
+                if head_size > threshold:
+                    break
+
+            if head_size > threshold:
+                size = await self.multipart_upload(object_key, self._chain(head, parts))
+                logger.info(f"文件异步分片上传成功: {object_key}")
+                return size
+            body = b''.join(head)
+
+        await self._call('put_object', oss.PutObjectRequest(
+            bucket=self.bucket_name,
+            key=object_key,
+            body=body,
+            acl=get_object_acl(),
+        ))
+        logger.info(f"文件异步上传成功: {object_key}")
+        return len(body)
+
+    async def multipart_upload(self, object_key: str, parts: AsyncIterable[bytes]) -> int:
+        """
+        异步分片并行上传，同时在途的分片数不超过 OSS_MULTIPART_CONCURRENCY 的两倍
+
+        Args:
+            object_key: 对象key
+            parts: 按顺序产生的分片数据
+
+        Returns:
+            上传的总字节数
+        """
+        result = await self._call('initiate_multipart_upload', oss.InitiateMultipartUploadRequest(
+            bucket=self.bucket_name,
+            key=object_key,
+        ))
+        upload_id = result.upload_id
+        concurrency = max(1, getattr(settings, 'OSS_MULTIPART_CONCURRENCY', 4))
+        in_flight = asyncio.Semaphore(concurrency * 2)
+        tasks = []
+        total_size = 0
+
+        async def upload_part(part_number, data):
+            try:
+                return await self._upload_part(object_key, upload_id, part_number, data)
+            finally:
+                in_flight.release()
+
+        try:
+            part_number = 0
+            async for data in parts:
+                await in_flight.acquire()
+                # 已有分片最终失败时不再继续读取
+                if any(task.done() and task.exception() for task in tasks):
+                    in_flight.release()
+                    break
+                part_number += 1
+                total_size += len(data)
+                tasks.append(asyncio.ensure_future(upload_part(part_number, data)))
+
+            uploaded = await asyncio.gather(*tasks)
+            # 完成上传不是幂等操作，不重试
+            await self._call('complete_multipart_upload', oss.CompleteMultipartUploadRequest(
+                bucket=self.bucket_name,
+                key=object_key,
+                upload_id=upload_id,
+                acl=get_object_acl(),
+                complete_multipart_upload=oss.CompleteMultipartUpload(parts=uploaded),
+            ), retries=0)
+            return total_size
+        except BaseException:
+            logger.error(f"异步分片上传失败，取消上传: {object_key}, upload_id: {upload_id}")
+            for task in tasks:
+                task.cancel()
+            try:
+                await self._call('abort_multipart_upload', oss.AbortMultipartUploadRequest(
+                    bucket=self.bucket_name,
+                    key=object_key,
+                    upload_id=upload_id,
+                ))
+            except Exception as e:
+                logger.error(f"取消异步分片上传失败: {str(e)}")
+            raise
+
+    async def _upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> oss.UploadPart:
+        """上传单个分片，失败时按随机指数退避重试"""
+        result = await self._call('upload_part', oss.UploadPartRequest(
+            bucket=self.bucket_name,
+            key=object_key,
+            upload_id=upload_id,
+            part_number=part_number,
+            body=data,
+        ), retries=getattr(settings, 'OSS_MULTIPART_PART_RETRIES', 3))
+        return oss.UploadPart(part_number=part_number, etag=result.etag)
+
+    @staticmethod
+    async def _aiter_parts(source, part_size: int, hasher=None) -> AsyncIterator[bytes]:
+        """把字节、文件对象或（异步）字节块迭代器切分成固定大小的分片，可同时更新哈希"""
+        if isinstance(source, (bytes, bytearray)):
+            for offset in range(0, len(source), part_size):
+                data = bytes(source[offset:offset + part_size])
+                if hasher is not None:
+                    hasher.update(data)
+                yield data
+            return
+
+        if hasattr(source, 'read'):
+            while True:
+                data = await sync_to_async(source.read, thread_sensitive=False)(part_size)
+                if not data:
+                    return
+                if hasher is not None:
+                    hasher.update(data)
+                yield data
+
+        buffer = bytearray()
+        if hasattr(source, '__aiter__'):
+            async for chunk in source:
+                buffer.extend(chunk)
+                while len(buffer) >= part_size:
+                    data = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    if hasher is not None:
+                        hasher.update(data)
+                    yield data
+        else:
+            for chunk in source:
+                buffer.extend(chunk)
+                while len(buffer) >= part_size:
+                    data = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    if hasher is not None:
+                        hasher.update(data)
+                    yield data
+        if buffer:
+            if hasher is not None:
+                hasher.update(buffer)
+            yield bytes(buffer)
+
+    @staticmethod
+    async def _chain(head: List[bytes], rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """先产出已预读的分片，再继续读取剩余分片"""
+        for data in head:
+            yield data
+        async for data in rest:
+            yield data
+
+    async def delete_file(self, object_key: str, references: int = 1) -> Dict[str, Any]:
+        """
+        异步删除OSS中的文件
+
+        Args:
+            object_key: 对象key
+            references: 释放的去重引用数（调用方持有的引用数）
+
+        Returns:
+            删除结果
+        """
+        results = await self.delete_files([object_key], {object_key: references})
+        return results[0]
+
+    async def delete_files(self, object_keys: List[str], references: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """
+        异步批量删除OSS中的文件
+
+        与 AlibabaCloudOSSService.delete_files 行为一致，每组最多1000个对象。
+        释放去重引用的数据库操作是同步的，因此在工作线程中执行 delete_files_blocking。
+
+        Args:
+            object_keys: 对象key列表
+            references: 每个对象key释放的去重引用数，默认各释放1个
+
+        Returns:
+            每个对象key的删除结果，顺序与传入顺序一致（重复的key只返回一次）
+        """
+        return await sync_to_async(self.delete_files_blocking, thread_sensitive=False)(object_keys, references)
+
+    def delete_files_blocking(self, object_keys: List[str], references: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """
+        在工作线程中批量删除（供同步调用方使用，如 delete_images）
+
+        OSS请求通过 async_to_sync 回到事件循环中执行，数据库操作在当前线程中执行。
+        """
+        object_keys = list(dict.fromkeys(object_keys))
+        try:
+            results, deleted = release_and_delete(
+                object_keys, references, async_to_sync(self._delete_objects), BaseStorageService.max_delete_batch
+            )
+        except Exception as e:
+            logger.error(f"异步批量删除失败: {str(e)}")
+            return [{'success': False, 'object_key': key, 'error': str(e)} for key in object_keys]
+        logger.info(f"异步批量删除完成: 请求{len(object_keys)}个，删除{len(deleted)}个")
+
+        if deleted and getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', False):
+            async_to_sync(self._delete_derivatives)(deleted)
+
+        return [results[key] for key in object_keys]
+
+    async def _delete_objects(self, object_keys: List[str]) -> set:
+        """使用 DeleteMultipleObjects 删除一组对象，返回已删除的对象key"""
+        result = await self._call('delete_multiple_objects', oss.DeleteMultipleObjectsRequest(
+            bucket=self.bucket_name,
+            objects=[oss.DeleteObject(key=key) for key in object_keys],
+        ))
+        return {deleted.key for deleted in result.deleted_objects or []}
+
+    async def _delete_derivatives(self, object_keys: List[str]):
+        """并发删除原图对应的衍生图，失败只记录日志"""
+        batch_size = BaseStorageService.max_delete_batch
+        derivative_keys = [key for object_key in object_keys for key in image_processing.derivative_keys(object_key)]
+        outcomes = await asyncio.gather(*(
+            self._delete_objects(derivative_keys[offset:offset + batch_size])
+            for offset in range(0, len(derivative_keys), batch_size)
+        ), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error(f"衍生图批量删除失败: {str(outcome)}")
+
+
+# 创建全局OSS异步服务实例，其他存储后端在线程中调用同步实现
+try:
+    if isinstance(oss_service, AlibabaCloudOSSService):
+        aio_oss_service = AsyncAlibabaCloudOSSService()
+    elif oss_service is not None:
+        aio_oss_service = AsyncStorageAdapter(oss_service)
+    else:
+        aio_oss_service = None
+except Exception as e:
+    logger.error(f"创建OSS异步服务实例失败: {str(e)}")
+    aio_oss_service = None
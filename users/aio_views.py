@@ -0,0 +1,453 @@
+"""
+图片上传异步视图（用于ASGI部署）
+
+与 views.py 中的上传视图接口和响应格式保持一致，但使用异步OSS客户端，
+一个ASGI worker可以同时处理大量上传请求。
+"""
+import json
+import logging
+import traceback
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+
+from .authentication import CachedJWTAuthentication
+from .aio_oss_service import aio_oss_service
+from .image_sniffing import InvalidImage, validate_image_header, sniff_image, get_sniff_bytes
+from .image_records import NOT_OWNED_ERROR, DELETING_ERROR, record_image, record_images, delete_images
+from .serializers import ImageUploadSerializer, BatchImageUploadSerializer, BinaryImageUploadSerializer, RawBinaryImageUploadSerializer, BatchDeleteImageSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """返回与DRF JSONRenderer一致的JSON响应（不转义中文）"""
+    return JsonResponse(data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def oss_unavailable_response():
+    """OSS服务未初始化时的响应"""
+    return json_response({
+        'message': 'OSS服务未初始化',
+        'error': '请检查阿里云配置'
+    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def upload_result_response(result):
+    """把单个上传结果转换为响应"""
+    if result.get('success'):
+        return json_response({
+            'message': '图片上传成功',
+            'data': {
+                'file_url': result['file_url'],
+                'object_key': result['object_key'],
+                'original_filename': result['original_filename'],
+                'size': result['size'],
+                'deduplicated': result.get('deduplicated', False),
+                'derivatives': result.get('derivatives', {}),
+            }
+        })
+    return json_response({
+        'message': '图片上传失败',
+        'error': result.get('error', '未知错误')
+    }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncAPIView(View):
+    """
+    异步视图基类
+
+    使用 CachedJWTAuthentication 认证，免除CSRF校验，按 DEFAULT_THROTTLE_CLASSES 限流，行为与 IsAuthenticated 的 APIView 一致。
+    """
+    authentication_class = CachedJWTAuthentication
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user_auth = await sync_to_async(self.authentication_class().authenticate)(request)
+        except exceptions.AuthenticationFailed as e:
+            return json_response({'detail': e.detail}, status=status.HTTP_401_UNAUTHORIZED)
+        if user_auth is None:
+            return json_response({'detail': '身份认证信息未提供。'}, status=status.HTTP_401_UNAUTHORIZED)
+        request.user, request.auth = user_auth
+
+        try:
+            await sync_to_async(self.check_throttles)(request)
+        except exceptions.Throttled as e:
+            response = json_response({'detail': e.detail}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            if e.wait is not None:
+                response['Retry-After'] = '%d' % e.wait
+            return response
+        return await super().dispatch(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        """
+        按 throttle_classes（默认为 DEFAULT_THROTTLE_CLASSES）限流，与 APIView.check_throttles 一致
+
+        Raises:
+            Throttled: 请求被限流
+        """
+        durations = []
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                durations.append(throttle.wait())
+        if durations:
+            raise exceptions.Throttled(max((duration for duration in durations if duration is not None), default=None))
+
+    @staticmethod
+    async def form_data(request):
+        """解析multipart/form-data请求，合并表单字段和文件"""
+        def parse():
+            data = request.POST.copy()
+            data.update(request.FILES)
+            return data
+        return await sync_to_async(parse, thread_sensitive=False)()
+
+    @staticmethod
+    def json_data(request):
+        """
+        解析JSON请求体
+
+        Raises:
+            ParseError: 请求体不是合法的JSON（视图返回400）
+        """
+        if not request.body:
+            return {}
+        try:
+            return json.loads(request.body)
+        except ValueError as e:
+            raise exceptions.ParseError(f'JSON parse error - {str(e)}')
+
+    @staticmethod
+    async def validate(serializer):
+        """在线程中执行序列化器校验（图片校验会解码图片数据）"""
+        return await sync_to_async(serializer.is_valid, thread_sensitive=False)()
+
+
+class AsyncImageUploadView(AsyncAPIView):
+    """图片上传异步视图"""
+
+    async def post(self, request):
+        """上传单张图片"""
+        try:
+            if not aio_oss_service:
+                return oss_unavailable_response()
+
+            serializer = ImageUploadSerializer(data=await self.form_data(request))
+            if not await self.validate(serializer):
+                return json_response({
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            image = serializer.validated_data['image']
+            folder = serializer.validated_data.get('folder', 'images')
+
+            result = await aio_oss_service.upload_file(
+                file_content=image,
+                filename=image.name,
+                folder=folder
+            )
+            await sync_to_async(record_image)(request.user, result, folder, getattr(image, 'image_info', None))
+            return upload_result_response(result)
+
+        except Exception as e:
+            logger.error(f"图片异步上传时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return json_response({
+                'message': '图片上传失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncBatchImageUploadView(AsyncAPIView):
+    """批量图片上传异步视图"""
+
+    async def post(self, request):
+        """批量上传图片"""
+        try:
+            if not aio_oss_service:
+                return oss_unavailable_response()
+
+            serializer = BatchImageUploadSerializer(data=await self.form_data(request))
+            if not await self.validate(serializer):
+                return json_response({
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            images = serializer.validated_data['images']
+            folder = serializer.validated_data.get('folder', 'images')
+
+            upload_results = await aio_oss_service.upload_files(
+                [(image, image.name) for image in images],
+                folder=folder
+            )
+            await sync_to_async(record_images)(request.user, list(zip(upload_results, [getattr(image, 'image_info', None) for image in images])), folder)
+
+            results = []
+            success_count = 0
+            failed_count = 0
+
+            for result in upload_results:
+                if result.get('success'):
+                    success_count += 1
+                    results.append({
+                        'success': True,
+                        'file_url': result['file_url'],
+                        'object_key': result['object_key'],
+                        'original_filename': result['original_filename'],
+                        'size': result['size'],
+                        'deduplicated': result.get('deduplicated', False),
+                        'derivatives': result.get('derivatives', {}),
+                    })
+                else:
+                    failed_count += 1
+                    results.append({
+                        'success': False,
+                        'original_filename': result['original_filename'],
+                        'error': result.get('error', '上传失败')
+                    })
+
+            return json_response({
+                'message': f'批量上传完成，成功{success_count}张，失败{failed_count}张',
+                'data': {
+                    'success_count': success_count,
+                    'failed_count': failed_count,
+                    'results': results
+                }
+            })
+
+        except Exception as e:
+            logger.error(f"批量图片异步上传时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return json_response({
+                'message': '批量图片上传失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncDeleteImageView(AsyncAPIView):
+    """删除图片异步视图"""
+
+    async def delete(self, request):
+        """删除图片"""
+        try:
+            if not aio_oss_service:
+                return oss_unavailable_response()
+
+            object_key = self.json_data(request).get('object_key')
+            if not object_key:
+                return json_response({
+                    'message': '缺少必要参数',
+                    'error': 'object_key 参数不能为空'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # 记录锁定和存储删除在同一个工作线程的事务中完成
+            results = await sync_to_async(delete_images, thread_sensitive=False)(
+                request.user, [object_key], aio_oss_service.delete_files_blocking
+            )
+            result = results[0]
+
+            if result.get('success'):
+                return json_response({
+                    'message': '图片删除成功'
+                })
+            elif result.get('error') == NOT_OWNED_ERROR:
+                return json_response({
+                    'message': '图片不存在',
+                    'error': NOT_OWNED_ERROR
+                }, status=status.HTTP_404_NOT_FOUND)
+            elif result.get('error') == DELETING_ERROR:
+                return json_response({
+                    'message': '图片正在删除',
+                    'error': DELETING_ERROR
+                }, status=status.HTTP_409_CONFLICT)
+            else:
+                return json_response({
+                    'message': '图片删除失败',
+                    'error': result.get('error', '未知错误')
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        except exceptions.ParseError as e:
+            return json_response({'detail': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"异步删除图片时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return json_response({
+                'message': '删除图片失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncBatchDeleteImageView(AsyncAPIView):
+    """批量删除图片异步视图"""
+
+    async def delete(self, request):
+        """批量删除图片"""
+        try:
+            if not aio_oss_service:
+                return oss_unavailable_response()
+
+            serializer = BatchDeleteImageSerializer(data=self.json_data(request))
+            if not serializer.is_valid():
+                return json_response({
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            results = await sync_to_async(delete_images, thread_sensitive=False)(
+                request.user, serializer.validated_data['object_keys'], aio_oss_service.delete_files_blocking
+            )
+            if all(result.get('error') == NOT_OWNED_ERROR for result in results):
+                return json_response({
+                    'message': '图片不存在',
+                    'error': NOT_OWNED_ERROR
+                }, status=status.HTTP_404_NOT_FOUND)
+            success_count = sum(1 for result in results if result['success'])
+            failed_count = len(results) - success_count
+
+            return json_response({
+                'message': f'批量删除完成，成功{success_count}张，失败{failed_count}张',
+                'data': {
+                    'success_count': success_count,
+                    'failed_count': failed_count,
+                    'results': results
+                }
+            })
+
+        except exceptions.ParseError as e:
+            return json_response({'detail': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"异步批量删除图片时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return json_response({
+                'message': '批量删除图片失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncBinaryImageUploadView(AsyncAPIView):
+    """二进制图片上传异步视图（支持Base64和原始二进制数据）"""
+
+    async def post(self, request):
+        """上传Base64编码的图片数据"""
+        try:
+            if not aio_oss_service:
+                return oss_unavailable_response()
+
+            serializer = BinaryImageUploadSerializer(data=self.json_data(request))
+            if not await self.validate(serializer):
+                return json_response({
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            image_bytes = serializer.validated_data['image_data']
+            folder = serializer.validated_data.get('folder', 'images')
+            result = await aio_oss_service.upload_file(
+                file_content=image_bytes,
+                filename=serializer.validated_data['filename'],
+                folder=folder
+            )
+            await sync_to_async(record_image)(request.user, result, folder, sniff_image(bytes(image_bytes[:get_sniff_bytes()])))
+            return upload_result_response(result)
+
+        except exceptions.ParseError as e:
+            return json_response({'detail': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"二进制图片异步上传时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return json_response({
+                'message': '图片上传失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncRawBinaryImageUploadView(AsyncAPIView):
+    """原始二进制图片上传异步视图（直接接收二进制数据）"""
+
+    async def post(self, request):
+        """上传原始二进制图片数据"""
+        try:
+            if not aio_oss_service:
+                return oss_unavailable_response()
+
+            if request.content_type == 'multipart/form-data':
+                # 如果是multipart/form-data格式
+                data = await self.form_data(request)
+                file_obj = next(iter(request.FILES.values()), None)
+                image_data = await sync_to_async(file_obj.read, thread_sensitive=False)() if file_obj else None
+                filename = data.get('filename')
+                folder = data.get('folder', 'images')
+                content_type = data.get('content_type')
+            else:
+                # 如果是原始二进制数据
+                image_data = request.body
+                filename = request.GET.get('filename') or request.META.get('HTTP_X_FILENAME')
+                folder = request.GET.get('folder', 'images')
+                content_type = request.content_type
+
+            if not image_data:
+                return json_response({
+                    'message': '未找到图片数据',
+                    'error': '请在请求体中提供图片的二进制数据'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if not filename:
+                return json_response({
+                    'message': '缺少必要参数',
+                    'error': 'filename 参数不能为空'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            serializer = RawBinaryImageUploadSerializer(data={
+                'filename': filename,
+                'folder': folder,
+                'content_type': content_type or 'application/octet-stream'
+            })
+            if not serializer.is_valid():
+                return json_response({
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # 验证图片数据大小
+            max_size = 5 * 1024 * 1024  # 5MB
+            if len(image_data) > max_size:
+                return json_response({
+                    'message': '图片数据大小不能超过5MB'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # 验证是否为有效图片（只解析文件头，不需要放到线程中）
+            try:
+                image_info = validate_image_header(image_data[:get_sniff_bytes()])
+            except InvalidImage as e:
+                return json_response({
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            result = await aio_oss_service.upload_file(
+                file_content=image_data,
+                filename=filename,
+                folder=folder
+            )
+            await sync_to_async(record_image)(request.user, result, serializer.validated_data['folder'], image_info)
+            return upload_result_response(result)
+
+        except Exception as e:
+            logger.error(f"原始二进制图片异步上传时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return json_response({
+                'message': '图片上传失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
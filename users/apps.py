@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # 注册用户缓存的失效信号
+        from . import authentication  # noqa: F401
+        # 注册系统检查
+        from . import checks  # noqa: F401
+        # 注册进程处理第一个请求时派发遗留上传任务的信号
+        from . import upload_jobs  # noqa: F401
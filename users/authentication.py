@@ -0,0 +1,116 @@
+"""
+带缓存的JWT认证
+
+simplejwt 的 JWTAuthentication 每个请求都要按用户ID查询一次数据库，这里改为两级缓存：
+- 进程内LRU缓存，有效期 USER_CACHE_LOCAL_TIMEOUT 秒
+- USER_CACHE_ALIAS 指定的缓存，有效期 USER_CACHE_TIMEOUT 秒
+用户保存或删除的事务提交后（包括资料修改、is_active 变化、修改密码）清除当前进程的进程内缓存和 USER_CACHE_ALIAS 中的缓存；
+直接使用 QuerySet.update() 修改用户不会触发信号，需要手动调用 invalidate_user。
+
+其他进程读到旧数据的时间上限取决于 USER_CACHE_ALIAS：
+使用Redis等多进程共享的缓存时为 USER_CACHE_LOCAL_TIMEOUT 秒；
+使用默认的进程内缓存（LocMemCache）时每个进程各有一份，上限为 USER_CACHE_TIMEOUT 秒。
+"""
+import copy
+import time
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .caching import TTLCache
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+local_user_cache = TTLCache(getattr(settings, 'USER_CACHE_LOCAL_SIZE', 10000))
+
+
+def get_user_cache():
+    """用户共享缓存 USER_CACHE_ALIAS"""
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def make_user_cache_key(user_id) -> str:
+    return f"auth_user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    按用户ID获取用户，先查进程内缓存，再查共享缓存，最后查数据库
+
+    每次返回新的副本，视图修改 request.user 不会影响缓存中的对象。
+    返回的对象可能是旧数据，修改用户时需要从数据库重新读取，或只保存修改的字段（save(update_fields=...)），
+    否则整行保存会把旧数据写回数据库。
+
+    Args:
+        user_id: USER_ID_FIELD 的值
+
+    Returns:
+        用户对象
+
+    Raises:
+        User.DoesNotExist: 用户不存在
+    """
+    key = make_user_cache_key(user_id)
+    user = local_user_cache.get(key)
+    if user is None:
+        user = get_user_cache().get(key)
+        if user is None:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            get_user_cache().set(key, user, timeout=getattr(settings, 'USER_CACHE_TIMEOUT', 60))
+        local_user_cache.set(key, user, time.time() + getattr(settings, 'USER_CACHE_LOCAL_TIMEOUT', 5))
+    return copy.copy(user)
+
+
+def invalidate_user(user_id):
+    """清除用户的缓存（当前进程的进程内缓存和共享缓存）"""
+    key = make_user_cache_key(user_id)
+    local_user_cache.delete(key)
+    get_user_cache().delete(key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_on_change(sender, instance, **kwargs):
+    """
+    用户保存或删除的事务提交后清除缓存
+
+    在事务内清除时，提交前的并发请求可能把旧数据重新写入缓存，因此等提交后再清除。
+    """
+    user_id = getattr(instance, api_settings.USER_ID_FIELD)
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """从缓存中获取用户的 JWTAuthentication，缓存命中时认证不查询数据库"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = get_cached_user(user_id)
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
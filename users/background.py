@@ -0,0 +1,138 @@
+"""
+后台任务工具
+
+按进程创建的线程池、进程内的延迟派发，以及按主键区间分批删除记录的清理函数，
+供上传、异步任务、短信派发和各个清理命令共用。
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+
+from django.db.models import Max, Min, QuerySet
+
+# 每个进程独立的线程池（fork之后需要重新创建）
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_pid = None
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """
+    获取当前进程中指定名称的线程池
+
+    线程池按进程惰性创建，gunicorn preload 之后 fork 出的子进程会丢弃继承来的线程池并重新创建。
+    不同用途（批量上传、分片上传）使用不同的线程池，避免任务互相等待导致死锁。
+
+    Args:
+        name: 线程池名称
+        max_workers: 最大线程数
+
+    Returns:
+        当前进程的线程池
+    """
+    global _executors_pid
+    pid = os.getpid()
+    executor = _executors.get(name)
+    if executor is None or _executors_pid != pid:
+        with _executors_lock:
+            if _executors_pid != pid:
+                _executors.clear()
+                _executors_pid = pid
+            executor = _executors.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=max(1, max_workers),
+                    thread_name_prefix=name,
+                )
+                _executors[name] = executor
+    return executor
+
+
+class DispatchTimer:
+    """
+    进程内的延迟派发：到期后调用一次 callback
+
+    每个实例最多只有一个等待中的Timer线程，新的到期时间早于已安排的时间时才重新安排，
+    大量任务同时等待重试时不会为每次派发创建线程。fork 之后子进程中继承来的Timer已不存在，会重新安排。
+    """
+
+    def __init__(self, callback: Callable[[], Any]):
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._due = 0.0
+
+    def schedule(self, delay: float):
+        """
+        在 delay 秒后派发
+
+        Args:
+            delay: 等待秒数
+        """
+        delay = max(0.0, delay)
+        due = time.monotonic() + delay
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                if self._due <= due:
+                    return
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._fire)
+            self._timer.daemon = True
+            self._due = due
+            self._timer.start()
+
+    def _fire(self):
+        with self._lock:
+            if self._timer is threading.current_thread():
+                self._timer = None
+        self.callback()
+
+
+
+def purge_in_batches(queryset: QuerySet, batch_size: int = 1000, sleep: float = 0,
+                     archive: Optional[Callable[[QuerySet], List[Any]]] = None,
+                     progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    按主键区间分批删除查询集中的记录
+
+    按主键区间 [start, start + batch_size) 逐批删除，每批是一条按主键范围的短事务，
+    不会长时间锁表，也不会产生一次性的大量WAL；两批之间可以暂停 sleep 秒以降低对线上的影响。
+    只处理开始时已存在的记录（主键不超过开始时的最大主键）。
+
+    Args:
+        queryset: 要删除的记录（已按条件过滤）
+        batch_size: 每批的主键区间大小
+        sleep: 每批之间暂停的秒数
+        archive: 删除前调用，参数为本批的查询集，返回已归档记录的主键，只删除这些记录
+        progress: 每批完成后调用，参数为本批删除的记录数
+
+    Returns:
+        删除的记录数
+    """
+    model = queryset.model
+    bounds = model.objects.aggregate(min_id=Min('pk'), max_id=Max('pk'))
+    if bounds['min_id'] is None:
+        return 0
+
+    purged = 0
+    start = bounds['min_id']
+    while start <= bounds['max_id']:
+        end = start + batch_size
+        batch = queryset.filter(pk__gte=start, pk__lt=end)
+        if archive is not None:
+            archived = archive(batch)
+            deleted = 0
+            if archived:
+                deleted, _ = model.objects.filter(pk__in=archived).delete()
+        else:
+            deleted, _ = batch.delete()
+
+        purged += deleted
+        if progress is not None:
+            progress(deleted)
+        start = end
+        if sleep and deleted and start <= bounds['max_id']:
+            time.sleep(sleep)
+    return purged
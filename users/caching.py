@@ -0,0 +1,95 @@
+"""
+进程内缓存工具
+"""
+import hashlib
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    带过期时间的LRU缓存（线程安全，每个进程独立）
+
+    每个条目写入时指定过期的时间戳，读取时过期的条目视为不存在；
+    条目数超过 max_size 时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max(1, max_size)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取未过期的值，不存在或已过期时返回None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            expires_at: 过期时间（time.time() 时间戳）
+        """
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """删除缓存条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class BloomFilter:
+    """
+    布隆过滤器
+
+    判断“不存在”时一定准确，判断“可能存在”时有约 error_rate 的误判概率（元素数不超过 capacity 时）。
+    只支持添加，不支持删除。
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
@@ -0,0 +1,40 @@
+"""
+系统检查
+
+令牌撤销记录和缓存中的验证码需要所有worker进程共享，指向进程内缓存时其他进程仍然接受已撤销的令牌、
+找不到另一个进程保存的验证码。
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# 需要多进程共享的缓存设置
+SHARED_CACHE_SETTINGS = [
+    'TOKEN_BLACKLIST_CACHE_ALIAS',
+    'SMS_CODE_CACHE_ALIAS',
+]
+
+# 只在当前进程内有效的缓存后端
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def get_cache_backend(alias: str) -> str:
+    return settings.CACHES.get(alias, {}).get('BACKEND', '')
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """检查需要共享的缓存没有使用进程内缓存"""
+    errors = []
+    for setting in SHARED_CACHE_SETTINGS:
+        alias = getattr(settings, setting, 'default')
+        if get_cache_backend(alias) in PROCESS_LOCAL_CACHE_BACKENDS:
+            errors.append(Error(
+                f"{setting} 指向的缓存 '{alias}' 只在当前进程内有效",
+                hint="多进程部署时各worker进程的数据互不可见，请使用Redis、Memcached或数据库缓存（DatabaseCache）",
+                obj=setting,
+                id='users.E001',
+            ))
+    return errors
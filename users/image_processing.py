@@ -0,0 +1,148 @@
+"""
+图片衍生图处理（缩略图、中图、WebP/JPEG重新编码）
+
+Pillow的解码和编码在进程池中执行，不占用请求线程的GIL。
+"""
+import io
+import multiprocessing
+import os
+import threading
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Dict, Any
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# 格式对应的扩展名和MIME类型
+FORMAT_EXTENSIONS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'WEBP': ('.webp', 'image/webp'),
+    'PNG': ('.png', 'image/png'),
+}
+
+# 每个进程独立的图片处理进程池（fork之后需要重新创建）
+_process_pool = None
+_process_pool_pid = None
+_process_pool_lock = threading.Lock()
+
+
+def get_start_method() -> str:
+    """图片处理子进程的启动方式"""
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    获取当前进程的图片处理进程池
+
+    进程池按worker进程惰性创建，进程数由 IMAGE_PROCESS_WORKERS 控制。
+    子进程使用 forkserver（不支持时使用 spawn）启动，不从已经启动了线程池和数据库连接的worker进程直接fork，
+    避免复制其他线程持有的锁导致子进程死锁。
+
+    Returns:
+        当前进程的进程池
+    """
+    global _process_pool, _process_pool_pid
+    pid = os.getpid()
+    if _process_pool is None or _process_pool_pid != pid:
+        with _process_pool_lock:
+            if _process_pool is None or _process_pool_pid != pid:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=max(1, getattr(settings, 'IMAGE_PROCESS_WORKERS', 2)),
+                    mp_context=multiprocessing.get_context(get_start_method()),
+                )
+                _process_pool_pid = pid
+    return _process_pool
+
+
+def get_derivative_specs() -> Dict[str, Dict[str, Any]]:
+    """获取衍生图配置 IMAGE_DERIVATIVES"""
+    return getattr(settings, 'IMAGE_DERIVATIVES', {})
+
+
+def derivative_key(object_key: str, name: str, image_format: str) -> str:
+    """
+    生成衍生图的对象key，与原图放在同一目录
+
+    例如 images/2024/01/15/abc.jpg 的缩略图为 images/2024/01/15/abc_thumbnail.webp
+
+    Args:
+        object_key: 原图对象key
+        name: 衍生图名称
+        image_format: 衍生图格式
+
+    Returns:
+        衍生图对象key
+    """
+    base, _ = os.path.splitext(object_key)
+    ext, _ = FORMAT_EXTENSIONS[image_format.upper()]
+    return f"{base}_{name}{ext}"
+
+
+def derivative_keys(object_key: str) -> list:
+    """获取原图对应的全部衍生图对象key"""
+    return [
+        derivative_key(object_key, name, spec['format'])
+        for name, spec in get_derivative_specs().items()
+    ]
+
+
+def render_derivatives(image_bytes: bytes, specs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    生成衍生图（在进程池中执行）
+
+    按EXIF方向信息旋转图片，缩放到不超过 max_size，再按 format/quality 重新编码，输出不保留EXIF。
+
+    Args:
+        image_bytes: 原图数据
+        specs: 衍生图配置，{名称: {'max_size': (宽, 高) 或 None, 'format': 'WEBP', 'quality': 80}}
+
+    Returns:
+        {名称: {'content': 字节, 'format': 格式, 'content_type': MIME类型, 'width': 宽, 'height': 高}}
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        # JPEG可以在解码时直接缩小，按需要的最大尺寸解码以减少计算量
+        sizes = [spec.get('max_size') for spec in specs.values()]
+        if img.format == 'JPEG' and sizes and all(sizes):
+            img.draft('RGB', (max(w for w, _ in sizes), max(h for _, h in sizes)))
+        img = ImageOps.exif_transpose(img)
+
+        derivatives = {}
+        for name, spec in specs.items():
+            image_format = spec['format'].upper()
+            derived = img.copy()
+            if spec.get('max_size'):
+                derived.thumbnail(tuple(spec['max_size']), Image.LANCZOS)
+            if image_format == 'JPEG' and derived.mode not in ('RGB', 'L'):
+                derived = derived.convert('RGB')
+
+            buffer = io.BytesIO()
+            derived.save(buffer, format=image_format, quality=spec.get('quality', 85), optimize=True)
+            _, content_type = FORMAT_EXTENSIONS[image_format]
+            derivatives[name] = {
+                'content': buffer.getvalue(),
+                'format': image_format,
+                'content_type': content_type,
+                'width': derived.width,
+                'height': derived.height,
+            }
+        return derivatives
+
+
+def submit_derivatives(image_bytes: bytes, specs: Optional[Dict[str, Dict[str, Any]]] = None) -> Future:
+    """
+    把衍生图生成任务提交到进程池
+
+    Args:
+        image_bytes: 原图数据
+        specs: 衍生图配置，默认取 IMAGE_DERIVATIVES
+
+    Returns:
+        结果为 render_derivatives 返回值的Future
+    """
+    if specs is None:
+        specs = get_derivative_specs()
+    return get_process_pool().submit(render_derivatives, image_bytes, specs)
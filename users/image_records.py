@@ -0,0 +1,188 @@
+"""
+用户上传图片记录
+
+上传成功后在数据库中记录图片归属和元数据，列表接口直接查询数据库，不需要扫描OSS。
+列表按 (created_at, id) 倒序做游标分页，每页查询只扫描索引中的一页数据，与用户的图片总数无关。
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Callable
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import UploadedImage
+
+logger = logging.getLogger(__name__)
+
+NOT_OWNED_ERROR = '图片不存在或无权删除'
+DELETING_ERROR = '图片正在删除，请稍后重试'
+
+
+class InvalidCursor(ValueError):
+    """分页游标无法解析"""
+
+
+def record_image(user, result: Dict[str, Any], folder: str, image_info: Optional[Dict[str, Any]] = None) -> Optional[UploadedImage]:
+    """
+    记录一次成功的上传
+
+    记录失败只写日志，不影响已经完成的上传。
+
+    Args:
+        user: 上传用户
+        result: upload_file 返回的上传结果
+        folder: 存储文件夹
+        image_info: sniff_image 解析出的格式和宽高
+
+    Returns:
+        创建的记录，上传失败或记录失败时返回None
+    """
+    records = record_images(user, [(result, image_info)], folder)
+    return records[0] if records else None
+
+
+def record_images(user, uploads: Iterable[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]], folder: str) -> List[UploadedImage]:
+    """
+    批量记录上传成功的图片（一次INSERT）
+
+    Args:
+        user: 上传用户
+        uploads: (上传结果, 图片信息) 列表，失败的上传会被跳过
+        folder: 存储文件夹
+
+    Returns:
+        创建的记录列表
+    """
+    images = []
+    for result, image_info in uploads:
+        if not result.get('success'):
+            continue
+        image_info = image_info or {}
+        images.append(UploadedImage(
+            owner=user,
+            object_key=result['object_key'],
+            folder=folder,
+            original_filename=result.get('original_filename') or '',
+            size=result.get('size') or 0,
+            width=image_info.get('width'),
+            height=image_info.get('height'),
+            format=image_info.get('format') or '',
+            content_hash=result.get('content_hash') or '',
+        ))
+    if not images:
+        return []
+    try:
+        return UploadedImage.objects.bulk_create(images)
+    except Exception as e:
+        logger.error(f"记录上传图片失败: {str(e)}")
+        return []
+
+
+def delete_images(user, object_keys: Iterable[str], delete_files: Callable[[List[str], Dict[str, int]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    删除用户自己的图片
+
+    只删除 UploadedImage 中属于该用户的对象key，其余key返回失败（error 为 NOT_OWNED_ERROR），不会释放其他用户的去重引用。
+    先用一条条件UPDATE把用户的记录标记为正在删除，再在事务之外调用存储删除，存储删除成功后删除记录，失败时清除标记；
+    每个对象释放的引用数等于本次标记的记录数。同一用户并发删除同一张图片时只有先标记的请求释放引用，
+    其余请求返回 DELETING_ERROR；标记超过 IMAGE_DELETE_TIMEOUT 秒的记录视为删除进程已退出，可以重新删除。
+
+    Args:
+        user: 图片所属用户
+        object_keys: 要删除的对象key
+        delete_files: 存储服务的批量删除方法 delete_files(object_keys, references)
+
+    Returns:
+        每个对象key的删除结果，顺序与传入顺序一致（重复的key只返回一次）
+    """
+    object_keys = list(dict.fromkeys(object_keys))
+    marked_at = timezone.now()
+    stale_before = marked_at - timedelta(seconds=getattr(settings, 'IMAGE_DELETE_TIMEOUT', 300))
+    images = UploadedImage.objects.filter(owner=user, object_key__in=object_keys)
+    owned = set(images.values_list('object_key', flat=True))
+    images.filter(Q(deleting_at__isnull=True) | Q(deleting_at__lt=stale_before)).update(deleting_at=marked_at)
+    rows = list(images.filter(deleting_at=marked_at).values_list('id', 'object_key'))
+
+    references = Counter(key for _, key in rows)
+    claimed = [key for key in object_keys if key in references]
+    results = {}
+    try:
+        if claimed:
+            for result in delete_files(claimed, dict(references)):
+                results[result['object_key']] = result
+    finally:
+        deleted = {key for key, result in results.items() if result.get('success')}
+        with transaction.atomic():
+            UploadedImage.objects.filter(id__in=[image_id for image_id, key in rows if key in deleted]).delete()
+            UploadedImage.objects.filter(
+                id__in=[image_id for image_id, key in rows if key not in deleted],
+                deleting_at=marked_at,
+            ).update(deleting_at=None)
+
+    return [
+        results.get(key) or {
+            'success': False,
+            'object_key': key,
+            'error': DELETING_ERROR if key in owned else NOT_OWNED_ERROR,
+        }
+        for key in object_keys
+    ]
+
+
+def encode_cursor(image: UploadedImage) -> str:
+    """把一条记录的排序键编码为游标"""
+    payload = json.dumps([image.created_at.isoformat(), image.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    解析游标
+
+    Raises:
+        InvalidCursor: 游标格式错误
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, image_id = json.loads(payload)
+        return datetime.fromisoformat(created_at), int(image_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('无效的分页游标') from e
+
+
+def list_images(user, folder: Optional[str] = None, cursor: Optional[str] = None, limit: int = 20) -> Tuple[List[UploadedImage], Optional[str]]:
+    """
+    按上传时间倒序分页查询用户的图片
+
+    Args:
+        user: 图片所属用户
+        folder: 只查询指定文件夹，None表示全部
+        cursor: 上一页返回的 next_cursor，None表示第一页
+        limit: 每页数量
+
+    Returns:
+        (本页记录, 下一页游标)，没有下一页时游标为None
+
+    Raises:
+        InvalidCursor: 游标格式错误
+    """
+    queryset = UploadedImage.objects.filter(owner=user)
+    if folder:
+        queryset = queryset.filter(folder=folder)
+    if cursor:
+        created_at, image_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=image_id))
+
+    # 多取一条判断是否还有下一页
+    images = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    next_cursor = None
+    if len(images) > limit:
+        images = images[:limit]
+        next_cursor = encode_cursor(images[-1])
+    return images, next_cursor
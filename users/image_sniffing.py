@@ -0,0 +1,182 @@
+"""
+图片文件头解析
+
+只读取文件开头的少量字节解析格式和宽高，上传时用来快速校验图片并拒绝像素数过大的图片（解压炸弹），
+不需要用Pillow解码整张图片。完整解码只在生成衍生图时进行。
+"""
+import struct
+from typing import Optional, Dict, Any, IO, Tuple
+
+from django.conf import settings
+
+# 带尺寸信息的JPEG帧起始标记（SOF0-SOF15，排除DHT、JPG、DAC）
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class InvalidImage(ValueError):
+    """图片文件头无效或像素数超过限制"""
+
+
+def get_max_pixels() -> int:
+    """允许的最大像素数 IMAGE_MAX_PIXELS"""
+    return getattr(settings, 'IMAGE_MAX_PIXELS', 40_000_000)
+
+
+def get_sniff_bytes() -> int:
+    """解析文件头时最多读取的字节数 IMAGE_SNIFF_BYTES"""
+    return getattr(settings, 'IMAGE_SNIFF_BYTES', 256 * 1024)
+
+
+def detect_image_format(header: bytes) -> Optional[str]:
+    """
+    根据文件头的魔数判断图片格式，不解码图片
+
+    Args:
+        header: 文件开头的若干字节（至少12字节）
+
+    Returns:
+        JPEG、PNG、GIF、WEBP 之一，无法识别时返回None
+    """
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def _png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """IHDR块紧跟在文件签名之后"""
+    if len(data) < 24 or data[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', data[16:24])
+
+
+def _gif_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """逻辑屏幕描述符中的宽高"""
+    if len(data) < 10:
+        return None
+    return struct.unpack('<HH', data[6:10])
+
+
+def _webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """按第一个块的类型（有损、无损、扩展格式）解析画布尺寸"""
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        if len(data) < 30 or data[23:26] != b'\x9d\x01\x2a':
+            return None
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        if len(data) < 25 or data[20] != 0x2F:
+            return None
+        bits = struct.unpack('<I', data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        if len(data) < 30:
+            return None
+        return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+    return None
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """跳过APPn等段，直到第一个SOF段读取宽高；数据不足或格式错误时返回None"""
+    offset = 2
+    length = len(data)
+    while offset + 4 <= length:
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # 填充字节
+            offset += 1
+            continue
+        offset += 2
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # 没有长度字段的标记
+            continue
+        if marker in (0xD9, 0xDA):
+            # 在SOF之前遇到图像结束或扫描开始
+            return None
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 7 > length:
+                return None
+            height, width = struct.unpack('>HH', data[offset + 3:offset + 7])
+            return width, height
+        offset += struct.unpack('>H', data[offset:offset + 2])[0]
+    return None
+
+
+_SIZE_PARSERS = {
+    'JPEG': _jpeg_size,
+    'PNG': _png_size,
+    'GIF': _gif_size,
+    'WEBP': _webp_size,
+}
+
+
+def sniff_image(data: bytes) -> Optional[Dict[str, Any]]:
+    """
+    从文件头解析图片格式和宽高
+
+    Args:
+        data: 文件开头的字节（JPEG的EXIF等元数据较大时需要更多字节）
+
+    Returns:
+        {'format': 格式, 'width': 宽, 'height': 高}，无法识别时返回None
+    """
+    image_format = detect_image_format(data)
+    if image_format is None:
+        return None
+    size = _SIZE_PARSERS[image_format](data)
+    if not size or not size[0] or not size[1]:
+        return None
+    return {
+        'format': image_format,
+        'width': size[0],
+        'height': size[1],
+    }
+
+
+def validate_image_header(data: bytes, max_pixels: Optional[int] = None) -> Dict[str, Any]:
+    """
+    校验图片文件头，并拒绝像素数过大的图片
+
+    Args:
+        data: 文件开头的字节
+        max_pixels: 最大像素数，默认取 IMAGE_MAX_PIXELS
+
+    Returns:
+        sniff_image 的解析结果
+
+    Raises:
+        InvalidImage: 不是支持的图片格式、无法解析尺寸或像素数超过限制
+    """
+    info = sniff_image(data)
+    if info is None:
+        raise InvalidImage('无效的图片数据')
+    if max_pixels is None:
+        max_pixels = get_max_pixels()
+    if info['width'] * info['height'] > max_pixels:
+        raise InvalidImage(f"图片像素数不能超过{max_pixels}（当前为{info['width']}x{info['height']}）")
+    return info
+
+
+def read_image_header(file: IO, size: Optional[int] = None) -> bytes:
+    """
+    读取文件开头用于解析的字节，读取后回到原位置
+
+    Args:
+        file: 可回退的文件对象
+        size: 读取的字节数，默认取 IMAGE_SNIFF_BYTES
+
+    Returns:
+        文件开头的字节
+    """
+    position = file.tell()
+    data = file.read(size or get_sniff_bytes())
+    file.seek(position)
+    return data
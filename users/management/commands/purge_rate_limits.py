@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.throttling import purge_expired_counters
+
+
+class Command(BaseCommand):
+    help = '分批删除过期的限流计数记录（建议通过cron定时执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理的主键区间大小')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数')
+
+    def handle(self, *args, **options):
+        def progress(deleted):
+            if deleted and options['verbosity'] > 1:
+                self.stdout.write(f"本批删除{deleted}条")
+
+        started = time.monotonic()
+        purged = purge_expired_counters(
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            progress=progress,
+        )
+
+        elapsed = time.monotonic() - started
+        rate = purged / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"清理了{purged}条过期的限流计数记录，耗时{elapsed:.1f}秒（{rate:.0f}条/秒）")
@@ -0,0 +1,44 @@
+import gzip
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from users.sms_codes import purge_expired_codes
+
+
+class Command(BaseCommand):
+    help = '分批删除过期的短信验证码记录，可选归档为gzip压缩的JSON Lines文件（建议通过cron定时执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None, help='删除创建时间早于多少分钟之前的记录，默认取 SMS_CODE_EXPIRE_MINUTES')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理的主键区间大小')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数')
+        parser.add_argument('--archive', default=None, help='归档文件路径（.jsonl.gz），不指定时直接删除')
+
+    def handle(self, *args, **options):
+        older_than = None
+        if options['older_than'] is not None:
+            older_than = timedelta(minutes=options['older_than'])
+
+        def progress(deleted):
+            if deleted and options['verbosity'] > 1:
+                self.stdout.write(f"本批删除{deleted}条")
+
+        started = time.monotonic()
+        archive = gzip.open(options['archive'], 'at', encoding='utf-8') if options['archive'] else None
+        try:
+            purged = purge_expired_codes(
+                older_than=older_than,
+                batch_size=options['batch_size'],
+                sleep=options['sleep'],
+                archive=archive,
+                progress=progress,
+            )
+        finally:
+            if archive is not None:
+                archive.close()
+
+        elapsed = time.monotonic() - started
+        rate = purged / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"清理了{purged}条过期的验证码记录，耗时{elapsed:.1f}秒（{rate:.0f}条/秒）")
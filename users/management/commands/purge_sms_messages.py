@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from users.sms_dispatch import purge_sms_messages
+
+
+class Command(BaseCommand):
+    help = '分批删除已发送或发送失败的短信记录（建议通过cron定时执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None, help='删除创建时间早于多少天之前的记录，默认取 SMS_MESSAGE_RETENTION_DAYS')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批处理的主键区间大小')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数')
+
+    def handle(self, *args, **options):
+        older_than = None
+        if options['older_than'] is not None:
+            older_than = timedelta(days=options['older_than'])
+
+        def progress(deleted):
+            if deleted and options['verbosity'] > 1:
+                self.stdout.write(f"本批删除{deleted}条")
+
+        started = time.monotonic()
+        purged = purge_sms_messages(
+            older_than=older_than,
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            progress=progress,
+        )
+
+        elapsed = time.monotonic() - started
+        rate = purged / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"清理了{purged}条短信发送记录，耗时{elapsed:.1f}秒（{rate:.0f}条/秒）")
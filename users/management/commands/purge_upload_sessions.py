@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.upload_sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = '清理过期的断点续传会话和暂存分块（建议通过cron定时执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批删除的会话数')
+
+    def handle(self, *args, **options):
+        purged = purge_expired_sessions(batch_size=options['batch_size'])
+        self.stdout.write(f"清理了{purged}个过期的上传会话")
@@ -0,0 +1,34 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.sms_dispatch import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = '发送短信队列中的短信（SMS_DISPATCH_WORKER = "command" 时使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='发送完当前到期的短信后退出')
+        parser.add_argument('--sleep', type=float, default=None, help='队列为空时的轮询间隔（秒），默认取 SMS_DISPATCH_POLL_INTERVAL')
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        interval = options['sleep']
+        if interval is None:
+            interval = getattr(settings, 'SMS_DISPATCH_POLL_INTERVAL', 1)
+
+        self.stdout.write(f"短信发送worker已启动: {worker}")
+        try:
+            while True:
+                processed = dispatch_pending(worker=worker)
+                if processed:
+                    self.stdout.write(f"处理了{processed}条短信")
+                if options['once']:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('短信发送worker已退出')
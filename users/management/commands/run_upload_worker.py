@@ -0,0 +1,34 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.upload_jobs import process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = '处理后台上传任务（UPLOAD_JOB_WORKER = "command" 时使用）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='处理完当前等待中的任务后退出')
+        parser.add_argument('--sleep', type=float, default=None, help='队列为空时的轮询间隔（秒），默认取 UPLOAD_JOB_POLL_INTERVAL')
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        interval = options['sleep']
+        if interval is None:
+            interval = getattr(settings, 'UPLOAD_JOB_POLL_INTERVAL', 2)
+
+        self.stdout.write(f"上传任务worker已启动: {worker}")
+        try:
+            while True:
+                processed = process_pending_jobs(worker=worker)
+                if processed:
+                    self.stdout.write(f"处理了{processed}个上传任务")
+                if options['once']:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('上传任务worker已退出')
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_avatar_user_bio_user_birthday_user_nickname'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='内容SHA-256')),
+                ('object_key', models.CharField(db_index=True, max_length=255, verbose_name='OSS对象键')),
+                ('size', models.BigIntegerField(default=0, verbose_name='文件大小')),
+                ('ref_count', models.PositiveIntegerField(default=1, verbose_name='引用次数')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '上传内容',
+                'verbose_name_plural': '上传内容',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_uploadedcontent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_key', models.CharField(max_length=255, unique=True, verbose_name='OSS对象键')),
+                ('filename', models.CharField(max_length=255, verbose_name='原始文件名')),
+                ('folder', models.CharField(max_length=50, verbose_name='存储文件夹')),
+                ('content_type', models.CharField(max_length=100, verbose_name='MIME类型')),
+                ('status', models.CharField(choices=[('pending', '等待上传'), ('confirmed', '已确认')], default='pending', max_length=20, verbose_name='状态')),
+                ('size', models.BigIntegerField(blank=True, null=True, verbose_name='文件大小')),
+                ('expires_at', models.DateTimeField(verbose_name='签名过期时间')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('confirmed_at', models.DateTimeField(blank=True, null=True, verbose_name='确认时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='direct_uploads', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '直传记录',
+                'verbose_name_plural': '直传记录',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_directupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='任务ID')),
+                ('folder', models.CharField(max_length=50, verbose_name='存储文件夹')),
+                ('files', models.JSONField(default=list, verbose_name='暂存文件')),
+                ('results', models.JSONField(default=list, verbose_name='上传结果')),
+                ('status', models.CharField(choices=[('pending', '等待处理'), ('running', '处理中'), ('completed', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='执行次数')),
+                ('error', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_jobs', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '上传任务',
+                'verbose_name_plural': '上传任务',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='users_uploa_status_853644_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_uploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_key', models.CharField(db_index=True, max_length=255, verbose_name='OSS对象键')),
+                ('folder', models.CharField(max_length=50, verbose_name='存储文件夹')),
+                ('original_filename', models.CharField(blank=True, default='', max_length=255, verbose_name='原始文件名')),
+                ('size', models.BigIntegerField(default=0, verbose_name='文件大小')),
+                ('width', models.PositiveIntegerField(blank=True, null=True, verbose_name='宽度')),
+                ('height', models.PositiveIntegerField(blank=True, null=True, verbose_name='高度')),
+                ('format', models.CharField(blank=True, default='', max_length=10, verbose_name='图片格式')),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64, verbose_name='内容SHA-256')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to=settings.AUTH_USER_MODEL, verbose_name='上传用户')),
+            ],
+            options={
+                'verbose_name': '上传图片',
+                'verbose_name_plural': '上传图片',
+                'indexes': [models.Index(fields=['owner', 'folder', 'created_at', 'id'], name='users_uploa_owner_i_646720_idx'), models.Index(fields=['owner', 'created_at', 'id'], name='users_uploa_owner_i_8d8b26_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_uploadedimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='会话ID')),
+                ('filename', models.CharField(max_length=255, verbose_name='原始文件名')),
+                ('folder', models.CharField(max_length=50, verbose_name='存储文件夹')),
+                ('size', models.BigIntegerField(verbose_name='文件大小')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='分块大小')),
+                ('received', models.BigIntegerField(default=0, verbose_name='已接收字节数')),
+                ('status', models.CharField(choices=[('active', '上传中'), ('completing', '合并中'), ('completed', '已完成')], default='active', max_length=20, verbose_name='状态')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='上传结果')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='过期时间')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='更新时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '分块上传会话',
+                'verbose_name_plural': '分块上传会话',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='smscode',
+            index=models.Index(fields=['phone', 'is_used', 'created_at'], name='users_smsco_phone_352441_idx'),
+        ),
+    ]
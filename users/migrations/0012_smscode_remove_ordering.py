@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_smscode_phone_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='smscode',
+            options={'verbose_name': '短信验证码', 'verbose_name_plural': '短信验证码'},
+        ),
+    ]
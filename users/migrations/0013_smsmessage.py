@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_smscode_remove_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SmsMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20, verbose_name='手机号')),
+                ('template', models.CharField(max_length=50, verbose_name='短信模板')),
+                ('params', models.JSONField(default=dict, verbose_name='模板参数')),
+                ('status', models.CharField(choices=[('pending', '等待发送'), ('sending', '发送中'), ('sent', '已发送'), ('failed', '发送失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='发送次数')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次发送时间')),
+                ('claim_token', models.UUIDField(blank=True, null=True, verbose_name='领取标识')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='领取时间')),
+                ('provider_message_id', models.CharField(blank=True, default='', max_length=100, verbose_name='服务商消息ID')),
+                ('error', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='创建时间')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='发送时间')),
+            ],
+            options={
+                'verbose_name': '短信发送记录',
+                'verbose_name_plural': '短信发送记录',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='users_smsme_status_c844b9_idx')],
+            },
+        ),
+    ]
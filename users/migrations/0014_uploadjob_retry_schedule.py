@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_smsmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='claim_token',
+            field=models.UUIDField(blank=True, null=True, verbose_name='领取标识'),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次执行时间'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadjob',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='users_uploa_status_ee368d_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_uploadjob_retry_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='计数键')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='计数')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='过期时间')),
+            ],
+            options={
+                'verbose_name': '限流计数',
+                'verbose_name_plural': '限流计数',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_uploadedcontent_deleting_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedimage',
+            name='deleting_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='开始删除时间'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_uploadedimage_deleting_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='chunk_claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='分块写入领取时间'),
+        ),
+    ]
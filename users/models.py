@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.utils import timezone
@@ -53,10 +54,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         }
 
     def save(self, *args, **kwargs):
-        """重写 save 方法，自动更新 updated_at"""
+        """重写 save 方法，自动更新 updated_at（指定 update_fields 时一并保存 updated_at）"""
         if not self.created_at:
             self.created_at = timezone.now()
         self.updated_at = timezone.now()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at'}
         super().save(*args, **kwargs)
 
     class Meta:
@@ -89,4 +92,201 @@ class SmsCode(models.Model):
     class Meta:
         verbose_name = '短信验证码'
         verbose_name_plural = '短信验证码'
-        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['phone', 'is_used', 'created_at']),
+        ]
+
+
+class UploadedContent(models.Model):
+    """按内容哈希去重的OSS对象记录"""
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name='内容SHA-256')
+    object_key = models.CharField(max_length=255, db_index=True, verbose_name='OSS对象键')
+    size = models.BigIntegerField(default=0, verbose_name='文件大小')
+    ref_count = models.PositiveIntegerField(default=1, verbose_name='引用次数')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
+    deleting_at = models.DateTimeField(null=True, blank=True, verbose_name='开始删除时间')
+
+    def __str__(self):
+        return f"{self.sha256[:12]} - {self.object_key}"
+
+    class Meta:
+        verbose_name = '上传内容'
+        verbose_name_plural = '上传内容'
+
+
+class DirectUpload(models.Model):
+    """客户端直传OSS的上传记录"""
+    STATUS_PENDING = 'pending'
+    STATUS_CONFIRMED = 'confirmed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待上传'),
+        (STATUS_CONFIRMED, '已确认'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='direct_uploads', verbose_name='用户')
+    object_key = models.CharField(max_length=255, unique=True, verbose_name='OSS对象键')
+    filename = models.CharField(max_length=255, verbose_name='原始文件名')
+    folder = models.CharField(max_length=50, verbose_name='存储文件夹')
+    content_type = models.CharField(max_length=100, verbose_name='MIME类型')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='状态')
+    size = models.BigIntegerField(null=True, blank=True, verbose_name='文件大小')
+    expires_at = models.DateTimeField(verbose_name='签名过期时间')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
+    confirmed_at = models.DateTimeField(null=True, blank=True, verbose_name='确认时间')
+
+    def __str__(self):
+        return f"{self.user_id} - {self.object_key}"
+
+    class Meta:
+        verbose_name = '直传记录'
+        verbose_name_plural = '直传记录'
+
+
+class UploadJob(models.Model):
+    """后台上传任务（数据库队列）"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待处理'),
+        (STATUS_RUNNING, '处理中'),
+        (STATUS_COMPLETED, '已完成'),
+        (STATUS_FAILED, '失败'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name='任务ID')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_jobs', verbose_name='用户')
+    folder = models.CharField(max_length=50, verbose_name='存储文件夹')
+    files = models.JSONField(default=list, verbose_name='暂存文件')
+    results = models.JSONField(default=list, verbose_name='上传结果')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='状态')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='执行次数')
+    error = models.TextField(blank=True, default='', verbose_name='错误信息')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='下次执行时间')
+    claim_token = models.UUIDField(null=True, blank=True, verbose_name='领取标识')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成时间')
+
+    def __str__(self):
+        return f"{self.id} - {self.status}"
+
+    class Meta:
+        verbose_name = '上传任务'
+        verbose_name_plural = '上传任务'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class UploadedImage(models.Model):
+    """用户上传的图片记录"""
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='images', verbose_name='上传用户')
+    object_key = models.CharField(max_length=255, db_index=True, verbose_name='OSS对象键')
+    folder = models.CharField(max_length=50, verbose_name='存储文件夹')
+    original_filename = models.CharField(max_length=255, blank=True, default='', verbose_name='原始文件名')
+    size = models.BigIntegerField(default=0, verbose_name='文件大小')
+    width = models.PositiveIntegerField(null=True, blank=True, verbose_name='宽度')
+    height = models.PositiveIntegerField(null=True, blank=True, verbose_name='高度')
+    format = models.CharField(max_length=10, blank=True, default='', verbose_name='图片格式')
+    content_hash = models.CharField(max_length=64, blank=True, default='', verbose_name='内容SHA-256')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
+    deleting_at = models.DateTimeField(null=True, blank=True, verbose_name='开始删除时间')
+
+    def __str__(self):
+        return f"{self.owner_id} - {self.object_key}"
+
+    class Meta:
+        verbose_name = '上传图片'
+        verbose_name_plural = '上传图片'
+        # 列表接口按 (created_at, id) 倒序做游标分页
+        indexes = [
+            models.Index(fields=['owner', 'folder', 'created_at', 'id']),
+            models.Index(fields=['owner', 'created_at', 'id']),
+        ]
+
+
+class UploadSession(models.Model):
+    """可断点续传的分块上传会话"""
+    STATUS_ACTIVE = 'active'
+    STATUS_COMPLETING = 'completing'
+    STATUS_COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, '上传中'),
+        (STATUS_COMPLETING, '合并中'),
+        (STATUS_COMPLETED, '已完成'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name='会话ID')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions', verbose_name='用户')
+    filename = models.CharField(max_length=255, verbose_name='原始文件名')
+    folder = models.CharField(max_length=50, verbose_name='存储文件夹')
+    size = models.BigIntegerField(verbose_name='文件大小')
+    chunk_size = models.PositiveIntegerField(verbose_name='分块大小')
+    received = models.BigIntegerField(default=0, verbose_name='已接收字节数')
+    chunk_claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='分块写入领取时间')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE, verbose_name='状态')
+    result = models.JSONField(null=True, blank=True, verbose_name='上传结果')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='过期时间')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='更新时间')
+
+    def __str__(self):
+        return f"{self.id} - {self.received}/{self.size}"
+
+    class Meta:
+        verbose_name = '分块上传会话'
+        verbose_name_plural = '分块上传会话'
+
+
+class SmsMessage(models.Model):
+    """待发送的短信（数据库队列）"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待发送'),
+        (STATUS_SENDING, '发送中'),
+        (STATUS_SENT, '已发送'),
+        (STATUS_FAILED, '发送失败'),
+    ]
+
+    phone = models.CharField(max_length=20, verbose_name='手机号')
+    template = models.CharField(max_length=50, verbose_name='短信模板')
+    params = models.JSONField(default=dict, verbose_name='模板参数')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='状态')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='发送次数')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='下次发送时间')
+    claim_token = models.UUIDField(null=True, blank=True, verbose_name='领取标识')
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='领取时间')
+    provider_message_id = models.CharField(max_length=100, blank=True, default='', verbose_name='服务商消息ID')
+    error = models.TextField(blank=True, default='', verbose_name='错误信息')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='发送时间')
+
+    def __str__(self):
+        return f"{self.phone} - {self.status}"
+
+    class Meta:
+        verbose_name = '短信发送记录'
+        verbose_name_plural = '短信发送记录'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class RateLimitCounter(models.Model):
+    """滑动窗口限流的计数（每个限流对象的每个窗口一行）"""
+    key = models.CharField(max_length=255, unique=True, verbose_name='计数键')
+    count = models.PositiveIntegerField(default=0, verbose_name='计数')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='过期时间')
+
+    def __str__(self):
+        return f"{self.key} - {self.count}"
+
+    class Meta:
+        verbose_name = '限流计数'
+        verbose_name_plural = '限流计数'
@@ -2,164 +2,448 @@
 阿里云OSS服务封装
 """
 import os
-import uuid
-from datetime import datetime
-from typing import Optional, Dict, Any
+import hmac
+import json
+import base64
+import hashlib
+import itertools
+import threading
+import time
+from urllib.parse import quote, urlencode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Union, IO, Iterable
 import logging
 
 from django.conf import settings
 import alibabacloud_oss_v2 as oss  # 导入阿里云OSS V2 SDK
 import oss2
-from oss2 import OBJECT_ACL_PUBLIC_READ
+from oss2 import OBJECT_ACL_PUBLIC_READ, OBJECT_ACL_PRIVATE
+
+from .caching import TTLCache
+from .resilience import CircuitBreaker, call_with_retry
+from .background import get_executor
+from .storage import BaseStorageService, create_storage_service
 
 logger = logging.getLogger(__name__)
 
+# OSS调用熔断器（每个worker进程独立统计，同步和异步服务共用）
+oss_circuit_breaker = CircuitBreaker(
+    'oss',
+    failure_threshold=getattr(settings, 'OSS_CIRCUIT_FAILURE_THRESHOLD', 5),
+    recovery_timeout=getattr(settings, 'OSS_CIRCUIT_RECOVERY_TIMEOUT', 30),
+    half_open_max_calls=getattr(settings, 'OSS_CIRCUIT_HALF_OPEN_MAX_CALLS', 1),
+)
+
+
+def is_retryable_oss_error(error: Exception) -> bool:
+    """
+    判断OSS调用错误是否可重试（网络错误、超时、限流和5xx）
+
+    Args:
+        error: oss2 或 alibabacloud_oss_v2 抛出的异常
+
+    Returns:
+        可重试时返回True
+    """
+    if isinstance(error, oss.exceptions.OperationError):
+        error = error.unwrap()
+    if isinstance(error, (oss2.exceptions.RequestError, oss.exceptions.RequestError, oss.exceptions.ResponseError)):
+        return True
+    if isinstance(error, oss2.exceptions.OssError):
+        return error.status >= 500 or error.status in (408, 429)
+    if isinstance(error, oss.exceptions.ServiceError):
+        return error.status_code >= 500 or error.status_code in (408, 429)
+    return False
+
+
+# 私有模式下签名URL的进程内缓存，键为对象key
+signed_url_cache = TTLCache(getattr(settings, 'OSS_SIGNED_URL_CACHE_SIZE', 10000))
+
+
+def get_object_acl() -> str:
+    """上传对象的ACL：OSS_PRIVATE_OBJECTS 开启时为私有，否则为公共读"""
+    return OBJECT_ACL_PRIVATE if getattr(settings, 'OSS_PRIVATE_OBJECTS', False) else OBJECT_ACL_PUBLIC_READ
 
-class AlibabaCloudOSSService:
+
+def get_connection_pool_size() -> int:
+    """
+    每个进程的OSS连接池大小
+
+    OSS_CONNECTION_POOL_SIZE 未设置时按进程内可能同时调用OSS的线程数计算：
+    请求线程（OSS_REQUEST_THREADS）、批量上传和衍生图线程池、分片上传线程池以及后台上传任务线程池。
+    """
+    pool_size = getattr(settings, 'OSS_CONNECTION_POOL_SIZE', None)
+    if pool_size:
+        return pool_size
+    upload_concurrency = getattr(settings, 'OSS_UPLOAD_CONCURRENCY', 4)
+    return max(1, (
+        getattr(settings, 'OSS_REQUEST_THREADS', 1)
+        + upload_concurrency * 2
+        + getattr(settings, 'OSS_MULTIPART_CONCURRENCY', 4)
+        + getattr(settings, 'UPLOAD_JOB_LOCAL_WORKERS', 2)
+    ))
+
+
+def get_part_executor() -> ThreadPoolExecutor:
+    """获取分片上传线程池，并发度由 OSS_MULTIPART_CONCURRENCY 控制"""
+    return get_executor('oss-part', getattr(settings, 'OSS_MULTIPART_CONCURRENCY', 4))
+
+
+class AlibabaCloudOSSService(BaseStorageService):
     """阿里云OSS服务类"""
     
     def __init__(self):
-        """初始化OSS客户端"""
+        """
+        读取OSS配置并检查凭据
+
+        不在这里创建连接：gunicorn preload_app 时服务实例在master进程中创建，
+        HTTP会话和连接池由每个worker进程在第一次调用时自己创建，见 oss_bucket。
+        """
         try:
-            # 配置OSS客户端
-            credentials_provider = oss.credentials.EnvironmentVariableCredentialsProvider()
-            cfg = oss.config.load_default()
-            cfg.credentials_provider = credentials_provider
-            cfg.endpoint = getattr(settings, 'OSS_ENDPOINT', 'oss-cn-hangzhou.aliyuncs.com')
-            cfg.region = getattr(settings, 'OSS_REGION_ID', 'cn-hangzhou')
-            # 初始化OSS客户端
-            self.oss_client = oss.Client(cfg)
+            self.endpoint = getattr(settings, 'OSS_ENDPOINT', 'oss-cn-hangzhou.aliyuncs.com')
             self.bucket_name = getattr(settings, 'OSS_BUCKET_NAME', '')
             self.url_prefix = getattr(settings, 'OSS_URL_PREFIX', '')
-            # 初始化OSS bucket
+            self.timeout = (
+                getattr(settings, 'OSS_CONNECT_TIMEOUT', 5),
+                getattr(settings, 'OSS_READ_TIMEOUT', 30),
+            )
             access_key_id = os.environ.get('OSS_ACCESS_KEY_ID')
             access_key_secret = os.environ.get('OSS_ACCESS_KEY_SECRET')
-            auth = oss2.auth.Auth(access_key_id, access_key_secret)
-            self.oss_bucket = oss2.Bucket(auth, cfg.endpoint, self.bucket_name)
-            logger.info("阿里云OSS客户端初始化成功")
-            
+            if not access_key_id or not access_key_secret:
+                raise ValueError('未配置 OSS_ACCESS_KEY_ID 或 OSS_ACCESS_KEY_SECRET 环境变量')
+            self.auth = oss2.Auth(access_key_id, access_key_secret)
+            self._bucket = None
+            self._bucket_pid = None
+            self._bucket_lock = threading.Lock()
+            logger.info("阿里云OSS服务配置加载成功")
+
         except Exception as e:
             logger.error(f"初始化阿里云OSS客户端失败: {str(e)}")
             raise
-    
-    def generate_object_key(self, filename: str, folder: str = 'uploads') -> str:
+
+    @property
+    def oss_bucket(self) -> oss2.Bucket:
         """
-        生成对象存储的key
-        
+        获取当前进程的OSS bucket客户端
+
+        按进程惰性创建，fork出的子进程不会复用父进程的连接。进程内所有线程共用一个keep-alive会话，
+        连接池大小由 get_connection_pool_size 决定，避免每次上传重新进行TLS握手。
+        """
+        pid = os.getpid()
+        if self._bucket is None or self._bucket_pid != pid:
+            with self._bucket_lock:
+                if self._bucket is None or self._bucket_pid != pid:
+                    pool_size = get_connection_pool_size()
+                    self._bucket = oss2.Bucket(
+                        self.auth, self.endpoint, self.bucket_name,
+                        session=oss2.Session(pool_size=pool_size),
+                        connect_timeout=self.timeout
+                    )
+                    self._bucket_pid = pid
+                    logger.info(f"阿里云OSS客户端初始化成功: pid {pid}, 连接池大小 {pool_size}")
+        return self._bucket
+
+    def _call(self, func, *args, retries: Optional[int] = None, **kwargs):
+        """
+        经过熔断器调用OSS接口，可重试错误按随机指数退避重试
+
         Args:
-            filename: 原始文件名
-            folder: 存储文件夹
-            
+            func: OSS SDK方法
+            retries: 最多重试次数，默认取 OSS_RETRIES，非幂等操作传0
+
         Returns:
-            生成的对象key
+            func 的返回值
         """
-        # 获取文件扩展名
-        _, ext = os.path.splitext(filename)
-        
-        # 生成唯一文件名
-        unique_filename = f"{uuid.uuid4().hex}{ext}"
-        
-        # 按日期分组
-        date_path = datetime.now().strftime('%Y/%m/%d')
-        
-        # 完整的对象key
-        object_key = f"{folder}/{date_path}/{unique_filename}"
-        
-        return object_key
-    
-    def upload_file(self, file_content: bytes, filename: str, folder: str = 'uploads') -> Dict[str, Any]:
+        if retries is None:
+            retries = getattr(settings, 'OSS_RETRIES', 2)
+        return call_with_retry(
+            func, *args,
+            breaker=oss_circuit_breaker,
+            is_retryable=is_retryable_oss_error,
+            retries=retries,
+            base_delay=getattr(settings, 'OSS_RETRY_BASE_DELAY', 0.2),
+            max_delay=getattr(settings, 'OSS_RETRY_MAX_DELAY', 5),
+            **kwargs
+        )
+
+    def _store_object(self, object_key: str, file_content: Union[bytes, IO, Iterable[bytes]], size: Optional[int] = None) -> Dict[str, Any]:
         """
-        上传文件到OSS
-        
+        把内容写入指定的对象key，按大小选择普通上传、流式上传或分片上传
+
         Args:
-            file_content: 文件内容（字节）
-            filename: 原始文件名
-            folder: 存储文件夹
-            
+            object_key: 对象key
+            file_content: 文件内容（字节、文件对象或字节块迭代器）
+            size: 内容的声明大小，已知且不超过分片阈值时数据流直接转发给OSS
+
         Returns:
-            包含文件信息的字典
+            包含 success 和 size 的字典
         """
-        try:
-            # 生成对象key
-            object_key = self.generate_object_key(filename, folder)
-            logger.info(f"upload to bucket_name: {self.bucket_name}, object_key: {object_key}")
-            # 创建上传请求
-            # request = oss.PutObjectRequest(
-            #     bucket=self.bucket_name,
-            #     key=object_key,          # 对象在OSS中的路径/文件名
-            #     body=file_content,           # 直接传入二进制内容
-            #     # content_type='image/png'        # 可选：指定MIME类型
-            # )
-            # # 执行上传
-            # result = self.oss_client.put_object(request)
-            result = self.oss_bucket.put_object(object_key, file_content, headers={'x-oss-object-acl': OBJECT_ACL_PUBLIC_READ})
-            logger.info(f"result: {result}")
-
-            if result.status==200:
-                logger.info(f"文件上传成功: {result}")
+        headers = {'x-oss-object-acl': get_object_acl()}
+        threshold = getattr(settings, 'OSS_MULTIPART_THRESHOLD', 10 * 1024 * 1024)
+
+        if isinstance(file_content, (bytes, bytearray)) and len(file_content) <= threshold:
+            body = file_content
+        elif size is not None and size <= threshold:
+            return self._stream_object(object_key, file_content, headers)
+        else:
+            # 预读不超过阈值的数据，判断是否需要分片上传
+            part_size = getattr(settings, 'OSS_MULTIPART_PART_SIZE', 5 * 1024 * 1024)
+            parts = self._iter_parts(file_content, part_size)
+            head = []
+            head_size = 0
+            for part in parts:
+                head.append(part)
+                head_size += len(part)
+                if head_size > threshold:
+                    break
+
+            if head_size > threshold:
+                size = self.multipart_upload(object_key, itertools.chain(head, parts), headers=headers)
+                logger.info(f"文件分片上传成功: {object_key}")
                 return {
                     'success': True,
-                    'object_key': object_key,
-                    'file_url': self.get_file_url(object_key),
-                    'original_filename': filename,
-                    'size': len(file_content),
-                }
-            else:
-                logger.error(f"文件上传失败: {result}")
-                return {
-                    'success': False,
-                    'error': result.status_code
+                    'size': size,
                 }
-            
-        except Exception as e:
-            logger.error(f"文件上传失败: {str(e)}")
+            body = b''.join(head)
+
+        # 创建上传请求
+        # request = oss.PutObjectRequest(
+        #     bucket=self.bucket_name,
+        #     key=object_key,          # 对象在OSS中的路径/文件名
+        #     body=file_content,           # 直接传入二进制内容
+        #     # content_type='image/png'        # 可选：指定MIME类型
+        # )
+        # # 执行上传
+        # result = self.oss_client.put_object(request)
+        result = self._call(self.oss_bucket.put_object, object_key, body, headers=headers)
+        logger.info(f"result: {result}")
+
+        if result.status==200:
+            logger.info(f"文件上传成功: {result}")
+            return {
+                'success': True,
+                'size': len(body),
+            }
+        else:
+            logger.error(f"文件上传失败: {result}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': result.status
             }
-    
-    def delete_file(self, object_key: str) -> Dict[str, Any]:
+
+    def _stream_object(self, object_key: str, file_content: Union[IO, Iterable[bytes]], headers: Dict[str, str]) -> Dict[str, Any]:
         """
-        删除OSS中的文件
-        
+        以chunked编码把数据流边读边转发给OSS，内存占用只与块大小有关
+
+        数据流无法回放，因此失败时不重试。
+        """
+        chunk_size = getattr(settings, 'OSS_STREAM_CHUNK_SIZE', 64 * 1024)
+        uploaded = [0]
+
+        def body():
+            for data in self._iter_parts(file_content, chunk_size):
+                uploaded[0] += len(data)
+                yield data
+
+        result = self._call(self.oss_bucket.put_object, object_key, body(), headers=headers, retries=0)
+        if result.status == 200:
+            logger.info(f"文件流式上传成功: {object_key}")
+            return {
+                'success': True,
+                'size': uploaded[0],
+            }
+        logger.error(f"文件流式上传失败: {result}")
+        return {
+            'success': False,
+            'error': result.status
+        }
+
+    def multipart_upload(self, object_key: str, parts: Iterable[bytes], headers: Optional[Dict[str, str]] = None) -> int:
+        """
+        分片并行上传
+
+        分片在 OSS_MULTIPART_CONCURRENCY 个线程中并行上传，同时在途的分片数受限，
+        因此内存占用与分片大小成正比而不是与文件大小成正比。任一分片重试后仍失败时取消整个上传。
+
         Args:
             object_key: 对象key
-            
+            parts: 按顺序产生的分片数据（除最后一片外不小于100KB）
+            headers: 初始化分片上传时附带的请求头
+
         Returns:
-            删除结果
+            上传的总字节数
         """
+        upload_id = self._call(self.oss_bucket.init_multipart_upload, object_key, headers=headers).upload_id
+        concurrency = max(1, getattr(settings, 'OSS_MULTIPART_CONCURRENCY', 4))
+        in_flight = threading.BoundedSemaphore(concurrency * 2)
+        failed = threading.Event()
+        executor = get_part_executor()
+        futures = []
+        total_size = 0
+
+        def on_done(future):
+            if future.exception() is not None:
+                failed.set()
+            in_flight.release()
+
         try:
-            # 创建删除请求
-            
-            # 执行删除
-            result = self.oss_client.delete_object(
-                oss.DeleteObjectRequest(
-                    bucket=self.bucket_name,
-                    key=object_key
-                )
-            )
-            if result.status_code == 200:
-                logger.info(f"文件删除成功: {object_key}")
-                return {
-                    'success': True,
-                    'object_key': object_key
-                }
-            else:
-                logger.error(f"文件删除失败: {result}")
-                return {
-                    'success': False,
-                    'error': result.status_code
-                }
-        except Exception as e:
-            logger.error(f"文件删除失败: {str(e)}")
+            for part_number, data in enumerate(parts, start=1):
+                in_flight.acquire()
+                # 已有分片最终失败时不再继续读取
+                if failed.is_set():
+                    in_flight.release()
+                    break
+                total_size += len(data)
+                future = executor.submit(self._upload_part, object_key, upload_id, part_number, data)
+                future.add_done_callback(on_done)
+                futures.append(future)
+
+            part_infos = [future.result() for future in futures]
+            # 完成上传不是幂等操作，不重试
+            self._call(self.oss_bucket.complete_multipart_upload, object_key, upload_id, part_infos, retries=0)
+            return total_size
+        except Exception:
+            logger.error(f"分片上传失败，取消上传: {object_key}, upload_id: {upload_id}")
+            try:
+                self._call(self.oss_bucket.abort_multipart_upload, object_key, upload_id)
+            except Exception as e:
+                logger.error(f"取消分片上传失败: {str(e)}")
+            raise
+
+    def _upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> oss2.models.PartInfo:
+        """上传单个分片，失败时按随机指数退避重试"""
+        result = self._call(
+            self.oss_bucket.upload_part, object_key, upload_id, part_number, data,
+            retries=getattr(settings, 'OSS_MULTIPART_PART_RETRIES', 3)
+        )
+        return oss2.models.PartInfo(part_number, result.etag, size=len(data))
+
+    def _delete_object(self, object_key: str) -> Dict[str, Any]:
+        """
+        删除OSS中的对象
+
+        Args:
+            object_key: 对象key
+
+        Returns:
+            删除结果
+        """
+        # 执行删除
+        result = self._call(self.oss_bucket.delete_object, object_key)
+        if result.status in (200, 204):
+            return {
+                'success': True,
+                'object_key': object_key
+            }
+        else:
+            logger.error(f"文件删除失败: {result}")
             return {
                 'success': False,
-                'error': str(e)
+                'error': result.status
             }
-    
+
+    def _delete_objects(self, object_keys: List[str]) -> List[str]:
+        """使用 DeleteMultipleObjects 一次删除一组对象（最多1000个），返回已删除的对象key"""
+        result = self._call(self.oss_bucket.batch_delete_objects, object_keys)
+        return result.deleted_keys
+
+    def create_direct_upload(self, object_key: str, content_type: str, method: str = 'PUT', max_size: Optional[int] = None, expires: Optional[int] = None) -> Dict[str, Any]:
+        """
+        生成客户端直传OSS的签名
+
+        PUT 方式返回带签名的URL，客户端需要带上返回的请求头上传；
+        POST 方式返回表单上传的policy和签名，policy中限制了对象key、文件大小和MIME类型。
+
+        Args:
+            object_key: 对象key
+            content_type: 文件MIME类型
+            method: 上传方式，PUT 或 POST
+            max_size: POST方式允许的最大文件大小，默认取 OSS_DIRECT_UPLOAD_MAX_SIZE
+            expires: 签名有效期（秒），默认取 OSS_DIRECT_UPLOAD_EXPIRES
+
+        Returns:
+            客户端上传所需的信息
+        """
+        if expires is None:
+            expires = getattr(settings, 'OSS_DIRECT_UPLOAD_EXPIRES', 300)
+        if max_size is None:
+            max_size = getattr(settings, 'OSS_DIRECT_UPLOAD_MAX_SIZE', 5 * 1024 * 1024)
+        headers = {
+            'Content-Type': content_type,
+            'x-oss-object-acl': get_object_acl(),
+        }
+
+        if method == 'PUT':
+            upload_url = self.oss_bucket.sign_url('PUT', object_key, expires, headers=headers, slash_safe=True)
+            return {
+                'method': 'PUT',
+                'upload_url': upload_url,
+                'headers': headers,
+                'expires_in': expires,
+            }
+
+        credentials = self.oss_bucket.auth.credentials_provider.get_credentials()
+        expiration = (datetime.now(timezone.utc) + timedelta(seconds=expires)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        conditions = [
+            {'bucket': self.bucket_name},
+            ['eq', '$key', object_key],
+            ['eq', '$Content-Type', content_type],
+            ['content-length-range', 1, max_size],
+            {'x-oss-object-acl': headers['x-oss-object-acl']},
+        ]
+        fields = {
+            'key': object_key,
+            'Content-Type': content_type,
+            'x-oss-object-acl': headers['x-oss-object-acl'],
+            'success_action_status': '200',
+        }
+        security_token = credentials.get_security_token()
+        if security_token:
+            conditions.append({'x-oss-security-token': security_token})
+            fields['x-oss-security-token'] = security_token
+
+        policy = base64.b64encode(json.dumps({
+            'expiration': expiration,
+            'conditions': conditions,
+        }).encode()).decode()
+        signature = base64.b64encode(hmac.new(
+            credentials.get_access_key_secret().encode(),
+            policy.encode(),
+            hashlib.sha1
+        ).digest()).decode()
+        fields.update({
+            'OSSAccessKeyId': credentials.get_access_key_id(),
+            'policy': policy,
+            'Signature': signature,
+        })
+        return {
+            'method': 'POST',
+            'upload_url': self.url_prefix,
+            'fields': fields,
+            'expires_in': expires,
+        }
+
+    def get_object_size(self, object_key: str) -> Optional[int]:
+        """
+        查询对象大小
+
+        Args:
+            object_key: 对象key
+
+        Returns:
+            对象大小（字节），对象不存在时返回None
+        """
+        try:
+            return self._call(self.oss_bucket.head_object, object_key).content_length
+        except oss2.exceptions.NotFound:
+            return None
+
     def get_file_url(self, object_key: str) -> str:
         """
         获取文件的访问URL
+
+        OSS_PRIVATE_OBJECTS 开启时返回带签名的临时URL，见 sign_url。
         
         Args:
             object_key: 对象key
@@ -167,12 +451,55 @@ class AlibabaCloudOSSService:
         Returns:
             文件访问URL
         """
+        if getattr(settings, 'OSS_PRIVATE_OBJECTS', False):
+            return self.sign_url(object_key)
         return f"{self.url_prefix}/{object_key}"
 
+    def sign_url(self, object_key: str) -> str:
+        """
+        生成私有对象的GET签名URL
+
+        过期时间按时间窗口对齐：同一窗口内对同一对象生成的URL完全相同（各worker进程之间也相同），
+        浏览器和CDN可以缓存；窗口长度为 OSS_SIGNED_URL_EXPIRES - OSS_SIGNED_URL_MIN_REMAINING，
+        返回的URL剩余有效期始终不少于 OSS_SIGNED_URL_MIN_REMAINING 秒。
+        签名结果在进程内缓存到窗口结束，页面上大量图片的URL基本不需要重新计算。
+
+        Args:
+            object_key: 对象key
+
+        Returns:
+            带 OSSAccessKeyId、Expires、Signature 参数的URL
+        """
+        expires_in = getattr(settings, 'OSS_SIGNED_URL_EXPIRES', 3600)
+        min_remaining = getattr(settings, 'OSS_SIGNED_URL_MIN_REMAINING', 600)
+        step = max(1, expires_in - min_remaining)
+        window_start = int(time.time()) // step * step
+
+        cache_key = (self.bucket_name, object_key, window_start)
+        url = signed_url_cache.get(cache_key)
+        if url is not None:
+            return url
+
+        credentials = self.auth.credentials_provider.get_credentials()
+        expires = window_start + expires_in
+        string_to_sign = f"GET\n\n\n{expires}\n/{self.bucket_name}/{object_key}"
+        signature = base64.b64encode(hmac.new(
+            credentials.get_access_key_secret().encode(),
+            string_to_sign.encode(),
+            hashlib.sha1
+        ).digest()).decode()
+        url = f"{self.url_prefix}/{quote(object_key, safe='/')}?" + urlencode({
+            'OSSAccessKeyId': credentials.get_access_key_id(),
+            'Expires': expires,
+            'Signature': signature,
+        })
+        signed_url_cache.set(cache_key, url, window_start + step)
+        return url
+
 
-# 创建全局OSS服务实例
+# 创建全局存储服务实例（由 STORAGE_BACKEND 选择实现，默认为阿里云OSS）
 try:
-    oss_service = AlibabaCloudOSSService()
+    oss_service = create_storage_service()
 except Exception as e:
     logger.error(f"创建OSS服务实例失败: {str(e)}")
-    oss_service = None 
\ No newline at end of file
+    oss_service = None
@@ -0,0 +1,227 @@
+"""
+外部依赖调用的容错工具：熔断器和带随机退避的重试
+
+熔断器状态保存在进程内，每个worker进程独立统计。
+"""
+import time
+import random
+import asyncio
+import threading
+from typing import Optional, Dict, Any, Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时拒绝调用"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} 服务暂时不可用，请{int(retry_after) + 1}秒后重试")
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败 failure_threshold 次后打开，打开期间直接拒绝调用；
+    经过 recovery_timeout 秒后进入半开状态，放行最多 half_open_max_calls 个探测请求，
+    探测成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._half_open_calls = 0
+        self._probe_started_at = None
+        self._counters = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'rejected': 0,
+            'opened': 0,
+        }
+        self._last_failure = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self):
+        """打开超过 recovery_timeout 后转为半开（需持有锁）"""
+        now = time.monotonic()
+        if self._state == self.OPEN and now - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"熔断器进入半开状态: {self.name}")
+        elif self._state == self.HALF_OPEN and self._probe_started_at is not None \
+                and now - self._probe_started_at >= self.recovery_timeout:
+            # 探测请求被取消、没有上报结果时重新放行探测
+            self._half_open_calls = 0
+
+    def _open(self):
+        """打开熔断器（需持有锁）"""
+        if self._state != self.OPEN:
+            self._counters['opened'] += 1
+            logger.warning(f"熔断器打开: {self.name}, 连续失败{self._consecutive_failures}次")
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def before_call(self):
+        """
+        调用前检查是否放行
+
+        Raises:
+            CircuitOpenError: 熔断器打开或半开探测名额已满
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state == self.OPEN or (
+                self._state == self.HALF_OPEN and self._half_open_calls >= self.half_open_max_calls
+            ):
+                self._counters['rejected'] += 1
+                retry_after = 0
+                if self._opened_at is not None:
+                    retry_after = max(0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+                raise CircuitOpenError(self.name, retry_after)
+            if self._state == self.HALF_OPEN:
+                self._half_open_calls += 1
+                self._probe_started_at = time.monotonic()
+            self._counters['calls'] += 1
+
+    def record_success(self):
+        """记录一次成功调用"""
+        with self._lock:
+            self._counters['successes'] += 1
+            self._consecutive_failures = 0
+            if self._state == self.HALF_OPEN:
+                logger.info(f"熔断器关闭: {self.name}")
+                self._state = self.CLOSED
+                self._opened_at = None
+
+    def record_failure(self, error: Optional[Exception] = None):
+        """记录一次失败调用"""
+        with self._lock:
+            self._counters['failures'] += 1
+            self._consecutive_failures += 1
+            self._last_failure = str(error) if error is not None else None
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def reset(self):
+        """手动关闭熔断器并清空连续失败次数"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._half_open_calls = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取熔断器状态和计数，用于监控
+
+        Returns:
+            状态、连续失败次数、累计计数和最近一次失败原因
+        """
+        with self._lock:
+            self._refresh_state()
+            retry_after = None
+            if self._state == self.OPEN:
+                retry_after = max(0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'retry_after': retry_after,
+                'last_failure': self._last_failure,
+                **self._counters,
+            }
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """第 attempt 次重试前的等待时间（full jitter 指数退避）"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def call_with_retry(func: Callable, *args, breaker: Optional[CircuitBreaker] = None, is_retryable: Callable[[Exception], bool] = lambda e: False, retries: int = 0, base_delay: float = 0.2, max_delay: float = 5, **kwargs):
+    """
+    调用函数，失败时按随机指数退避重试
+
+    每次尝试都经过熔断器；只有 is_retryable 判定为可重试的错误（超时、5xx等）计为熔断器失败，
+    其余错误说明依赖仍然可用，直接抛出且不重试。
+
+    Args:
+        func: 被调用的函数
+        breaker: 熔断器，为None时不熔断
+        is_retryable: 判断错误是否可重试
+        retries: 最多重试次数，非幂等操作应为0
+        base_delay: 首次重试的最大等待时间（秒）
+        max_delay: 单次等待时间上限（秒）
+
+    Returns:
+        func 的返回值
+    """
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None:
+                if retryable:
+                    breaker.record_failure(e)
+                else:
+                    breaker.record_success()
+            if not retryable or attempt >= retries:
+                raise
+            attempt += 1
+            logger.warning(f"调用失败，第{attempt}次重试: {str(e)}")
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+async def async_call_with_retry(func: Callable, *args, breaker: Optional[CircuitBreaker] = None, is_retryable: Callable[[Exception], bool] = lambda e: False, retries: int = 0, base_delay: float = 0.2, max_delay: float = 5, **kwargs):
+    """call_with_retry 的异步版本，func 为协程函数"""
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None:
+                if retryable:
+                    breaker.record_failure(e)
+                else:
+                    breaker.record_success()
+            if not retryable or attempt >= retries:
+                raise
+            attempt += 1
+            logger.warning(f"异步调用失败，第{attempt}次重试: {str(e)}")
+            await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
@@ -1,14 +1,16 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import SmsCode
+from .models import UploadedImage
 import random
 from django.conf import settings
 import logging
 import traceback
 from django.utils import timezone
 import base64
-import io
-from PIL import Image
+from .sms_codes import save_code, consume_code, CODE_VALID, CODE_EXPIRED
+from .sms_dispatch import enqueue_login_code
+from .image_sniffing import InvalidImage, validate_image_header, read_image_header, get_sniff_bytes
+from .streaming import decode_base64_image, UploadTooLarge
 
 logger = logging.getLogger(__name__)
 
@@ -37,13 +39,12 @@ class SendSmsCodeSerializer(serializers.Serializer):
             # 生成6位随机验证码
             code = ''.join(random.choices('0123456789', k=settings.SMS_CODE_LENGTH))
         
-        # 保存验证码
-        SmsCode.objects.create(phone=phone, code=code)
+        # 保存验证码（SMS_CODE_STORE 选择数据库或缓存）
+        save_code(phone, code)
         
-        # 非测试模式下才发送短信
+        # 非测试模式下才发送短信（加入发送队列，由后台worker调用短信服务）
         if not is_test:
-            # TODO: 调用短信服务发送验证码
-            pass
+            enqueue_login_code(phone, code)
             
         return {'phone': phone, 'code': code}
 
@@ -65,43 +66,19 @@ class LoginSerializer(serializers.Serializer):
         
         logger.info(f"开始验证登录请求 - 手机号: {phone}")
         
-        # 查找最新的验证码记录
-        try:
-            # 先查看所有匹配的记录
-            all_codes = SmsCode.objects.filter(
-                phone=phone,
-                code=code,
-                is_used=False
-            ).order_by('-created_at')
-            logger.info(f"找到 {all_codes.count()} 条匹配的记录")
-            for sms in all_codes:
-                logger.info(f"记录ID: {sms.id}, 手机号: {sms.phone}, 验证码: {sms.code}, 创建时间: {sms.created_at}, 是否使用: {sms.is_used}")
-            
-            sms_code = all_codes.latest('created_at')
-            logger.info(f"使用最新记录: ID={sms_code.id}")
-        except SmsCode.DoesNotExist:
-            logger.warning(f"未找到匹配的验证码记录 - 手机号: {phone}, 验证码: {code}")
-            raise serializers.ValidationError({"code": "验证码错误"})
-        
-        # 验证码是否过期
-        if sms_code.is_expired():
-            logger.warning(f"验证码已过期 - 手机号: {phone}, 验证码: {code}")
+        # 校验并核销验证码（一次条件UPDATE，同一验证码只能登录一次）
+        status = consume_code(phone, code)
+        if status == CODE_EXPIRED:
             raise serializers.ValidationError({"code": "验证码已过期"})
+        if status != CODE_VALID:
+            raise serializers.ValidationError({"code": "验证码错误"})
         
-        # 将验证码对象添加到验证数据中
-        data['sms_code'] = sms_code
         return data
 
     def create(self, validated_data):
         """处理登录逻辑"""
         try:
             phone = validated_data['phone']
-            sms_code = validated_data['sms_code']
-            
-            # 标记验证码已使用
-            sms_code.is_used = True
-            sms_code.save()
-            logger.info(f"验证码已标记为使用 - ID: {sms_code.id}")
             
             # 获取或创建用户
             user, created = User.objects.get_or_create(phone=phone)
@@ -147,11 +124,36 @@ class UserProfileSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('个人简介不能超过100字')
         return value
 
+    def update(self, instance, validated_data):
+        """只保存提交的字段，不把实例中其他字段的旧值写回数据库"""
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class SniffedImageField(serializers.FileField):
+    """
+    图片文件字段
+
+    代替会用Pillow完整解码图片的 ImageField，只解析文件头校验格式、宽高和像素数，
+    解析结果保存在文件对象的 image_info 属性中。
+    """
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        try:
+            file.image_info = validate_image_header(read_image_header(file))
+        except InvalidImage as e:
+            raise serializers.ValidationError(str(e))
+        return file
+
 
 class ImageUploadSerializer(serializers.Serializer):
     """图片上传序列化器"""
-    image = serializers.ImageField(required=True)
+    image = SniffedImageField(required=True)
     folder = serializers.CharField(max_length=50, required=False, default='images')
+    async_upload = serializers.BooleanField(required=False, default=False, help_text="是否后台上传，为true时立即返回202和任务ID")
     
     def validate_image(self, value):
         """验证图片文件"""
@@ -179,12 +181,13 @@ class ImageUploadSerializer(serializers.Serializer):
 class BatchImageUploadSerializer(serializers.Serializer):
     """批量图片上传序列化器"""
     images = serializers.ListField(
-        child=serializers.ImageField(),
+        child=SniffedImageField(),
         min_length=1,
         max_length=10,  # 最多上传10张图片
         required=True
     )
     folder = serializers.CharField(max_length=50, required=False, default='images')
+    async_upload = serializers.BooleanField(required=False, default=False, help_text="是否后台上传，为true时立即返回202和任务ID")
     
     def validate_images(self, value):
         """验证图片列表"""
@@ -202,51 +205,54 @@ class BatchImageUploadSerializer(serializers.Serializer):
         return value
 
 
+class Base64ImageField(serializers.Field):
+    """
+    Base64图片字段
+
+    解码前按编码长度拒绝过大的数据，按块解码到预先分配的缓冲区，只解析文件头校验格式和像素数而不解码整张图片。
+    不是合法Base64的字符串按原始二进制数据（latin1）处理。
+    """
+
+    def __init__(self, max_size=5 * 1024 * 1024, **kwargs):
+        self.max_size = max_size
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            raise serializers.ValidationError('图片数据必须是字符串')
+        try:
+            image_bytes = decode_base64_image(data, self.max_size)
+        except UploadTooLarge:
+            raise serializers.ValidationError(f'图片数据大小不能超过{self.max_size // (1024 * 1024)}MB')
+        except ValueError as e:
+            if data.startswith('data:'):
+                raise serializers.ValidationError(f'图片数据格式错误: {str(e)}')
+            # 假设是原始二进制数据
+            if len(data) > self.max_size:
+                raise serializers.ValidationError(f'图片数据大小不能超过{self.max_size // (1024 * 1024)}MB')
+            try:
+                image_bytes = data.encode('latin1')
+            except UnicodeEncodeError:
+                raise serializers.ValidationError(f'图片数据格式错误: {str(e)}')
+
+        # 验证是否为有效图片
+        try:
+            validate_image_header(bytes(image_bytes[:get_sniff_bytes()]))
+        except InvalidImage as e:
+            raise serializers.ValidationError(str(e))
+        return image_bytes
+
+    def to_representation(self, value):
+        return base64.b64encode(value).decode('ascii')
+
+
 class BinaryImageUploadSerializer(serializers.Serializer):
     """二进制图片上传序列化器"""
-    image_data = serializers.CharField(required=True, help_text="Base64编码的图片数据或二进制数据")
+    image_data = Base64ImageField(required=True, help_text="Base64编码的图片数据或二进制数据")
     filename = serializers.CharField(max_length=255, required=True, help_text="文件名")
     folder = serializers.CharField(max_length=50, required=False, default='images')
     content_type = serializers.CharField(max_length=100, required=False, help_text="MIME类型，如image/jpeg")
     
-    def validate_image_data(self, value):
-        """验证图片数据"""
-        try:
-            # 如果是base64编码的数据，先解码
-            if value.startswith('data:image'):
-                # 处理 data:image/jpeg;base64,... 格式
-                header, data = value.split(',', 1)
-                image_bytes = base64.b64decode(data)
-            elif len(value) % 4 == 0:
-                # 尝试作为base64解码
-                try:
-                    image_bytes = base64.b64decode(value)
-                except:
-                    # 如果解码失败，假设是原始二进制数据
-                    image_bytes = value.encode('latin1') if isinstance(value, str) else value
-            else:
-                # 假设是原始二进制数据
-                image_bytes = value.encode('latin1') if isinstance(value, str) else value
-            
-            # 验证是否为有效图片
-            try:
-                img = Image.open(io.BytesIO(image_bytes))
-                img.verify()
-            except Exception:
-                raise serializers.ValidationError('无效的图片数据')
-            
-            # 检查文件大小（最大5MB）
-            max_size = 5 * 1024 * 1024  # 5MB
-            if len(image_bytes) > max_size:
-                raise serializers.ValidationError('图片数据大小不能超过5MB')
-                
-            return image_bytes
-            
-        except Exception as e:
-            if isinstance(e, serializers.ValidationError):
-                raise e
-            raise serializers.ValidationError(f'图片数据格式错误: {str(e)}')
-    
     def validate_filename(self, value):
         """验证文件名"""
         import re
@@ -296,3 +302,100 @@ class RawBinaryImageUploadSerializer(serializers.Serializer):
         if not re.match(r'^[a-zA-Z0-9_-]+$', value):
             raise serializers.ValidationError('文件夹名称只能包含字母、数字、下划线和连字符')
         return value
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    """客户端直传OSS签名请求序列化器"""
+    filename = serializers.CharField(max_length=255, required=True, help_text="文件名")
+    folder = serializers.CharField(max_length=50, required=False, default='images')
+    content_type = serializers.ChoiceField(
+        choices=['image/jpeg', 'image/png', 'image/gif', 'image/webp'],
+        required=True,
+        help_text="MIME类型，上传时必须与此一致"
+    )
+    method = serializers.ChoiceField(choices=['PUT', 'POST'], required=False, default='PUT', help_text="上传方式：PUT签名URL或POST表单policy")
+
+    def validate_filename(self, value):
+        """验证文件名"""
+        import re
+        # 检查文件扩展名
+        allowed_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+        if not any(value.lower().endswith(ext) for ext in allowed_extensions):
+            raise serializers.ValidationError('文件名必须以 .jpg, .jpeg, .png, .gif, .webp 结尾')
+
+        # 检查文件名是否包含非法字符
+        if not re.match(r'^[a-zA-Z0-9._-]+$', value):
+            raise serializers.ValidationError('文件名只能包含字母、数字、点、下划线和连字符')
+
+        return value
+
+    def validate_folder(self, value):
+        """验证文件夹名称"""
+        import re
+        if not re.match(r'^[a-zA-Z0-9_-]+$', value):
+            raise serializers.ValidationError('文件夹名称只能包含字母、数字、下划线和连字符')
+        return value
+
+
+class BatchDeleteImageSerializer(serializers.Serializer):
+    """批量删除图片序列化器"""
+    object_keys = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        min_length=1,
+        max_length=1000,  # 最多删除1000张图片
+        required=True,
+        help_text="OSS对象键列表"
+    )
+
+
+class UploadSessionSerializer(serializers.Serializer):
+    """断点续传会话创建序列化器"""
+    filename = serializers.CharField(max_length=255, required=True, help_text="文件名")
+    folder = serializers.CharField(max_length=50, required=False, default='images')
+    size = serializers.IntegerField(min_value=1, required=True, help_text="文件总大小（字节）")
+
+    def validate_filename(self, value):
+        """验证文件名"""
+        allowed_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+        if not any(value.lower().endswith(ext) for ext in allowed_extensions):
+            raise serializers.ValidationError('文件名必须以 .jpg, .jpeg, .png, .gif, .webp 结尾')
+        return value
+
+    def validate_folder(self, value):
+        """验证文件夹名称"""
+        import re
+        if not re.match(r'^[a-zA-Z0-9_-]+$', value):
+            raise serializers.ValidationError('文件夹名称只能包含字母、数字、下划线和连字符')
+        return value
+
+    def validate_size(self, value):
+        """验证文件大小"""
+        max_size = getattr(settings, 'UPLOAD_SESSION_MAX_SIZE', 5 * 1024 * 1024)
+        if value > max_size:
+            raise serializers.ValidationError(f'图片文件大小不能超过{max_size // (1024 * 1024)}MB')
+        return value
+
+
+class DirectUploadConfirmSerializer(serializers.Serializer):
+    """客户端直传完成确认序列化器"""
+    object_key = serializers.CharField(max_length=255, required=True, help_text="签名时返回的OSS对象键")
+
+
+class ImageListQuerySerializer(serializers.Serializer):
+    """图片列表查询参数序列化器"""
+    folder = serializers.CharField(max_length=50, required=False, help_text="只查询指定文件夹")
+    cursor = serializers.CharField(max_length=200, required=False, help_text="上一页返回的 next_cursor")
+    limit = serializers.IntegerField(min_value=1, max_value=100, required=False, default=20, help_text="每页数量")
+
+
+class UploadedImageSerializer(serializers.ModelSerializer):
+    """上传图片记录序列化器，file_url 由 context 中的 storage 生成"""
+    file_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadedImage
+        fields = ['object_key', 'file_url', 'folder', 'original_filename', 'size', 'width', 'height', 'format', 'content_hash', 'created_at']
+
+    def get_file_url(self, obj):
+        storage = self.context.get('storage')
+        return storage.get_file_url(obj.object_key) if storage else None
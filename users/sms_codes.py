@@ -0,0 +1,200 @@
+"""
+短信验证码的保存、校验与核销
+
+由 SMS_CODE_STORE 选择存储方式：
+- DatabaseSmsCodeStore（默认）：保存在 SmsCode 表中。校验和核销合并为一条条件UPDATE，
+  只有手机号、验证码匹配、未使用且未过期的记录会被标记为已使用，并发登录同一个验证码时只有一个请求能更新到记录。
+  查询走 (phone, is_used, created_at) 联合索引。
+- CacheSmsCodeStore：保存在 SMS_CODE_CACHE_ALIAS 指定的缓存中，由缓存的TTL负责过期，
+  核销使用缓存的原子删除，发送和登录都不写数据库。缓存必须是多进程共享的（默认为数据库缓存表，生产环境建议Redis），
+  指向进程内缓存时会被系统检查 users.E001 拒绝。
+
+数据库中过期的验证码由 `python manage.py purge_sms_codes` 按主键区间分批删除（可选归档）。
+"""
+from datetime import timedelta
+import json
+from typing import Optional, List, IO, Callable
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .background import purge_in_batches
+from .models import SmsCode
+
+logger = logging.getLogger(__name__)
+
+CODE_VALID = 'valid'
+CODE_INVALID = 'invalid'
+CODE_EXPIRED = 'expired'
+
+DEFAULT_SMS_CODE_STORE = 'users.sms_codes.DatabaseSmsCodeStore'
+
+
+def get_expire_seconds() -> int:
+    """验证码有效期 SMS_CODE_EXPIRE_MINUTES（秒）"""
+    return getattr(settings, 'SMS_CODE_EXPIRE_MINUTES', 5) * 60
+
+
+def get_code_cutoff():
+    """未过期验证码的最早创建时间"""
+    return timezone.now() - timedelta(seconds=get_expire_seconds())
+
+
+class DatabaseSmsCodeStore:
+    """保存在 SmsCode 表中的验证码"""
+
+    def save(self, phone: str, code: str):
+        """保存新发送的验证码"""
+        SmsCode.objects.create(phone=phone, code=code)
+
+    def consume(self, phone: str, code: str) -> str:
+        """
+        校验并核销验证码
+
+        成功时只有一次UPDATE；失败时再查询一次以区分验证码错误和已过期。
+
+        Args:
+            phone: 手机号
+            code: 用户提交的验证码
+
+        Returns:
+            CODE_VALID、CODE_INVALID 或 CODE_EXPIRED
+        """
+        updated = SmsCode.objects.filter(
+            phone=phone,
+            is_used=False,
+            created_at__gte=get_code_cutoff(),
+            code=code,
+        ).update(is_used=True, updated_at=timezone.now())
+        if updated:
+            return CODE_VALID
+        if SmsCode.objects.filter(phone=phone, is_used=False, code=code).exists():
+            return CODE_EXPIRED
+        return CODE_INVALID
+
+
+class CacheSmsCodeStore:
+    """
+    保存在Django缓存中的验证码
+
+    每个 (手机号, 验证码) 一个键，与数据库存储一样，有效期内新旧验证码都可以使用一次。
+    过期的键由缓存直接删除，因此过期的验证码返回 CODE_INVALID。
+    """
+
+    key_prefix = 'sms_code'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'SMS_CODE_CACHE_ALIAS', 'default')]
+
+    def make_key(self, phone: str, code: str) -> str:
+        return f"{self.key_prefix}:{phone}:{code}"
+
+    def save(self, phone: str, code: str):
+        """保存新发送的验证码，TTL为验证码有效期"""
+        self.cache.set(self.make_key(phone, code), 1, timeout=get_expire_seconds())
+
+    def consume(self, phone: str, code: str) -> str:
+        """
+        校验并核销验证码
+
+        delete 只有真正删除了键才返回True，并发登录同一个验证码时只有一个请求成功。
+        数据库缓存的 delete 不检查过期时间，先用 get 排除已过期但还没有被清理的键。
+
+        Args:
+            phone: 手机号
+            code: 用户提交的验证码
+
+        Returns:
+            CODE_VALID 或 CODE_INVALID
+        """
+        key = self.make_key(phone, code)
+        if self.cache.get(key) is not None and self.cache.delete(key):
+            return CODE_VALID
+        return CODE_INVALID
+
+
+_code_store = None
+_code_store_path = None
+
+
+def get_code_store():
+    """获取 SMS_CODE_STORE 配置的验证码存储（每个进程一个实例）"""
+    global _code_store, _code_store_path
+    path = getattr(settings, 'SMS_CODE_STORE', DEFAULT_SMS_CODE_STORE)
+    if _code_store is None or _code_store_path != path:
+        _code_store = import_string(path)()
+        _code_store_path = path
+    return _code_store
+
+
+def save_code(phone: str, code: str):
+    """
+    保存新发送的验证码
+
+    Args:
+        phone: 手机号
+        code: 验证码
+    """
+    get_code_store().save(phone, code)
+
+
+def consume_code(phone: str, code: str) -> str:
+    """
+    校验并核销验证码
+
+    Args:
+        phone: 手机号
+        code: 用户提交的验证码
+
+    Returns:
+        CODE_VALID、CODE_INVALID 或 CODE_EXPIRED
+    """
+    status = get_code_store().consume(phone, code)
+    if status == CODE_VALID:
+        logger.info(f"验证码核销成功 - 手机号: {phone}")
+    elif status == CODE_EXPIRED:
+        logger.warning(f"验证码已过期 - 手机号: {phone}")
+    else:
+        logger.warning(f"未找到匹配的验证码记录 - 手机号: {phone}")
+    return status
+
+
+def purge_expired_codes(older_than: Optional[timedelta] = None, batch_size: int = 1000, sleep: float = 0,
+                        archive: Optional[IO] = None, progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    分批删除过期的验证码记录
+
+    按主键区间逐批删除（见 purge_in_batches），每批是一条短事务，不会长时间锁表。
+
+    Args:
+        older_than: 删除创建时间早于多久之前的记录，默认为验证码有效期
+        batch_size: 每批的主键区间大小
+        sleep: 每批之间暂停的秒数
+        archive: 归档文件（文本模式），删除前把记录按JSON Lines写入
+        progress: 每批完成后调用，参数为本批删除的记录数
+
+    Returns:
+        删除的记录数
+    """
+    if older_than is None:
+        older_than = timedelta(seconds=get_expire_seconds())
+    expired = SmsCode.objects.filter(created_at__lt=timezone.now() - older_than)
+
+    def archive_rows(batch) -> List[int]:
+        rows = list(batch.order_by('id').values('id', 'phone', 'code', 'is_used', 'created_at', 'updated_at'))
+        for row in rows:
+            row['created_at'] = row['created_at'].isoformat()
+            row['updated_at'] = row['updated_at'].isoformat()
+            archive.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return [row['id'] for row in rows]
+
+    return purge_in_batches(
+        expired,
+        batch_size=batch_size,
+        sleep=sleep,
+        archive=archive_rows if archive is not None else None,
+        progress=progress,
+    )
@@ -0,0 +1,351 @@
+"""
+短信异步发送
+
+发送验证码的请求只把短信写入 SmsMessage 队列后立即返回，调用短信服务商在后台完成，接口耗时与短信网关无关：
+- SMS_DISPATCH_WORKER = 'local'：在当前进程的线程池中发送（适合单机部署）
+- SMS_DISPATCH_WORKER = 'command'：由 `python manage.py run_sms_worker` 进程轮询发送
+worker每次领取最多 SMS_DISPATCH_BATCH_SIZE 条短信，按模板分组后调用服务商的批量发送接口；
+可重试的失败按随机指数退避重新排队，超过 SMS_DISPATCH_MAX_ATTEMPTS 次后标记为失败。
+发送成功或失败后清空模板参数（验证码等），已完成的记录由 `python manage.py purge_sms_messages` 定期删除。
+
+短信服务商由 SMS_PROVIDER 选择，自定义服务商继承 BaseSmsProvider 并实现 send，支持批量发送时再覆盖 send_batch。
+"""
+import abc
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Optional, List, Dict, Any, Callable
+import logging
+
+from django.conf import settings
+from django.db import transaction, connection
+from django.db.models import F, Q, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import SmsMessage
+from .resilience import backoff_delay
+from .background import DispatchTimer, get_executor, purge_in_batches
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SMS_PROVIDER = 'users.sms_dispatch.StubSmsProvider'
+TEMPLATE_LOGIN_CODE = 'login_code'
+
+# 不能写入日志的模板参数
+SENSITIVE_PARAMS = {'code'}
+
+
+class SmsSendError(Exception):
+    """短信发送失败，retryable 表示稍后重试可能成功（超时、限流等）"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        self.retryable = retryable
+        super().__init__(message)
+
+
+class BaseSmsProvider(abc.ABC):
+    """
+    短信服务商接口
+
+    max_batch_size 为一次批量发送的最大条数，1表示不支持批量发送。
+    """
+
+    max_batch_size = 1
+
+    @abc.abstractmethod
+    def send(self, phone: str, template: str, params: Dict[str, Any]) -> str:
+        """
+        发送一条短信
+
+        Args:
+            phone: 手机号
+            template: 短信模板
+            params: 模板参数
+
+        Returns:
+            服务商返回的消息ID
+
+        Raises:
+            SmsSendError: 发送失败
+        """
+
+    def send_batch(self, template: str, messages: List[SmsMessage]) -> List[Dict[str, Any]]:
+        """
+        批量发送同一模板的短信，默认逐条调用 send
+
+        Args:
+            template: 短信模板
+            messages: 待发送的短信，条数不超过 max_batch_size
+
+        Returns:
+            与 messages 一一对应的发送结果：
+            成功为 {'success': True, 'message_id': ...}，失败为 {'success': False, 'error': ..., 'retryable': ...}
+        """
+        results = []
+        for message in messages:
+            try:
+                message_id = self.send(message.phone, template, message.params)
+                results.append({'success': True, 'message_id': message_id})
+            except SmsSendError as e:
+                results.append({'success': False, 'error': str(e), 'retryable': e.retryable})
+        return results
+
+
+def mask_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """日志中隐藏模板参数里的验证码"""
+    return {key: '******' if key in SENSITIVE_PARAMS else value for key, value in params.items()}
+
+
+class StubSmsProvider(BaseSmsProvider):
+    """
+    本地测试用的短信服务商，只写日志不发送
+
+    每次调用（单条或批量）等待 SMS_STUB_LATENCY 秒，按 SMS_STUB_FAILURE_RATE 的概率返回可重试的失败，用于压测和联调。
+    """
+
+    def __init__(self):
+        self.latency = getattr(settings, 'SMS_STUB_LATENCY', 0)
+        self.failure_rate = getattr(settings, 'SMS_STUB_FAILURE_RATE', 0)
+        self.max_batch_size = getattr(settings, 'SMS_STUB_BATCH_SIZE', 100)
+
+    def _deliver(self, phone: str, template: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self.failure_rate and random.random() < self.failure_rate:
+            return {'success': False, 'error': '模拟发送失败', 'retryable': True}
+        logger.info(f"[模拟短信] 手机号: {phone}, 模板: {template}, 参数: {mask_params(params)}")
+        return {'success': True, 'message_id': uuid.uuid4().hex}
+
+    def send(self, phone: str, template: str, params: Dict[str, Any]) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        result = self._deliver(phone, template, params)
+        if not result['success']:
+            raise SmsSendError(result['error'])
+        return result['message_id']
+
+    def send_batch(self, template: str, messages: List[SmsMessage]) -> List[Dict[str, Any]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._deliver(message.phone, template, message.params) for message in messages]
+
+
+_provider = None
+_provider_path = None
+
+
+def get_provider() -> BaseSmsProvider:
+    """获取 SMS_PROVIDER 配置的短信服务商（每个进程一个实例）"""
+    global _provider, _provider_path
+    path = getattr(settings, 'SMS_PROVIDER', DEFAULT_SMS_PROVIDER)
+    if _provider is None or _provider_path != path:
+        _provider = import_string(path)()
+        _provider_path = path
+    return _provider
+
+
+def enqueue_sms(phone: str, template: str, params: Dict[str, Any]) -> SmsMessage:
+    """
+    把短信加入发送队列
+
+    Args:
+        phone: 手机号
+        template: 短信模板
+        params: 模板参数
+
+    Returns:
+        创建的短信记录
+    """
+    message = SmsMessage.objects.create(phone=phone, template=template, params=params)
+    if getattr(settings, 'SMS_DISPATCH_WORKER', 'local') == 'local':
+        transaction.on_commit(dispatch_local)
+    return message
+
+
+def enqueue_login_code(phone: str, code: str) -> SmsMessage:
+    """把登录验证码短信加入发送队列"""
+    return enqueue_sms(phone, TEMPLATE_LOGIN_CODE, {'code': code})
+
+
+def dispatch_local():
+    """在当前进程的线程池中发送等待中的短信"""
+    get_executor('sms-dispatch', getattr(settings, 'SMS_DISPATCH_LOCAL_WORKERS', 1)).submit(_dispatch_in_thread)
+
+
+# 等待重试或超时的短信到期后再次派发（每个进程一个Timer）
+dispatch_timer = DispatchTimer(dispatch_local)
+
+
+def next_due_at() -> Optional[datetime]:
+    """队列中最早到期的时间：等待重试的短信的下次发送时间，或发送中的短信超时可被重新领取的时间"""
+    stale_timeout = timedelta(seconds=getattr(settings, 'SMS_DISPATCH_STALE_TIMEOUT', 300))
+    due = SmsMessage.objects.filter(
+        status__in=[SmsMessage.STATUS_PENDING, SmsMessage.STATUS_SENDING]
+    ).aggregate(
+        pending=Min('next_attempt_at', filter=Q(status=SmsMessage.STATUS_PENDING)),
+        sending=Min('claimed_at', filter=Q(status=SmsMessage.STATUS_SENDING)),
+    )
+    candidates = [due['pending']]
+    if due['sending'] is not None:
+        candidates.append(due['sending'] + stale_timeout)
+    candidates = [value for value in candidates if value is not None]
+    return min(candidates) if candidates else None
+
+
+def _dispatch_in_thread():
+    """线程池中执行，结束后关闭该线程的数据库连接；队列中还有未到期的短信时在到期后再次派发"""
+    try:
+        dispatch_pending()
+        due = next_due_at()
+        if due is not None:
+            dispatch_timer.schedule((due - timezone.now()).total_seconds())
+    except Exception as e:
+        logger.error(f"发送短信失败: {str(e)}")
+    finally:
+        connection.close()
+
+
+def claim_batch(batch_size: int, worker: Optional[str] = None) -> List[SmsMessage]:
+    """
+    领取一批到期的短信
+
+    用一条条件UPDATE把短信从 pending 改为 sending 并写入本次的领取标识，多个worker同时领取时每条短信只会被一个worker领到；
+    发送中超过 SMS_DISPATCH_STALE_TIMEOUT 秒的短信视为worker已退出，可以重新领取。
+
+    Args:
+        batch_size: 最多领取的条数
+        worker: worker标识，仅用于日志
+
+    Returns:
+        领取到的短信
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=getattr(settings, 'SMS_DISPATCH_STALE_TIMEOUT', 300))
+    claimable = Q(status=SmsMessage.STATUS_PENDING, next_attempt_at__lte=now) | Q(status=SmsMessage.STATUS_SENDING, claimed_at__lt=stale_before)
+
+    ids = list(SmsMessage.objects.filter(claimable).order_by('next_attempt_at').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4()
+    claimed = SmsMessage.objects.filter(claimable, id__in=ids).update(
+        status=SmsMessage.STATUS_SENDING,
+        claim_token=token,
+        claimed_at=now,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return []
+    logger.info(f"领取短信: {claimed}条, worker: {worker or socket.gethostname()}")
+    return list(SmsMessage.objects.filter(claim_token=token, status=SmsMessage.STATUS_SENDING).order_by('template', 'id'))
+
+
+def _record_result(message: SmsMessage, result: Dict[str, Any]):
+    """保存一条短信的发送结果"""
+    now = timezone.now()
+    if result.get('success'):
+        message.status = SmsMessage.STATUS_SENT
+        message.provider_message_id = result.get('message_id') or ''
+        message.sent_at = now
+        message.error = ''
+    elif result.get('retryable') and message.attempts < getattr(settings, 'SMS_DISPATCH_MAX_ATTEMPTS', 5):
+        delay = backoff_delay(
+            message.attempts,
+            getattr(settings, 'SMS_DISPATCH_RETRY_BASE_DELAY', 2),
+            getattr(settings, 'SMS_DISPATCH_RETRY_MAX_DELAY', 60),
+        )
+        message.status = SmsMessage.STATUS_PENDING
+        message.next_attempt_at = now + timedelta(seconds=delay)
+        message.error = result.get('error') or ''
+    else:
+        message.status = SmsMessage.STATUS_FAILED
+        message.error = result.get('error') or ''
+        logger.error(f"短信发送失败: {message.id}, {message.phone}, {message.error}")
+
+    if message.status != SmsMessage.STATUS_PENDING:
+        # 不再发送的短信不保留验证码等模板参数
+        message.params = {}
+
+    # 只更新仍由本次领取的记录，避免覆盖超时后被其他worker重新领取的结果
+    SmsMessage.objects.filter(id=message.id, claim_token=message.claim_token).update(
+        status=message.status,
+        params=message.params,
+        next_attempt_at=message.next_attempt_at,
+        provider_message_id=message.provider_message_id,
+        sent_at=message.sent_at,
+        error=message.error,
+        claim_token=None,
+        claimed_at=None,
+    )
+
+
+def send_messages(messages: List[SmsMessage]):
+    """
+    按模板分组批量发送已领取的短信并保存结果
+
+    Args:
+        messages: claim_batch 领取的短信
+    """
+    provider = get_provider()
+    batch_size = max(1, provider.max_batch_size)
+    for template, group in groupby(messages, key=lambda message: message.template):
+        group = list(group)
+        for start in range(0, len(group), batch_size):
+            batch = group[start:start + batch_size]
+            try:
+                results = provider.send_batch(template, batch)
+            except Exception as e:
+                logger.error(f"调用短信服务失败: {str(e)}")
+                results = [{'success': False, 'error': str(e), 'retryable': True}] * len(batch)
+            for message, result in zip(batch, results):
+                _record_result(message, result)
+
+
+def dispatch_pending(limit: Optional[int] = None, worker: Optional[str] = None) -> int:
+    """
+    领取并发送到期的短信，直到队列中没有到期的短信
+
+    Args:
+        limit: 最多领取的批数，None表示处理到队列为空
+        worker: worker标识
+
+    Returns:
+        处理的短信条数
+    """
+    batch_size = getattr(settings, 'SMS_DISPATCH_BATCH_SIZE', 100)
+    processed = 0
+    batches = 0
+    while limit is None or batches < limit:
+        messages = claim_batch(batch_size, worker)
+        if not messages:
+            break
+        send_messages(messages)
+        processed += len(messages)
+        batches += 1
+    return processed
+
+
+def purge_sms_messages(older_than: Optional[timedelta] = None, batch_size: int = 1000, sleep: float = 0,
+                       progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    分批删除已发送或发送失败的短信记录
+
+    按主键区间逐批删除（见 purge_in_batches），等待发送和发送中的短信不会被删除。
+
+    Args:
+        older_than: 删除创建时间早于多久之前的记录，默认为 SMS_MESSAGE_RETENTION_DAYS 天
+        batch_size: 每批的主键区间大小
+        sleep: 每批之间暂停的秒数
+        progress: 每批完成后调用，参数为本批删除的记录数
+
+    Returns:
+        删除的记录数
+    """
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'SMS_MESSAGE_RETENTION_DAYS', 7))
+    finished = SmsMessage.objects.filter(
+        created_at__lt=timezone.now() - older_than,
+        status__in=[SmsMessage.STATUS_SENT, SmsMessage.STATUS_FAILED],
+    )
+    return purge_in_batches(finished, batch_size=batch_size, sleep=sleep, progress=progress)
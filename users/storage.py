@@ -0,0 +1,809 @@
+"""
+存储后端
+
+BaseStorageService 实现与具体存储无关的上传逻辑（内容去重、衍生图、批量上传），
+具体后端只需要实现对象的写入、删除、URL和大小查询。通过 STORAGE_BACKEND 选择后端：
+
+- users.oss_service.AlibabaCloudOSSService：阿里云OSS（默认）
+- users.storage.LocalFileStorageService：本地磁盘
+- users.storage.InMemoryStorageService：内存，可注入延迟，用于压测和CI
+"""
+import abc
+import os
+import time
+import uuid
+import random
+import hashlib
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Union, IO, Iterable, Iterator, Callable
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import image_processing
+from .background import get_executor
+from .models import UploadedContent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORAGE_BACKEND = 'users.oss_service.AlibabaCloudOSSService'
+
+
+class DirectUploadNotSupported(Exception):
+    """存储后端不支持客户端直传（本地磁盘、内存等没有签名URL的后端）"""
+
+
+def get_upload_executor() -> ThreadPoolExecutor:
+    """获取批量上传线程池，并发度由 OSS_UPLOAD_CONCURRENCY 控制"""
+    return get_executor('storage-upload', getattr(settings, 'OSS_UPLOAD_CONCURRENCY', 4))
+
+
+def claim_duplicate(content_hash: str) -> Optional[UploadedContent]:
+    """
+    查找相同内容的已有对象，找到时增加其引用次数
+
+    在事务中锁定记录后再增加引用，与释放引用互斥：记录正在被释放时等待其完成，
+    记录已被删除或正在删除（见 release_and_delete）时返回None，调用方重新上传。
+
+    Args:
+        content_hash: 内容SHA-256
+
+    Returns:
+        已有的内容记录，不存在时返回None
+    """
+    with transaction.atomic():
+        existing = UploadedContent.objects.select_for_update().filter(sha256=content_hash, deleting_at__isnull=True).first()
+        if existing is None:
+            return None
+        updated = UploadedContent.objects.filter(pk=existing.pk).update(ref_count=F('ref_count') + 1)
+        if updated != 1:
+            return None
+        existing.ref_count += 1
+        return existing
+
+
+def register_content(content_hash: str, object_key: str, size: int) -> str:
+    """
+    登记新上传内容的哈希
+
+    并发上传相同内容时只保留先登记的对象，调用方需要删除返回值之外的对象。
+
+    Args:
+        content_hash: 内容SHA-256
+        object_key: 刚上传的对象key
+        size: 文件大小
+
+    Returns:
+        最终使用的对象key
+    """
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                UploadedContent.objects.create(sha256=content_hash, object_key=object_key, size=size)
+            return object_key
+        except IntegrityError:
+            # 已登记的记录可能在两步之间被释放，重新登记
+            existing = claim_duplicate(content_hash)
+            if existing is not None:
+                return existing.object_key
+    logger.warning(f"登记去重内容失败，不参与去重: {object_key}")
+    return object_key
+
+
+def release_and_delete(
+    object_keys: List[str],
+    references: Optional[Dict[str, int]],
+    delete_objects: Callable[[List[str]], Iterable[str]],
+    batch_size: int,
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """
+    释放去重引用，删除已无引用的对象
+
+    分三步执行，调用存储期间不持有事务和行锁：
+    1. 在短事务中锁定内容记录，仍被其他上传引用的对象只减少引用次数，其余对象的记录标记为正在删除，
+       claim_duplicate 不再复用正在删除的内容；
+    2. 在事务之外按 batch_size 分组调用 delete_objects；
+    3. 在短事务中删除存储确认删除的对象的内容记录，删除失败的对象清除删除标记，保留记录和引用，可以重试。
+
+    Args:
+        object_keys: 对象key列表（不重复）
+        references: 每个对象key释放的引用数，默认各释放1个
+        delete_objects: 删除一组对象并返回已删除的对象key
+        batch_size: 每组最多的对象数
+
+    Returns:
+        (每个对象key的删除结果, 已从存储中删除的对象key)
+    """
+    references = references or {}
+    results = {}
+    deleted = []
+    marked_at = timezone.now()
+    with transaction.atomic():
+        contents = {
+            content.object_key: content
+            for content in UploadedContent.objects.select_for_update().filter(object_key__in=object_keys)
+        }
+        removable = []
+        for key in object_keys:
+            content = contents.get(key)
+            count = references.get(key, 1)
+            if content is not None and content.ref_count > count:
+                UploadedContent.objects.filter(pk=content.pk).update(ref_count=F('ref_count') - count)
+                logger.info(f"文件仍被引用，跳过删除: {key}")
+                results[key] = {'success': True, 'object_key': key}
+            else:
+                removable.append(key)
+        marked = [key for key in removable if key in contents]
+        if marked:
+            UploadedContent.objects.filter(object_key__in=marked).update(deleting_at=marked_at)
+
+    for offset in range(0, len(removable), batch_size):
+        batch = removable[offset:offset + batch_size]
+        try:
+            deleted_keys = set(delete_objects(batch))
+        except Exception as e:
+            logger.error(f"批量删除失败: {str(e)}")
+            for key in batch:
+                results[key] = {'success': False, 'object_key': key, 'error': str(e)}
+            continue
+        for key in batch:
+            if key in deleted_keys:
+                deleted.append(key)
+                results[key] = {'success': True, 'object_key': key}
+            else:
+                results[key] = {'success': False, 'object_key': key, 'error': '删除失败'}
+
+    if marked:
+        with transaction.atomic():
+            UploadedContent.objects.filter(object_key__in=[key for key in marked if key in deleted]).delete()
+            failed = [key for key in marked if not results[key]['success']]
+            if failed:
+                UploadedContent.objects.filter(object_key__in=failed, deleting_at=marked_at).update(deleting_at=None)
+    return results, deleted
+
+
+class BaseStorageService(abc.ABC):
+    """
+    存储服务基类
+
+    子类需要实现 _store_object、_delete_object、_delete_objects、get_file_url 和 get_object_size（抽象方法）。
+    """
+
+    # 单次 _delete_objects 调用的最大对象数
+    max_delete_batch = 1000
+
+    def generate_object_key(self, filename: str, folder: str = 'uploads') -> str:
+        """
+        生成对象存储的key
+        
+        Args:
+            filename: 原始文件名
+            folder: 存储文件夹
+            
+        Returns:
+            生成的对象key
+        """
+        # 获取文件扩展名
+        _, ext = os.path.splitext(filename)
+        
+        # 生成唯一文件名
+        unique_filename = f"{uuid.uuid4().hex}{ext}"
+        
+        # 按日期分组
+        date_path = datetime.now().strftime('%Y/%m/%d')
+        
+        # 完整的对象key
+        object_key = f"{folder}/{date_path}/{unique_filename}"
+        
+        return object_key
+
+    def upload_file(self, file_content: Union[bytes, IO, Iterable[bytes]], filename: str, folder: str = 'uploads', dedup: Optional[bool] = None, derivatives: Optional[bool] = None, size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        上传文件
+
+        内容由具体后端的 _store_object 写入，文件对象和分块迭代器不会被整体读入内存。
+        开启内容去重时，相同SHA-256的内容直接返回已存在的对象，不再重复存储。
+        开启衍生图时，原图上传的同时在进程池中生成 IMAGE_DERIVATIVES 配置的衍生图并一起上传。
+
+        Args:
+            file_content: 文件内容（字节、文件对象或字节块迭代器）
+            filename: 原始文件名
+            folder: 存储文件夹
+            dedup: 是否按内容去重，默认取 OSS_DEDUP_ENABLED
+            derivatives: 是否生成衍生图，默认取 IMAGE_DERIVATIVES_ENABLED
+            size: 数据流的声明大小（例如请求的Content-Length），后端可据此直接流式转发
+
+        Returns:
+            包含文件信息的字典
+        """
+        try:
+            if dedup is None:
+                dedup = getattr(settings, 'OSS_DEDUP_ENABLED', False)
+            if derivatives is None:
+                derivatives = getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', False)
+
+            content_hash = None
+            hasher = None
+            if dedup:
+                content_hash = self.compute_content_hash(file_content)
+                if content_hash:
+                    existing = claim_duplicate(content_hash)
+                    if existing:
+                        logger.info(f"内容重复，复用已有对象: {existing.object_key}")
+                        result = {
+                            'success': True,
+                            'object_key': existing.object_key,
+                            'file_url': self.get_file_url(existing.object_key),
+                            'original_filename': filename,
+                            'size': existing.size,
+                            'deduplicated': True,
+                            'content_hash': content_hash,
+                        }
+                        if derivatives:
+                            # 已有对象的衍生图在首次上传时已经生成
+                            result['derivatives'] = self.get_derivative_urls(existing.object_key)
+                        return result
+                else:
+                    # 无法回退的数据流：上传过程中边读边计算哈希，上传完成后登记
+                    hasher = hashlib.sha256()
+                    file_content = self._hashing_chunks(file_content, hasher)
+
+            # 衍生图在进程池中生成，与原图上传同时进行
+            derivative_future = None
+            if derivatives:
+                image_bytes = self.read_for_processing(file_content)
+                if image_bytes is not None:
+                    derivative_future = image_processing.submit_derivatives(image_bytes)
+                else:
+                    logger.warning(f"数据流无法回退，跳过衍生图生成: {filename}")
+
+            # 生成对象key
+            object_key = self.generate_object_key(filename, folder)
+            logger.info(f"upload to {self.__class__.__name__}, object_key: {object_key}")
+
+            stored = self._store_object(object_key, file_content, size=size)
+            if not stored.get('success'):
+                return stored
+
+            result = {
+                'success': True,
+                'object_key': object_key,
+                'file_url': self.get_file_url(object_key),
+                'original_filename': filename,
+                'size': stored['size'],
+            }
+            if dedup:
+                result['content_hash'] = content_hash or hasher.hexdigest()
+                recorded_key = register_content(result['content_hash'], object_key, stored['size'])
+                if recorded_key != object_key:
+                    # 相同内容已被并发上传，删除本次上传的重复对象
+                    logger.info(f"内容已被并发上传，删除重复对象: {object_key}")
+                    self._delete_object(object_key)
+                    result['object_key'] = recorded_key
+                    result['file_url'] = self.get_file_url(recorded_key)
+                    result['deduplicated'] = True
+            if derivative_future is not None:
+                result['derivatives'] = self.upload_derivatives(result['object_key'], derivative_future)
+            return result
+
+        except Exception as e:
+            logger.error(f"文件上传失败: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def upload_derivatives(self, object_key: str, derivative_future) -> Dict[str, Dict[str, Any]]:
+        """
+        等待衍生图生成完成并并行上传
+
+        衍生图生成或上传失败不影响原图上传结果，只记录日志。
+
+        Args:
+            object_key: 原图对象key
+            derivative_future: image_processing.submit_derivatives 返回的Future
+
+        Returns:
+            {名称: 衍生图信息}
+        """
+        try:
+            rendered = derivative_future.result(timeout=getattr(settings, 'IMAGE_PROCESS_TIMEOUT', 30))
+        except Exception as e:
+            logger.error(f"衍生图生成失败: {object_key}, {str(e)}")
+            return {}
+
+        executor = get_executor('storage-derivative', getattr(settings, 'OSS_UPLOAD_CONCURRENCY', 4))
+        futures = {}
+        for name, derivative in rendered.items():
+            key = image_processing.derivative_key(object_key, name, derivative['format'])
+            futures[name] = (key, executor.submit(self._store_object, key, derivative['content']))
+
+        uploaded = {}
+        for name, (key, future) in futures.items():
+            try:
+                stored = future.result()
+            except Exception as e:
+                logger.error(f"衍生图上传失败: {key}, {str(e)}")
+                continue
+            if stored.get('success'):
+                derivative = rendered[name]
+                uploaded[name] = {
+                    'object_key': key,
+                    'file_url': self.get_file_url(key),
+                    'width': derivative['width'],
+                    'height': derivative['height'],
+                    'size': stored['size'],
+                }
+        return uploaded
+
+    def get_derivative_urls(self, object_key: str) -> Dict[str, Dict[str, Any]]:
+        """
+        获取原图对应的衍生图地址（不检查衍生图是否存在）
+
+        Args:
+            object_key: 原图对象key
+
+        Returns:
+            {名称: {'object_key': 对象key, 'file_url': 访问URL}}
+        """
+        derivatives = {}
+        for name, spec in image_processing.get_derivative_specs().items():
+            key = image_processing.derivative_key(object_key, name, spec['format'])
+            derivatives[name] = {
+                'object_key': key,
+                'file_url': self.get_file_url(key),
+            }
+        return derivatives
+
+    def refresh_urls(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按对象key重新生成保存下来的上传结果中的访问URL（私有模式下签名URL会过期）
+
+        Args:
+            result: 之前保存的上传结果
+
+        Returns:
+            更新了 file_url 的结果副本
+        """
+        result = dict(result)
+        if result.get('object_key'):
+            result['file_url'] = self.get_file_url(result['object_key'])
+        if result.get('derivatives'):
+            result['derivatives'] = {
+                name: {**derivative, 'file_url': self.get_file_url(derivative['object_key'])}
+                for name, derivative in result['derivatives'].items()
+            }
+        return result
+
+    @staticmethod
+    def read_for_processing(source: Union[bytes, IO, Iterable[bytes]]) -> Optional[bytes]:
+        """
+        读取图片处理需要的完整数据，文件对象读取后回到原位置
+
+        Args:
+            source: 文件内容（字节、文件对象或字节块迭代器）
+
+        Returns:
+            完整数据，无法回退的数据流返回None
+        """
+        if isinstance(source, (bytes, bytearray)):
+            return bytes(source)
+        if not hasattr(source, 'read') or not hasattr(source, 'seek'):
+            return None
+        if hasattr(source, 'seekable') and not source.seekable():
+            return None
+        position = source.tell()
+        data = source.read()
+        source.seek(position)
+        return data
+
+    @staticmethod
+    def compute_content_hash(source: Union[bytes, IO, Iterable[bytes]], chunk_size: int = 64 * 1024) -> Optional[str]:
+        """
+        流式计算内容的SHA-256
+
+        字节直接计算；可回退的文件对象分块读取后回到原位置；
+        迭代器等无法回退的数据流返回None，由调用方在上传时边读边计算。
+
+        Args:
+            source: 文件内容（字节、文件对象或字节块迭代器）
+            chunk_size: 每次读取的字节数
+
+        Returns:
+            十六进制哈希值，无法提前计算时返回None
+        """
+        if isinstance(source, (bytes, bytearray)):
+            return hashlib.sha256(source).hexdigest()
+
+        if not hasattr(source, 'read') or not hasattr(source, 'seek'):
+            return None
+        if hasattr(source, 'seekable') and not source.seekable():
+            return None
+
+        hasher = hashlib.sha256()
+        position = source.tell()
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            hasher.update(chunk)
+        source.seek(position)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _hashing_chunks(source: Union[IO, Iterable[bytes]], hasher, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """逐块产出数据并同时更新哈希"""
+        chunks = iter(lambda: source.read(chunk_size), b'') if hasattr(source, 'read') else source
+        for chunk in chunks:
+            hasher.update(chunk)
+            yield chunk
+
+    @staticmethod
+    def _iter_parts(source: Union[bytes, IO, Iterable[bytes]], part_size: int) -> Iterator[bytes]:
+        """把字节、文件对象或字节块迭代器切分成固定大小的分片（最后一片可能更小）"""
+        if isinstance(source, (bytes, bytearray)):
+            for offset in range(0, len(source), part_size):
+                yield bytes(source[offset:offset + part_size])
+            return
+
+        if hasattr(source, 'read'):
+            while True:
+                data = source.read(part_size)
+                if not data:
+                    return
+                yield data
+
+        buffer = bytearray()
+        for chunk in source:
+            buffer.extend(chunk)
+            while len(buffer) >= part_size:
+                yield bytes(buffer[:part_size])
+                del buffer[:part_size]
+        if buffer:
+            yield bytes(buffer)
+
+    def upload_files(self, files: List[Tuple[Union[bytes, IO, Iterable[bytes]], str]], folder: str = 'uploads') -> List[Dict[str, Any]]:
+        """
+        批量上传文件
+
+        OSS_UPLOAD_CONCURRENCY 大于1时使用进程内线程池并发上传，否则逐个上传。
+        单个文件失败不会影响其他文件，返回结果与传入顺序一致。
+
+        Args:
+            files: (文件内容或文件对象, 原始文件名) 列表
+            folder: 存储文件夹
+
+        Returns:
+            每个文件的上传结果列表
+        """
+        concurrency = getattr(settings, 'OSS_UPLOAD_CONCURRENCY', 4)
+        if concurrency <= 1 or len(files) <= 1:
+            return [self._upload_one(file, filename, folder) for file, filename in files]
+
+        executor = get_upload_executor()
+        futures = [
+            executor.submit(self._upload_one, file, filename, folder)
+            for file, filename in files
+        ]
+        return [future.result() for future in futures]
+
+    def _upload_one(self, file: Union[bytes, IO, Iterable[bytes]], filename: str, folder: str) -> Dict[str, Any]:
+        """上传单个文件，异常转换为失败结果"""
+        try:
+            result = self.upload_file(
+                file_content=file,
+                filename=filename,
+                folder=folder
+            )
+        except Exception as e:
+            logger.error(f"文件上传失败: {filename}, {str(e)}")
+            result = {
+                'success': False,
+                'error': str(e)
+            }
+        result.setdefault('original_filename', filename)
+        return result
+
+    def delete_file(self, object_key: str, references: int = 1) -> Dict[str, Any]:
+        """
+        删除存储中的文件
+        
+        Args:
+            object_key: 对象key
+            references: 释放的去重引用数（调用方持有的引用数）
+            
+        Returns:
+            删除结果
+        """
+        def delete_objects(keys):
+            return [key for key in keys if self._delete_object(key).get('success')]
+
+        try:
+            # 去重内容仍被其他上传引用时只减少引用次数，存储删除成功后才删除去重记录
+            results, deleted = release_and_delete([object_key], {object_key: references}, delete_objects, 1)
+        except Exception as e:
+            logger.error(f"文件删除失败: {str(e)}")
+            return {
+                'success': False,
+                'object_key': object_key,
+                'error': str(e)
+            }
+        if deleted:
+            logger.info(f"文件删除成功: {object_key}")
+            self._delete_derivatives(object_key)
+        return results[object_key]
+
+    def delete_files(self, object_keys: List[str], references: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """
+        批量删除存储中的文件
+
+        需要删除的对象按 max_delete_batch 分组调用 _delete_objects，某一组失败不影响其他组；
+        去重引用只对存储确认删除的对象释放（见 release_and_delete）。
+
+        Args:
+            object_keys: 对象key列表
+            references: 每个对象key释放的去重引用数，默认各释放1个
+
+        Returns:
+            每个对象key的删除结果，顺序与传入顺序一致（重复的key只返回一次）
+        """
+        object_keys = list(dict.fromkeys(object_keys))
+        try:
+            results, deleted = release_and_delete(object_keys, references, self._delete_objects, self.max_delete_batch)
+        except Exception as e:
+            logger.error(f"批量删除失败: {str(e)}")
+            return [{'success': False, 'object_key': key, 'error': str(e)} for key in object_keys]
+        logger.info(f"批量删除完成: 请求{len(object_keys)}个，删除{len(deleted)}个")
+
+        if deleted and getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', False):
+            derivative_keys = [key for object_key in deleted for key in image_processing.derivative_keys(object_key)]
+            for offset in range(0, len(derivative_keys), self.max_delete_batch):
+                try:
+                    self._delete_objects(derivative_keys[offset:offset + self.max_delete_batch])
+                except Exception as e:
+                    logger.error(f"衍生图批量删除失败: {str(e)}")
+
+        return [results[key] for key in object_keys]
+
+    def _delete_derivatives(self, object_key: str):
+        """删除原图对应的衍生图，失败只记录日志"""
+        if not getattr(settings, 'IMAGE_DERIVATIVES_ENABLED', False):
+            return
+        keys = image_processing.derivative_keys(object_key)
+        if not keys:
+            return
+        try:
+            self._delete_objects(keys)
+        except Exception as e:
+            logger.error(f"衍生图删除失败: {object_key}, {str(e)}")
+
+    @abc.abstractmethod
+    def _store_object(self, object_key: str, file_content: Union[bytes, IO, Iterable[bytes]], size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        把内容写入指定的对象key
+
+        Args:
+            object_key: 对象key
+            file_content: 文件内容（字节、文件对象或字节块迭代器）
+            size: 内容的声明大小，未知时为None
+
+        Returns:
+            包含 success 和 size 的字典
+        """
+
+    @abc.abstractmethod
+    def _delete_object(self, object_key: str) -> Dict[str, Any]:
+        """
+        删除单个对象
+
+        Args:
+            object_key: 对象key
+
+        Returns:
+            包含 success 的删除结果
+        """
+
+    @abc.abstractmethod
+    def _delete_objects(self, object_keys: List[str]) -> List[str]:
+        """
+        批量删除对象，一次最多 max_delete_batch 个
+
+        Args:
+            object_keys: 对象key列表
+
+        Returns:
+            已删除的对象key列表
+        """
+
+    @abc.abstractmethod
+    def get_file_url(self, object_key: str) -> str:
+        """
+        获取文件的访问URL
+
+        Args:
+            object_key: 对象key
+
+        Returns:
+            文件访问URL
+        """
+
+    @abc.abstractmethod
+    def get_object_size(self, object_key: str) -> Optional[int]:
+        """
+        查询对象大小
+
+        Args:
+            object_key: 对象key
+
+        Returns:
+            对象大小（字节），对象不存在时返回None
+        """
+
+    def create_direct_upload(self, object_key: str, content_type: str, method: str = 'PUT', max_size: Optional[int] = None, expires: Optional[int] = None) -> Dict[str, Any]:
+        """
+        生成客户端直传的签名，只有支持直传的后端需要覆盖
+
+        Raises:
+            DirectUploadNotSupported: 当前后端不支持客户端直传
+        """
+        raise DirectUploadNotSupported(f"{self.__class__.__name__} 不支持客户端直传")
+
+
+class LocalFileStorageService(BaseStorageService):
+    """本地磁盘存储服务，文件保存在 STORAGE_LOCAL_ROOT 下"""
+
+    def __init__(self):
+        """初始化存储目录"""
+        self.root = Path(getattr(settings, 'STORAGE_LOCAL_ROOT', Path(settings.BASE_DIR) / 'media')).resolve()
+        self.url_prefix = getattr(settings, 'STORAGE_LOCAL_URL_PREFIX', '/media')
+        self.root.mkdir(parents=True, exist_ok=True)
+        logger.info(f"本地存储初始化成功: {self.root}")
+
+    def _path(self, object_key: str) -> Path:
+        """对象key对应的文件路径，禁止访问存储目录之外的文件"""
+        path = (self.root / object_key).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"非法的对象key: {object_key}")
+        return path
+
+    def _store_object(self, object_key: str, file_content: Union[bytes, IO, Iterable[bytes]], size: Optional[int] = None) -> Dict[str, Any]:
+        """分块写入临时文件后原子替换，避免读到写了一半的文件"""
+        path = self._path(object_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part_size = getattr(settings, 'OSS_MULTIPART_PART_SIZE', 5 * 1024 * 1024)
+        written = 0
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for data in self._iter_parts(file_content, part_size):
+                    f.write(data)
+                    written += len(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        return {
+            'success': True,
+            'size': written,
+        }
+
+    def _delete_object(self, object_key: str) -> Dict[str, Any]:
+        """删除文件，文件不存在也视为成功（与OSS行为一致）"""
+        self._path(object_key).unlink(missing_ok=True)
+        return {
+            'success': True,
+            'object_key': object_key
+        }
+
+    def _delete_objects(self, object_keys: List[str]) -> List[str]:
+        for object_key in object_keys:
+            self._delete_object(object_key)
+        return list(object_keys)
+
+    def get_file_url(self, object_key: str) -> str:
+        return f"{self.url_prefix}/{object_key}"
+
+    def get_object_size(self, object_key: str) -> Optional[int]:
+        path = self._path(object_key)
+        return path.stat().st_size if path.exists() else None
+
+
+class InMemoryStorageService(BaseStorageService):
+    """
+    内存存储服务
+
+    每次写入、删除和查询都会等待 STORAGE_MEMORY_LATENCY 秒（加上不超过 STORAGE_MEMORY_LATENCY_JITTER 的随机抖动），
+    用来模拟对象存储的网络延迟，在没有外网的环境中压测完整的上传链路。
+    """
+
+    def __init__(self):
+        """初始化内存存储"""
+        self.objects: Dict[str, bytes] = {}
+        self.url_prefix = getattr(settings, 'STORAGE_MEMORY_URL_PREFIX', 'memory://')
+        self.latency = getattr(settings, 'STORAGE_MEMORY_LATENCY', 0)
+        self.jitter = getattr(settings, 'STORAGE_MEMORY_LATENCY_JITTER', 0)
+        self._lock = threading.Lock()
+        logger.info("内存存储初始化成功")
+
+    def _simulate_latency(self):
+        """模拟一次网络往返"""
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _store_object(self, object_key: str, file_content: Union[bytes, IO, Iterable[bytes]], size: Optional[int] = None) -> Dict[str, Any]:
+        part_size = getattr(settings, 'OSS_MULTIPART_PART_SIZE', 5 * 1024 * 1024)
+        data = b''.join(self._iter_parts(file_content, part_size))
+        self._simulate_latency()
+        with self._lock:
+            self.objects[object_key] = data
+        return {
+            'success': True,
+            'size': len(data),
+        }
+
+    def _delete_object(self, object_key: str) -> Dict[str, Any]:
+        self._simulate_latency()
+        with self._lock:
+            self.objects.pop(object_key, None)
+        return {
+            'success': True,
+            'object_key': object_key
+        }
+
+    def _delete_objects(self, object_keys: List[str]) -> List[str]:
+        self._simulate_latency()
+        with self._lock:
+            for object_key in object_keys:
+                self.objects.pop(object_key, None)
+        return list(object_keys)
+
+    def get_file_url(self, object_key: str) -> str:
+        return f"{self.url_prefix}/{object_key}"
+
+    def get_object_size(self, object_key: str) -> Optional[int]:
+        self._simulate_latency()
+        with self._lock:
+            data = self.objects.get(object_key)
+        return len(data) if data is not None else None
+
+
+class AsyncStorageAdapter:
+    """把同步存储服务包装成异步接口（在线程中执行），供异步视图在非OSS后端下使用"""
+
+    def __init__(self, service: BaseStorageService):
+        self.service = service
+
+    async def upload_file(self, *args, **kwargs) -> Dict[str, Any]:
+        return await sync_to_async(self.service.upload_file, thread_sensitive=False)(*args, **kwargs)
+
+    async def upload_files(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        return await sync_to_async(self.service.upload_files, thread_sensitive=False)(*args, **kwargs)
+
+    async def delete_file(self, object_key: str, references: int = 1) -> Dict[str, Any]:
+        return await sync_to_async(self.service.delete_file, thread_sensitive=False)(object_key, references)
+
+    async def delete_files(self, object_keys: List[str], references: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        return await sync_to_async(self.service.delete_files, thread_sensitive=False)(object_keys, references)
+
+    def delete_files_blocking(self, object_keys: List[str], references: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        return self.service.delete_files(object_keys, references)
+
+    def get_file_url(self, object_key: str) -> str:
+        return self.service.get_file_url(object_key)
+
+
+def get_storage_backend_class():
+    """获取 STORAGE_BACKEND 配置的存储服务类"""
+    return import_string(getattr(settings, 'STORAGE_BACKEND', DEFAULT_STORAGE_BACKEND))
+
+
+def create_storage_service() -> BaseStorageService:
+    """按 STORAGE_BACKEND 创建存储服务实例"""
+    return get_storage_backend_class()()
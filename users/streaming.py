@@ -0,0 +1,119 @@
+"""
+请求体流式读取和低拷贝解码
+
+按块读取WSGI输入流，边读边检查大小，数据块直接交给存储层，不在内存中拼接完整文件；
+Base64图片数据按块解码到预先分配的缓冲区，不产生完整的中间副本。
+"""
+import base64
+import re
+from typing import IO, Iterator
+
+# Base64数据中允许出现的ASCII空白（换行、空格等），解码前去掉
+ASCII_WHITESPACE = re.compile(r'[ \t\n\r\f\v]+')
+
+
+class UploadTooLarge(Exception):
+    """读取的数据超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"上传数据大小不能超过{max_size // (1024 * 1024)}MB")
+
+
+class LimitedChunkReader:
+    """
+    分块读取数据流并限制总大小
+
+    先调用 read_header 读取第一块用于校验文件头，再迭代得到包括第一块在内的全部数据块。
+    累计大小超过 max_size 时抛出 UploadTooLarge 并设置 exceeded。
+    """
+
+    def __init__(self, stream: IO, max_size: int, chunk_size: int = 64 * 1024):
+        self.stream = stream
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.exceeded = False
+        self._header = None
+
+    def _read(self) -> bytes:
+        data = self.stream.read(self.chunk_size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_size:
+            self.exceeded = True
+            raise UploadTooLarge(self.max_size)
+        return data
+
+    def read_header(self, min_size: int = 64) -> bytes:
+        """读取第一块数据，数据流单次返回过少时继续读取，直到不少于 min_size 字节或读完"""
+        if self._header is None:
+            header = self._read()
+            while header and len(header) < min_size:
+                data = self._read()
+                if not data:
+                    break
+                header += data
+            self._header = header
+        return self._header
+
+    def __iter__(self) -> Iterator[bytes]:
+        header = self.read_header()
+        if header:
+            yield header
+        while True:
+            data = self._read()
+            if not data:
+                return
+            yield data
+
+
+def decode_base64_image(value: str, max_size: int, chunk_size: int = 64 * 1024) -> bytearray:
+    """
+    按块解码Base64图片数据（支持 data:image/...;base64, 前缀）
+
+    允许数据中包含空格和换行；解码前先根据编码长度计算解码后的大小，超过 max_size 时直接拒绝；
+    解码时每次只把一块字符编码为字节并解码，结果写入按解码大小预先分配的缓冲区。
+
+    Args:
+        value: Base64字符串
+        max_size: 解码后的最大字节数
+        chunk_size: 每次解码的字符数（会调整为4的倍数）
+
+    Returns:
+        解码后的数据
+
+    Raises:
+        UploadTooLarge: 解码后的大小超过 max_size
+        ValueError: 不是合法的Base64数据
+    """
+    start = 0
+    if value.startswith('data:'):
+        # data:image/jpeg;base64,... 只查找前缀中的逗号，不切分整个字符串
+        start = value.find(',', 0, 256) + 1
+        if start == 0:
+            raise ValueError('data URL 缺少逗号分隔符')
+    if ASCII_WHITESPACE.search(value, start):
+        # 按行折断的Base64（如每76个字符换行）先去掉空白再计算长度，只有包含空白时才复制字符串
+        value = ASCII_WHITESPACE.sub('', value[start:])
+        start = 0
+
+    encoded_length = len(value) - start
+    if encoded_length % 4:
+        raise ValueError('Base64数据长度必须是4的倍数')
+    padding = 0
+    if encoded_length:
+        padding = 2 if value.endswith('==') else 1 if value.endswith('=') else 0
+    decoded_length = encoded_length // 4 * 3 - padding
+    if decoded_length > max_size:
+        raise UploadTooLarge(max_size)
+
+    chunk_size = max(4, chunk_size - chunk_size % 4)
+    output = bytearray(decoded_length)
+    position = 0
+    for offset in range(start, len(value), chunk_size):
+        data = base64.b64decode(value[offset:offset + chunk_size], validate=True)
+        output[position:position + len(data)] = data
+        position += len(data)
+    if position != decoded_length:
+        raise ValueError('Base64数据的填充位置不正确')
+    return output
@@ -1,3 +1,875 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import math
+import struct
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .authentication import get_cached_user, local_user_cache
+from .caching import BloomFilter
+from .checks import check_shared_caches
+from .image_records import DELETING_ERROR, NOT_OWNED_ERROR, InvalidCursor, delete_images, list_images
+from .image_sniffing import InvalidImage, sniff_image, validate_image_header
+from .models import DirectUpload, RateLimitCounter, SmsCode, SmsMessage, UploadedContent, UploadedImage, UploadJob, UploadSession, User
+from .oss_service import AlibabaCloudOSSService
+from .resilience import CircuitBreaker, CircuitOpenError
+from .serializers import UserProfileSerializer
+from .sms_codes import CODE_EXPIRED, CODE_INVALID, CODE_VALID, CacheSmsCodeStore, DatabaseSmsCodeStore, purge_expired_codes
+from .sms_dispatch import StubSmsProvider, claim_batch, dispatch_pending, enqueue_login_code, purge_sms_messages
+from .storage import InMemoryStorageService, claim_duplicate, register_content, release_and_delete
+from .streaming import UploadTooLarge, decode_base64_image
+from .throttling import SlidingWindowRateLimiter, purge_expired_counters
+from .token_revocation import RevokedTokenRegistry
+from .upload_jobs import claim_next_job, create_upload_job, get_spool_dir, job_results, next_due_at, process_pending_jobs, run_job
+from .upload_sessions import UploadSessionError, complete_session, create_session, get_session_path, write_chunk
+
+
+class DatabaseSmsCodeStoreTests(TestCase):
+    """验证码核销（一条条件UPDATE）"""
+
+    def setUp(self):
+        self.store = DatabaseSmsCodeStore()
+        self.phone = '13800000001'
+
+    def test_consume_once(self):
+        self.store.save(self.phone, '123456')
+        self.assertEqual(self.store.consume(self.phone, '123456'), CODE_VALID)
+        self.assertEqual(self.store.consume(self.phone, '123456'), CODE_INVALID)
+
+    def test_wrong_code(self):
+        self.store.save(self.phone, '123456')
+        self.assertEqual(self.store.consume(self.phone, '654321'), CODE_INVALID)
+        self.assertEqual(self.store.consume('13800000002', '123456'), CODE_INVALID)
+
+    def test_expired_code(self):
+        self.store.save(self.phone, '123456')
+        SmsCode.objects.filter(phone=self.phone).update(created_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(self.store.consume(self.phone, '123456'), CODE_EXPIRED)
+
+    def test_consume_is_single_update(self):
+        self.store.save(self.phone, '123456')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store.consume(self.phone, '123456'), CODE_VALID)
+
+
+class ConcurrentRedeemTests(TransactionTestCase):
+    """并发核销同一个验证码时只有一个请求成功"""
+
+    def test_concurrent_consume(self):
+        store = DatabaseSmsCodeStore()
+        store.save('13800000001', '123456')
+        results = []
+        barrier = threading.Barrier(8)
+
+        def redeem():
+            try:
+                barrier.wait()
+                results.append(store.consume('13800000001', '123456'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=redeem) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(CODE_VALID), 1)
+        self.assertEqual(results.count(CODE_INVALID), 7)
+
+
+class CircuitBreakerTests(TestCase):
+    """熔断器状态转换"""
+
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch('users.resilience.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.record_failure(RuntimeError('boom'))
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.fail(1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_success_resets_failures(self):
+        self.fail(2)
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_success_closes(self):
+        self.fail(3)
+        self.now += 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()
+        # 半开状态只放行一个探测请求
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_probe_failure_reopens(self):
+        self.fail(3)
+        self.now += 30
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.snapshot()['opened'], 2)
+
+
+class CursorPaginationTests(TestCase):
+    """图片列表的游标分页"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone='13800000001')
+        other = User.objects.create_user(phone='13800000002')
+        created_at = timezone.now()
+        for index in range(5):
+            # 前三条创建时间相同，按 id 区分顺序
+            UploadedImage.objects.create(
+                owner=self.user,
+                object_key=f'images/{index}.jpg',
+                folder='avatars' if index % 2 else 'images',
+                size=1,
+                created_at=created_at - timedelta(seconds=max(0, index - 2)),
+            )
+        UploadedImage.objects.create(owner=other, object_key='images/other.jpg', folder='images', size=1)
+
+    def collect(self, **kwargs):
+        keys = []
+        cursor = None
+        while True:
+            images, cursor = list_images(self.user, cursor=cursor, limit=2, **kwargs)
+            keys.extend(image.object_key for image in images)
+            if cursor is None:
+                return keys
+
+    def test_pages_cover_all_images_in_order(self):
+        self.assertEqual(self.collect(), [f'images/{index}.jpg' for index in [2, 1, 0, 3, 4]])
+
+    def test_folder_filter(self):
+        self.assertEqual(self.collect(folder='avatars'), ['images/1.jpg', 'images/3.jpg'])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            list_images(self.user, cursor='not-a-cursor')
+
+
+class ImageSnifferTests(TestCase):
+    """从文件头解析图片格式和宽高"""
+
+    def encode(self, image_format, size=(40, 30)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size).save(buffer, image_format)
+        return buffer.getvalue()
+
+    def test_formats(self):
+        for image_format in ['PNG', 'JPEG', 'GIF', 'WEBP']:
+            with self.subTest(image_format=image_format):
+                self.assertEqual(
+                    sniff_image(self.encode(image_format)),
+                    {'format': image_format, 'width': 40, 'height': 30},
+                )
+
+    def test_header_only(self):
+        header = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 4000, 3000)
+        self.assertEqual(sniff_image(header), {'format': 'PNG', 'width': 4000, 'height': 3000})
+
+    def test_invalid_data(self):
+        self.assertIsNone(sniff_image(b'not an image'))
+        self.assertIsNone(sniff_image(b''))
+        with self.assertRaises(InvalidImage):
+            validate_image_header(b'not an image')
+
+    def test_max_pixels(self):
+        data = self.encode('PNG', size=(100, 100))
+        self.assertEqual(validate_image_header(data, max_pixels=10000)['width'], 100)
+        with self.assertRaises(InvalidImage):
+            validate_image_header(data, max_pixels=9999)
+
+
+class BloomFilterTests(TestCase):
+    """布隆过滤器"""
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        items = [f'jti-{index}' for index in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        self.assertEqual(bloom.count, 1000)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+        for index in range(1000):
+            bloom.add(f'jti-{index}')
+        false_positives = sum(f'other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
+
+@override_settings(TOKEN_BLACKLIST_CACHE_ALIAS='shared', TOKEN_BLACKLIST_SYNC_INTERVAL=60)
+class RevokedTokenRegistryTests(TestCase):
+    """令牌撤销和进程间同步"""
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.expires_at = time.time() + 3600
+
+    def test_revoke_once(self):
+        registry = RevokedTokenRegistry()
+        self.assertFalse(registry.is_revoked('a'))
+        self.assertTrue(registry.revoke('a', self.expires_at))
+        self.assertFalse(registry.revoke('a', self.expires_at))
+        self.assertTrue(registry.is_revoked('a'))
+
+    def test_other_process_syncs_after_interval(self):
+        # 两个实例模拟两个进程，共享同一个缓存
+        local, other = RevokedTokenRegistry(), RevokedTokenRegistry()
+        self.assertFalse(other.is_revoked('a'))
+        local.revoke('a', self.expires_at)
+        # 同步间隔内仍使用本地的布隆过滤器
+        self.assertFalse(other.is_revoked('a'))
+        other._next_sync = 0
+        self.assertTrue(other.is_revoked('a'))
+        self.assertFalse(other.is_revoked('b'))
+
+    def test_new_process_loads_existing_revocations(self):
+        local = RevokedTokenRegistry()
+        for jti in ['a', 'b', 'c']:
+            local.revoke(jti, self.expires_at)
+        fresh = RevokedTokenRegistry()
+        self.assertTrue(all(fresh.is_revoked(jti) for jti in ['a', 'b', 'c']))
+        self.assertEqual(fresh._synced_version, 3)
+
+    def test_expired_token_is_not_stored(self):
+        registry = RevokedTokenRegistry()
+        self.assertTrue(registry.revoke('a', time.time() - 1))
+        self.assertFalse(registry.is_revoked('a'))
+
+
+class DeleteImagesTests(TestCase):
+    """删除图片只释放调用方持有的去重引用"""
+
+    def setUp(self):
+        self.storage = InMemoryStorageService()
+        self.alice = User.objects.create_user(phone='13800000001')
+        self.bob = User.objects.create_user(phone='13800000002')
+        self.storage.objects['shared.jpg'] = b'data'
+        register_content('a' * 64, 'shared.jpg', 4)
+        claim_duplicate('a' * 64)
+        for user in [self.alice, self.bob]:
+            UploadedImage.objects.create(owner=user, object_key='shared.jpg', folder='images', size=4)
+
+    def test_cannot_delete_other_users_image(self):
+        self.storage.objects['alice.jpg'] = b'data'
+        UploadedImage.objects.create(owner=self.alice, object_key='alice.jpg', folder='images', size=4)
+        results = delete_images(self.bob, ['alice.jpg'], self.storage.delete_files)
+        self.assertEqual(results, [{'success': False, 'object_key': 'alice.jpg', 'error': NOT_OWNED_ERROR}])
+        self.assertIn('alice.jpg', self.storage.objects)
+
+    def test_shared_content_deleted_with_last_reference(self):
+        delete_images(self.alice, ['shared.jpg'], self.storage.delete_files)
+        self.assertEqual(UploadedContent.objects.get(object_key='shared.jpg').ref_count, 1)
+        self.assertIn('shared.jpg', self.storage.objects)
+
+        delete_images(self.bob, ['shared.jpg'], self.storage.delete_files)
+        self.assertFalse(UploadedContent.objects.filter(object_key='shared.jpg').exists())
+        self.assertNotIn('shared.jpg', self.storage.objects)
+        self.assertFalse(UploadedImage.objects.exists())
+
+    def test_storage_failure_keeps_references(self):
+        UploadedImage.objects.filter(owner=self.bob).delete()
+        UploadedContent.objects.filter(object_key='shared.jpg').update(ref_count=1)
+        with mock.patch.object(self.storage, '_delete_objects', side_effect=RuntimeError('down')):
+            results = delete_images(self.alice, ['shared.jpg'], self.storage.delete_files)
+        self.assertFalse(results[0]['success'])
+        self.assertTrue(UploadedContent.objects.filter(object_key='shared.jpg').exists())
+        self.assertTrue(UploadedImage.objects.filter(owner=self.alice, deleting_at__isnull=True).exists())
+
+    def test_image_being_deleted(self):
+        UploadedImage.objects.filter(owner=self.alice).update(deleting_at=timezone.now())
+        results = delete_images(self.alice, ['shared.jpg'], self.storage.delete_files)
+        self.assertEqual(results[0]['error'], DELETING_ERROR)
+        self.assertEqual(UploadedContent.objects.get(object_key='shared.jpg').ref_count, 2)
+
+        # 删除进程已退出时可以重新删除
+        UploadedImage.objects.filter(owner=self.alice).update(deleting_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(delete_images(self.alice, ['shared.jpg'], self.storage.delete_files)[0]['success'])
+        self.assertEqual(UploadedContent.objects.get(object_key='shared.jpg').ref_count, 1)
+
+
+class DeleteImagesTransactionTests(TransactionTestCase):
+    """删除图片时不在事务中调用存储"""
+
+    def test_storage_called_outside_transaction(self):
+        user = User.objects.create_user(phone='13800000001')
+        UploadedImage.objects.create(owner=user, object_key='a.jpg', folder='images', size=4)
+        calls = []
+
+        def delete_files(object_keys, references):
+            calls.append(connection.in_atomic_block)
+            return [{'success': True, 'object_key': key} for key in object_keys]
+
+        self.assertTrue(delete_images(user, ['a.jpg'], delete_files)[0]['success'])
+        self.assertEqual(calls, [False])
+        self.assertFalse(UploadedImage.objects.exists())
+
+
+@override_settings(SMS_DISPATCH_WORKER='command', SMS_DISPATCH_MAX_ATTEMPTS=2)
+class SmsDispatchTests(TestCase):
+    """短信发送队列"""
+
+    def setUp(self):
+        self.provider = StubSmsProvider()
+        patcher = mock.patch('users.sms_dispatch.get_provider', return_value=self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_send_and_scrub_params(self):
+        message = enqueue_login_code('13800000001', '123456')
+        with self.assertLogs('users.sms_dispatch', 'INFO') as logs:
+            self.assertEqual(dispatch_pending(), 1)
+        self.assertNotIn('123456', '\n'.join(logs.output))
+        message.refresh_from_db()
+        self.assertEqual(message.status, SmsMessage.STATUS_SENT)
+        self.assertEqual(message.params, {})
+        self.assertEqual(dispatch_pending(), 0)
+
+    def test_claimed_message_is_not_claimed_again(self):
+        enqueue_login_code('13800000001', '123456')
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_retry_then_fail(self):
+        message = enqueue_login_code('13800000001', '123456')
+        failure = {'success': False, 'error': '网关超时', 'retryable': True}
+        with mock.patch.object(self.provider, 'send_batch', return_value=[failure]):
+            dispatch_pending()
+            message.refresh_from_db()
+            self.assertEqual(message.status, SmsMessage.STATUS_PENDING)
+            self.assertGreater(message.next_attempt_at, timezone.now())
+            self.assertEqual(message.params, {'code': '123456'})
+            # 未到重试时间时不会被领取
+            self.assertEqual(dispatch_pending(), 0)
+
+            SmsMessage.objects.filter(id=message.id).update(next_attempt_at=timezone.now())
+            dispatch_pending()
+        message.refresh_from_db()
+        self.assertEqual(message.status, SmsMessage.STATUS_FAILED)
+        self.assertEqual(message.attempts, 2)
+        self.assertEqual(message.params, {})
+
+
+class PurgeTests(TestCase):
+    """分批清理过期记录"""
+
+    def test_purge_sms_messages(self):
+        old = timezone.now() - timedelta(days=8)
+        sent = SmsMessage.objects.create(phone='13800000001', template='t', status=SmsMessage.STATUS_SENT, created_at=old)
+        pending = SmsMessage.objects.create(phone='13800000001', template='t', created_at=old)
+        recent = SmsMessage.objects.create(phone='13800000001', template='t', status=SmsMessage.STATUS_SENT)
+        self.assertEqual(purge_sms_messages(batch_size=1), 1)
+        self.assertEqual(set(SmsMessage.objects.values_list('id', flat=True)), {pending.id, recent.id})
+        self.assertFalse(SmsMessage.objects.filter(id=sent.id).exists())
+
+    def test_purge_expired_codes_with_archive(self):
+        for index in range(5):
+            SmsCode.objects.create(phone=f'1380000000{index}', code='123456', created_at=timezone.now() - timedelta(hours=1))
+        SmsCode.objects.create(phone='13800000009', code='123456')
+        archive = io.StringIO()
+        batches = []
+        self.assertEqual(purge_expired_codes(batch_size=2, archive=archive, progress=batches.append), 5)
+        self.assertEqual(sum(batches), 5)
+        rows = [json.loads(line) for line in archive.getvalue().splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(list(SmsCode.objects.values_list('phone', flat=True)), ['13800000009'])
+
+
+class SlidingWindowRateLimiterTests(TestCase):
+    """滑动窗口限流"""
+
+    def test_limit_within_window(self):
+        limiter = SlidingWindowRateLimiter('test', [(2, 60)])
+        self.assertIsNone(limiter.hit('a', now=1000.0))
+        self.assertIsNone(limiter.hit('a', now=1001.0))
+        self.assertAlmostEqual(limiter.hit('a', now=1002.0), 18.0)
+        # 不同的限流对象分别计数
+        self.assertIsNone(limiter.hit('b', now=1002.0))
+
+    def test_previous_window_is_weighted(self):
+        limiter = SlidingWindowRateLimiter('test', [(2, 60)])
+        limiter.hit('a', now=1010.0)
+        limiter.hit('a', now=1011.0)
+        # 新窗口刚开始时上一个窗口的计数几乎全部计入
+        self.assertIsNotNone(limiter.hit('a', now=1021.0))
+        # 上一个窗口过去一半后折算为1次
+        self.assertIsNone(limiter.hit('a', now=1050.0))
+
+    def test_rejected_hits_are_not_counted(self):
+        limiter = SlidingWindowRateLimiter('test', [(1, 60), (5, 3600)])
+        self.assertIsNone(limiter.hit('a', now=3600.0))
+        for second in range(1, 6):
+            self.assertIsNotNone(limiter.hit('a', now=3600.0 + second))
+        self.assertEqual(RateLimitCounter.objects.get(key=limiter.make_key('a', 3600, 1)).count, 1)
+        self.assertIsNone(limiter.hit('a', now=3600.0 + 120))
+
+    def test_undo(self):
+        limiter = SlidingWindowRateLimiter('test', [(1, 60)])
+        self.assertIsNone(limiter.hit('a', now=1000.0))
+        limiter.undo('a', now=1000.0)
+        self.assertIsNone(limiter.hit('a', now=1001.0))
+
+    def test_purge_expired_counters(self):
+        limiter = SlidingWindowRateLimiter('test', [(1, 60)])
+        limiter.hit('a', now=1000.0)
+        limiter.hit('a')
+        self.assertEqual(purge_expired_counters(), 1)
+        self.assertEqual(RateLimitCounter.objects.count(), 1)
+
+    @override_settings(SMS_DISPATCH_WORKER='command')
+    def test_send_sms_code_throttled(self):
+        response = self.client.post('/api/users/send-sms-code/', {'phone': '13800000001'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/users/send-sms-code/', {'phone': '13800000001'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class ConcurrentRateLimitTests(TransactionTestCase):
+    """并发请求共享同一份计数"""
+
+    def test_concurrent_hits(self):
+        limiter = SlidingWindowRateLimiter('test', [(3, 60)])
+        results = []
+        barrier = threading.Barrier(10)
+
+        def hit():
+            try:
+                barrier.wait()
+                results.append(limiter.hit('a', now=1000.0))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hit) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results.count(None), 3)
+        self.assertEqual(RateLimitCounter.objects.get(key=limiter.make_key('a', 60, 16)).count, 3)
+
+
+class CacheSmsCodeStoreTests(TestCase):
+    """保存在共享缓存中的验证码"""
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.store = CacheSmsCodeStore()
+
+    def test_consume_once(self):
+        self.store.save('13800000001', '123456')
+        # 另一个进程创建的实例也能核销
+        self.assertEqual(CacheSmsCodeStore().consume('13800000001', '123456'), CODE_VALID)
+        self.assertEqual(self.store.consume('13800000001', '123456'), CODE_INVALID)
+        self.assertEqual(self.store.consume('13800000001', '654321'), CODE_INVALID)
+
+    def test_expired_code(self):
+        with mock.patch('users.sms_codes.get_expire_seconds', return_value=-1):
+            self.store.save('13800000001', '123456')
+        self.assertEqual(self.store.consume('13800000001', '123456'), CODE_INVALID)
+
+    def test_process_local_cache_rejected(self):
+        self.assertEqual(check_shared_caches(None), [])
+        with override_settings(SMS_CODE_CACHE_ALIAS='default'):
+            errors = check_shared_caches(None)
+        self.assertEqual([error.obj for error in errors], ['SMS_CODE_CACHE_ALIAS'])
+        self.assertEqual(errors[0].id, 'users.E001')
+
+
+class OSSStoreObjectTests(TestCase):
+    """OSS上传结果的处理"""
+
+    def test_error_status_returns_error_result(self):
+        service = AlibabaCloudOSSService()
+        with mock.patch.object(service, '_call', return_value=SimpleNamespace(status=503)):
+            self.assertEqual(service._store_object('images/a.jpg', b'data'), {'success': False, 'error': 503})
+        with mock.patch.object(service, '_call', return_value=SimpleNamespace(status=200)):
+            self.assertEqual(service._store_object('images/a.jpg', b'data'), {'success': True, 'size': 4})
+
+
+class DirectUploadViewTests(TestCase):
+    """不支持直传的存储后端"""
+
+    def test_backend_without_direct_upload(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(phone='13800000001'))
+        with mock.patch('users.views.oss_service', InMemoryStorageService()):
+            response = client.post('/api/users/direct-upload/', {'filename': 'a.jpg', 'content_type': 'image/jpeg'})
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(set(response.data), {'message', 'error'})
+        self.assertFalse(DirectUpload.objects.exists())
+
+
+class ReleaseAndDeleteTests(TransactionTestCase):
+    """释放去重引用时不在事务中调用存储"""
+
+    def setUp(self):
+        register_content('a' * 64, 'shared.jpg', 4)
+        claim_duplicate('a' * 64)
+
+    def test_storage_called_outside_transaction(self):
+        calls = []
+
+        def delete_objects(keys):
+            calls.append((connection.in_atomic_block, UploadedContent.objects.get(object_key='shared.jpg').deleting_at))
+            # 正在删除的内容不再被复用
+            self.assertIsNone(claim_duplicate('a' * 64))
+            return keys
+
+        results, deleted = release_and_delete(['shared.jpg'], {'shared.jpg': 1}, delete_objects, 10)
+        self.assertEqual(UploadedContent.objects.get(object_key='shared.jpg').ref_count, 1)
+        self.assertEqual(calls, [])
+
+        results, deleted = release_and_delete(['shared.jpg'], None, delete_objects, 10)
+        self.assertEqual(deleted, ['shared.jpg'])
+        self.assertEqual(len(calls), 1)
+        self.assertFalse(calls[0][0])
+        self.assertIsNotNone(calls[0][1])
+        self.assertFalse(UploadedContent.objects.exists())
+
+    def test_failed_delete_keeps_references(self):
+        UploadedContent.objects.update(ref_count=1)
+
+        def delete_objects(keys):
+            raise RuntimeError('down')
+
+        results, deleted = release_and_delete(['shared.jpg'], None, delete_objects, 10)
+        self.assertFalse(results['shared.jpg']['success'])
+        content = UploadedContent.objects.get(object_key='shared.jpg')
+        self.assertEqual(content.ref_count, 1)
+        self.assertIsNone(content.deleting_at)
+        self.assertIsNotNone(claim_duplicate('a' * 64))
+
+
+@override_settings(UPLOAD_SESSION_CHUNK_SIZE=32)
+class UploadSessionTests(TestCase):
+    """断点续传上传会话"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(UPLOAD_SESSION_DIR=Path(directory.name))
+        override.enable()
+        self.addCleanup(override.disable)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30)).save(buffer, 'PNG')
+        self.data = buffer.getvalue()
+        self.user = User.objects.create_user(phone='13800000001')
+        self.session = create_session(self.user, 'a.png', 'images', len(self.data))
+
+    def chunk(self, index):
+        return self.data[index * 32:(index + 1) * 32]
+
+    def write(self, session, index):
+        data = self.chunk(index)
+        return write_chunk(session, index, io.BytesIO(data), len(data))
+
+    def test_upload_and_complete(self):
+        chunks = math.ceil(len(self.data) / 32)
+        for index in range(chunks):
+            self.write(self.session, index)
+        # 客户端没收到响应而重发
+        self.assertEqual(self.write(self.session, 0), len(self.data))
+
+        storage = InMemoryStorageService()
+        result = complete_session(self.session, storage)
+        self.assertTrue(result['success'])
+        self.assertEqual(storage.objects[result['object_key']], self.data)
+        self.assertTrue(UploadedImage.objects.filter(owner=self.user, object_key=result['object_key']).exists())
+        self.assertEqual(complete_session(self.session, storage)['object_key'], result['object_key'])
+
+    def test_out_of_order_and_incomplete_chunks(self):
+        with self.assertRaises(UploadSessionError) as context:
+            self.write(self.session, 1)
+        self.assertEqual(context.exception.status_code, 409)
+        with self.assertRaises(UploadSessionError):
+            write_chunk(self.session, 0, io.BytesIO(self.chunk(0)[:10]), 32)
+        with self.assertRaises(UploadSessionError):
+            complete_session(self.session, InMemoryStorageService())
+        self.assertEqual(UploadSession.objects.get(id=self.session.id).received, 0)
+
+    def test_duplicate_chunk_does_not_truncate_later_chunks(self):
+        # 两个请求同时上传第0块，其中一个先完成并且第1块也已写入
+        stale = UploadSession.objects.get(id=self.session.id)
+        self.write(self.session, 0)
+        self.write(self.session, 1)
+        self.assertEqual(self.write(stale, 0), 64)
+        with open(get_session_path(self.session), 'rb') as f:
+            self.assertEqual(f.read(), self.data[:64])
+
+    def test_chunk_being_written(self):
+        UploadSession.objects.filter(id=self.session.id).update(chunk_claimed_at=timezone.now())
+        with self.assertRaises(UploadSessionError) as context:
+            self.write(self.session, 0)
+        self.assertEqual(context.exception.status_code, 409)
+
+        # 领取超时后重发的请求可以重新领取
+        UploadSession.objects.filter(id=self.session.id).update(chunk_claimed_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.write(self.session, 0), 32)
+        self.assertIsNone(UploadSession.objects.get(id=self.session.id).chunk_claimed_at)
+
+
+class CachedUserTests(TestCase):
+    """JWT认证的用户缓存"""
+
+    def setUp(self):
+        local_user_cache.clear()
+        caches['default'].clear()
+        self.user = User.objects.create_user(phone='13800000001')
+
+    def test_cache_hit_skips_database(self):
+        get_cached_user(self.user.id)
+        with self.assertNumQueries(0):
+            cached = get_cached_user(self.user.id)
+        self.assertEqual(cached.phone, '13800000001')
+        # 每次返回新的副本
+        cached.nickname = 'changed'
+        self.assertIsNone(get_cached_user(self.user.id).nickname)
+
+    def test_invalidated_after_commit(self):
+        get_cached_user(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.nickname = 'new'
+            self.user.save()
+        self.assertEqual(get_cached_user(self.user.id).nickname, 'new')
+
+    def test_profile_update_does_not_write_back_stale_fields(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.user.get_tokens_for_user()['access']}")
+        self.assertEqual(client.get('/api/users/profile/').status_code, 200)
+
+        # 其他进程直接修改了数据库，缓存中仍是旧数据
+        User.objects.filter(id=self.user.id).update(nickname='other', is_active=False)
+        response = client.post('/api/users/profile/', {'bio': 'hello'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['nickname'], 'other')
+
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual(user.bio, 'hello')
+        self.assertEqual(user.nickname, 'other')
+        self.assertFalse(user.is_active)
+
+    def test_serializer_saves_only_submitted_fields(self):
+        stale = User.objects.get(id=self.user.id)
+        User.objects.filter(id=self.user.id).update(nickname='other')
+        serializer = UserProfileSerializer(stale, data={'bio': 'hello'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        user = User.objects.get(id=self.user.id)
+        self.assertEqual((user.bio, user.nickname), ('hello', 'other'))
+        self.assertGreater(user.updated_at, self.user.updated_at)
+
+
+@override_settings(OSS_UPLOAD_CONCURRENCY=4)
+class BatchUploadTests(TestCase):
+    """批量上传在线程池中并发执行"""
+
+    def test_order_and_failure_isolation(self):
+        storage = InMemoryStorageService()
+        store_object = storage._store_object
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow_store(object_key, file_content, size=None):
+            with lock:
+                running.append(object_key)
+                peak.append(len(running))
+            try:
+                # 前面的文件更慢，完成顺序与传入顺序相反
+                time.sleep(0.05 * (4 - int(file_content[-1:])))
+                if file_content.endswith(b'2'):
+                    raise RuntimeError('上传超时')
+                return store_object(object_key, file_content, size)
+            finally:
+                with lock:
+                    running.remove(object_key)
+
+        files = [(f'data-{index}'.encode(), f'{index}.jpg') for index in range(4)]
+        with mock.patch.object(storage, '_store_object', side_effect=slow_store):
+            results = storage.upload_files(files, folder='images')
+
+        self.assertEqual([result['original_filename'] for result in results], ['0.jpg', '1.jpg', '2.jpg', '3.jpg'])
+        self.assertEqual([result['success'] for result in results], [True, True, False, True])
+        self.assertIn('上传超时', results[2]['error'])
+        self.assertGreater(max(peak), 1)
+        self.assertEqual(len(storage.objects), 3)
+
+
+class DecodeBase64ImageTests(TestCase):
+    """按块解码Base64图片数据"""
+
+    def setUp(self):
+        self.data = bytes(range(256)) * 40 + b'\x01\x02'
+        self.encoded = base64.b64encode(self.data).decode()
+
+    def test_matches_standard_decoder(self):
+        for chunk_size in [4, 7, 100, 64 * 1024]:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(bytes(decode_base64_image(self.encoded, len(self.data), chunk_size)), self.data)
+
+    def test_data_url_and_line_breaks(self):
+        wrapped = '\r\n'.join(self.encoded[offset:offset + 76] for offset in range(0, len(self.encoded), 76))
+        value = f'data:image/png;base64,{wrapped}\n'
+        self.assertEqual(bytes(decode_base64_image(value, len(self.data), chunk_size=100)), self.data)
+
+    def test_size_checked_before_decoding(self):
+        with mock.patch('users.streaming.base64.b64decode') as b64decode:
+            with self.assertRaises(UploadTooLarge):
+                decode_base64_image(self.encoded, len(self.data) - 1)
+        b64decode.assert_not_called()
+
+    def test_invalid_data(self):
+        for value in ['abc', 'ab=c', '!!!!', 'data:image/png;base64']:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    decode_base64_image(value, 1024)
+
+
+@override_settings(UPLOAD_JOB_WORKER='command', UPLOAD_JOB_MAX_ATTEMPTS=3)
+class UploadJobTests(TestCase):
+    """后台上传任务的领取和重试"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(UPLOAD_JOB_SPOOL_DIR=Path(directory.name))
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.storage = InMemoryStorageService()
+        patcher = mock.patch('users.oss_service.oss_service', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(phone='13800000001')
+        images = [SimpleUploadedFile(f'{index}.jpg', f'data-{index}'.encode()) for index in range(2)]
+        self.job = create_upload_job(self.user, images, 'images')
+
+    def test_claim_and_run(self):
+        job = claim_next_job()
+        self.assertEqual(job.id, self.job.id)
+        self.assertIsNone(claim_next_job())
+        run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.STATUS_COMPLETED)
+        self.assertEqual([result['success'] for result in job_results(job)], [True, True])
+        self.assertEqual(UploadedImage.objects.filter(owner=self.user).count(), 2)
+        self.assertFalse((get_spool_dir() / str(job.id)).exists())
+
+    def test_failed_file_is_retried_with_backoff(self):
+        upload_file = self.storage.upload_file
+        calls = []
+
+        def flaky_upload(file_content, filename, folder):
+            calls.append(filename)
+            if filename == '1.jpg' and calls.count(filename) == 1:
+                return {'success': False, 'error': '上传超时'}
+            return upload_file(file_content=file_content, filename=filename, folder=folder)
+
+        with mock.patch.object(self.storage, 'upload_file', side_effect=flaky_upload):
+            self.assertEqual(process_pending_jobs(), 1)
+            job = UploadJob.objects.get(id=self.job.id)
+            self.assertEqual(job.status, UploadJob.STATUS_PENDING)
+            self.assertGreater(job.next_attempt_at, timezone.now())
+            self.assertEqual(next_due_at(), job.next_attempt_at)
+            # 未到重试时间时不会被领取
+            self.assertEqual(process_pending_jobs(), 0)
+
+            UploadJob.objects.filter(id=job.id).update(next_attempt_at=timezone.now())
+            self.assertEqual(process_pending_jobs(), 1)
+
+        # 已成功的文件不会重复上传
+        self.assertEqual(calls, ['0.jpg', '1.jpg', '1.jpg'])
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.STATUS_COMPLETED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_stale_job_is_reclaimed_and_old_result_discarded(self):
+        first = claim_next_job()
+        UploadJob.objects.filter(id=first.id).update(started_at=timezone.now() - timedelta(hours=1))
+        second = claim_next_job()
+        self.assertEqual(second.id, first.id)
+        self.assertNotEqual(second.claim_token, first.claim_token)
+
+        run_job(first)
+        job = UploadJob.objects.get(id=first.id)
+        self.assertEqual(job.status, UploadJob.STATUS_RUNNING)
+        self.assertEqual(job.claim_token, second.claim_token)
+
+        run_job(second)
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadJob.STATUS_COMPLETED)
+
+
+class RequestSizeLimitTests(TestCase):
+    """读取请求体之前拒绝过大的请求"""
+
+    def test_content_length_over_limit(self):
+        limit = settings.REQUEST_SIZE_LIMITS['users:upload-raw-binary-image']
+        with mock.patch('users.views.RawBinaryImageUploadView.post') as post:
+            response = self.client.generic(
+                'POST', '/api/users/upload-raw-binary-image/', b'x' * 16,
+                content_type='application/octet-stream', CONTENT_LENGTH=str(limit + 1),
+            )
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(set(response.json()), {'message', 'error'})
+        post.assert_not_called()
+
+    @override_settings(REQUEST_SIZE_LIMITS={'users:upload-image': 8})
+    def test_unlimited_view_is_not_checked(self):
+        response = self.client.post('/api/users/send-sms-code/', {'phone': '1' * 64}, content_type='application/json')
+        self.assertNotEqual(response.status_code, 413)
+
+    @override_settings(UPLOAD_FILE_MAX_SIZE=1024)
+    def test_multipart_file_over_limit(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(phone='13800000001'))
+        upload = SimpleUploadedFile('a.png', b'x' * 4096, content_type='image/png')
+        with mock.patch('users.views.oss_service') as oss_service:
+            response = client.post('/api/users/upload-image/', {'image': upload})
+        self.assertEqual(response.status_code, 413)
+        oss_service.upload_file.assert_not_called()
+
+    def test_chunk_limit_follows_chunk_size(self):
+        self.assertEqual(settings.REQUEST_SIZE_LIMITS['users:upload-session-chunk'], settings.UPLOAD_SESSION_CHUNK_SIZE)
@@ -0,0 +1,201 @@
+"""
+发送验证码的滑动窗口限流
+
+按手机号和按IP分别限流，计数保存在 RateLimitCounter 表中，所有worker进程共享同一份计数。
+每个限制使用滑动窗口计数：当前窗口的计数加上上一个窗口计数按剩余比例折算，
+每次检查只读写固定数量的计数行，与请求量无关，也不查询 SmsCode 表。
+过期的计数行由 `python manage.py purge_rate_limits` 分批删除。
+"""
+import abc
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Optional, Sequence, Tuple, Callable
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from .background import purge_in_batches
+from .models import RateLimitCounter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SMS_RATE_LIMITS = {
+    'phone': [(1, 60), (5, 3600), (10, 86400)],
+    'ip': [(20, 3600), (100, 86400)],
+}
+
+
+class SlidingWindowRateLimiter:
+    """
+    滑动窗口限流器
+
+    limits 为 [(次数, 窗口秒数), ...]，所有限制都满足时才放行。
+    一次检查在一个事务中完成：先用 UPDATE count = count + 1 递增当前窗口的计数行再读取，
+    计数行在事务结束前被锁定，同一限流对象的并发请求依次检查，不会同时通过；
+    请求被拒绝时回滚事务，被拒绝的请求不占用配额，持续重试不会延长等待时间。
+    """
+
+    def __init__(self, scope: str, limits: Sequence[Tuple[int, int]]):
+        self.scope = scope
+        self.limits = list(limits)
+
+    def make_key(self, identifier: str, window: int, index: int) -> str:
+        return f"ratelimit:{self.scope}:{identifier}:{window}:{index}"
+
+    def _incr(self, key: str, expires_at: datetime) -> int:
+        """在当前事务中递增计数行，行不存在时创建，返回递增后的计数"""
+        counters = RateLimitCounter.objects.filter(key=key)
+        if not counters.update(count=F('count') + 1):
+            try:
+                with transaction.atomic():
+                    RateLimitCounter.objects.create(key=key, count=1, expires_at=expires_at)
+                return 1
+            except IntegrityError:
+                # 并发请求先创建了计数行
+                counters.update(count=F('count') + 1)
+        return counters.values_list('count', flat=True).get()
+
+    def hit(self, identifier: str, now: Optional[float] = None) -> Optional[float]:
+        """
+        记录一次请求并检查是否超过限制
+
+        Args:
+            identifier: 限流对象（手机号或IP）
+            now: 当前时间戳，默认为 time.time()
+
+        Returns:
+            超过限制时返回建议等待的秒数，否则返回None
+        """
+        now = time.time() if now is None else now
+        wait = None
+        with transaction.atomic():
+            # 先写后读：SQLite 上先取得写锁，避免两个事务都持有读锁后互相等待
+            windows: List[Tuple[int, int, float, int, str]] = []
+            for limit, window in self.limits:
+                index = int(now // window)
+                # 计数行在下一个窗口中还要作为上一个窗口读取
+                expires_at = datetime.fromtimestamp((index + 2) * window, tz=dt_timezone.utc)
+                current = self._incr(self.make_key(identifier, window, index), expires_at)
+                previous_key = self.make_key(identifier, window, index - 1)
+                windows.append((limit, window, now - index * window, current, previous_key))
+            previous_keys = [previous_key for *_, previous_key in windows]
+            previous_counts = dict(RateLimitCounter.objects.filter(key__in=previous_keys).values_list('key', 'count'))
+
+            for limit, window, elapsed, current, previous_key in windows:
+                previous = previous_counts.get(previous_key, 0)
+                estimated = previous * (1 - elapsed / window) + current
+                if estimated <= limit:
+                    continue
+
+                # 当前窗口已满时等到下一个窗口，否则等到上一个窗口折算的部分足够小
+                if current > limit or not previous:
+                    retry_after = window - elapsed
+                else:
+                    retry_after = (estimated - limit) / previous * window
+                wait = max(wait or 0, retry_after)
+
+            if wait is not None:
+                # 撤回本次递增
+                transaction.set_rollback(True)
+        return wait
+
+    def undo(self, identifier: str, now: float):
+        """
+        撤回一次已放行的请求（同一请求被其他限流拒绝时调用）
+
+        Args:
+            identifier: 限流对象
+            now: 放行时传给 hit 的时间戳
+        """
+        keys = [self.make_key(identifier, window, int(now // window)) for limit, window in self.limits]
+        RateLimitCounter.objects.filter(key__in=keys, count__gt=0).update(count=F('count') - 1)
+
+
+def get_sms_limiter(scope: str) -> SlidingWindowRateLimiter:
+    """按 SMS_RATE_LIMITS 创建指定维度（phone/ip）的限流器"""
+    limits = getattr(settings, 'SMS_RATE_LIMITS', DEFAULT_SMS_RATE_LIMITS).get(scope, [])
+    return SlidingWindowRateLimiter(f"sms_{scope}", limits)
+
+
+def purge_expired_counters(batch_size: int = 1000, sleep: float = 0,
+                           progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    分批删除过期的限流计数行
+
+    Args:
+        batch_size: 每批的主键区间大小
+        sleep: 每批之间暂停的秒数
+        progress: 每批完成后调用，参数为本批删除的记录数
+
+    Returns:
+        删除的记录数
+    """
+    expired = RateLimitCounter.objects.filter(expires_at__lte=timezone.now())
+    return purge_in_batches(expired, batch_size=batch_size, sleep=sleep, progress=progress)
+
+
+class SmsRateThrottle(BaseThrottle, abc.ABC):
+    """发送验证码限流的基类，子类实现 get_identifier"""
+
+    scope = None
+    admitted = None
+
+    @abc.abstractmethod
+    def get_identifier(self, request) -> Optional[str]:
+        """限流对象（手机号或IP），返回None时不限流"""
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        self.admitted = None
+        identifier = self.get_identifier(request)
+        if not identifier:
+            return True
+        limiter = get_sms_limiter(self.scope)
+        if not limiter.limits:
+            return True
+        now = time.time()
+        self.retry_after = limiter.hit(identifier, now)
+        if self.retry_after is not None:
+            logger.warning(f"发送验证码请求过于频繁 - {self.scope}: {identifier}")
+            return False
+        self.admitted = (limiter, identifier, now)
+        return True
+
+    def undo(self):
+        """撤回本次放行的计数，请求被其他限流拒绝时由视图调用"""
+        if self.admitted is not None:
+            limiter, identifier, now = self.admitted
+            limiter.undo(identifier, now)
+            self.admitted = None
+
+    def wait(self):
+        if self.retry_after is None:
+            return None
+        return math.ceil(self.retry_after)
+
+
+class SmsPhoneRateThrottle(SmsRateThrottle):
+    """按手机号限制发送验证码的频率"""
+
+    scope = 'phone'
+
+    def get_identifier(self, request) -> Optional[str]:
+        phone = request.data.get('phone') if hasattr(request.data, 'get') else None
+        # 格式不正确的手机号由序列化器拒绝，不占用计数
+        if not isinstance(phone, str) or not phone.isdigit() or len(phone) != 11:
+            return None
+        return phone
+
+
+class SmsIpRateThrottle(SmsRateThrottle):
+    """按客户端IP限制发送验证码的频率（代理层数由 NUM_PROXIES 决定）"""
+
+    scope = 'ip'
+
+    def get_identifier(self, request) -> Optional[str]:
+        return self.get_ident(request)
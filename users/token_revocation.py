@@ -0,0 +1,173 @@
+"""
+refresh token 撤销（黑名单）
+
+撤销的 jti 保存在 TOKEN_BLACKLIST_CACHE_ALIAS 指定的共享缓存中（生产环境使用Redis，默认使用数据库缓存表；
+进程内缓存会被系统检查 users.E001 拒绝），TTL为令牌的剩余有效期，
+令牌过期后记录自动删除，不需要数据库表和清理任务。
+
+每个进程在前面放一个布隆过滤器：绝大多数令牌没有被撤销，布隆过滤器判断“不存在”后直接返回，
+只有判断“可能存在”时才查询共享缓存。其他进程的撤销记录通过共享缓存中的撤销日志同步：
+每次撤销递增版本号并写入 revoked_jti:log:<版本号>，各进程最多每 TOKEN_BLACKLIST_SYNC_INTERVAL 秒读取一次新增的日志。
+
+开启 BLACKLIST_AFTER_ROTATION 时，刷新令牌用 cache.add 原子地撤销旧令牌，
+同一个 refresh token 并发刷新或在其他进程被撤销后再次使用时只有一个请求成功，不受同步间隔影响。
+"""
+import threading
+import time
+from typing import Optional
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from .caching import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'revoked_jti:version'
+LOG_BATCH_SIZE = 1000
+
+
+def get_revocation_cache():
+    """撤销记录使用的共享缓存 TOKEN_BLACKLIST_CACHE_ALIAS"""
+    return caches[getattr(settings, 'TOKEN_BLACKLIST_CACHE_ALIAS', 'default')]
+
+
+def make_revoked_key(jti: str) -> str:
+    return f"revoked_jti:{jti}"
+
+
+def make_log_key(version: int) -> str:
+    return f"revoked_jti:log:{version}"
+
+
+def get_log_timeout() -> int:
+    """撤销日志的保存时间：refresh token 的完整有效期，日志按版本号顺序过期"""
+    return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+class RevokedTokenRegistry:
+    """已撤销令牌的查询和登记（每个进程一个实例）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom: Optional[BloomFilter] = None
+        self._capacity = getattr(settings, 'TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000)
+        self._synced_version = 0
+        self._missing_version = None
+        self._next_sync = 0.0
+
+    def revoke(self, jti: str, expires_at: float) -> bool:
+        """
+        撤销令牌
+
+        Args:
+            jti: 令牌ID
+            expires_at: 令牌的过期时间戳
+
+        Returns:
+            本次撤销成功时返回True，令牌已经被撤销过时返回False
+        """
+        timeout = int(expires_at - time.time()) + 1
+        if timeout <= 0:
+            return True
+        cache = get_revocation_cache()
+        if not cache.add(make_revoked_key(jti), 1, timeout=timeout):
+            return False
+
+        # 数据库缓存等后端的 incr 不是原子操作，并发撤销可能拿到相同的版本号，用 add 占用日志位置，冲突时取下一个版本号
+        cache.add(VERSION_KEY, 0, timeout=None)
+        while True:
+            version = cache.incr(VERSION_KEY)
+            if cache.add(make_log_key(version), jti, timeout=get_log_timeout()):
+                break
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+        return True
+
+    def is_revoked(self, jti: str) -> bool:
+        """
+        判断令牌是否已被撤销
+
+        布隆过滤器判断不存在时直接返回False（只有内存中的哈希计算），否则查询共享缓存确认。
+        """
+        self._sync()
+        if jti not in self._bloom:
+            return False
+        return get_revocation_cache().get(make_revoked_key(jti)) is not None
+
+    def _sync(self):
+        """读取其他进程新增的撤销日志，加入布隆过滤器"""
+        now = time.monotonic()
+        if self._bloom is not None and now < self._next_sync:
+            return
+        with self._lock:
+            if self._bloom is not None and now < self._next_sync:
+                return
+            cache = get_revocation_cache()
+            current = cache.get(VERSION_KEY) or 0
+
+            rebuild = self._bloom is None or current < self._synced_version
+            if self._bloom is not None and self._bloom.count > self._capacity:
+                # 元素数超过容量后误判率上升，扩容后重建
+                self._capacity *= 2
+                rebuild = True
+            if rebuild:
+                bloom = BloomFilter(self._capacity, getattr(settings, 'TOKEN_BLACKLIST_BLOOM_ERROR_RATE', 0.01))
+                start = self._first_live_version(current)
+            else:
+                bloom = self._bloom
+                start = self._synced_version + 1
+
+            # 其他进程递增版本号之后才写入日志，读到的第一个缺失版本可能还没写入，下次同步时从该版本重新读取；
+            # 连续两次同步都缺失的版本视为已被缓存淘汰，跳过
+            synced = current
+            for batch_start in range(start, current + 1, LOG_BATCH_SIZE):
+                versions = range(batch_start, min(batch_start + LOG_BATCH_SIZE, current + 1))
+                entries = cache.get_many([make_log_key(version) for version in versions])
+                for version in versions:
+                    jti = entries.get(make_log_key(version))
+                    if jti is not None:
+                        bloom.add(jti)
+                    elif synced == current and version != self._missing_version:
+                        synced = version - 1
+                        self._missing_version = version
+
+            if rebuild:
+                logger.info(f"已加载令牌撤销记录: 版本{start}-{current}")
+            self._bloom = bloom
+            self._synced_version = synced
+            self._next_sync = now + getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 1)
+
+    def _first_live_version(self, current: int) -> int:
+        """二分查找第一条未过期的撤销日志（日志TTL相同，按版本号顺序过期）"""
+        cache = get_revocation_cache()
+        low, high = 1, current + 1
+        while low < high:
+            middle = (low + high) // 2
+            if cache.get(make_log_key(middle)) is None:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+revoked_tokens = RevokedTokenRegistry()
+
+
+def revoke_token(token: Token) -> bool:
+    """
+    撤销令牌（按 jti 登记，TTL为令牌剩余有效期）
+
+    Returns:
+        本次撤销成功时返回True，令牌已经被撤销过时返回False
+    """
+    return revoked_tokens.revoke(token[api_settings.JTI_CLAIM], token['exp'])
+
+
+def is_token_revoked(token: Token) -> bool:
+    """判断令牌是否已被撤销"""
+    return revoked_tokens.is_revoked(token[api_settings.JTI_CLAIM])
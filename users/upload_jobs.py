@@ -0,0 +1,287 @@
+"""
+后台上传任务
+
+上传请求把文件暂存到本地磁盘并在数据库中创建任务后立即返回，OSS上传在后台完成：
+- UPLOAD_JOB_WORKER = 'local'：在当前进程的线程池中执行（适合单机部署）
+- UPLOAD_JOB_WORKER = 'command'：由 `python manage.py run_upload_worker` 进程轮询执行
+有文件失败的任务按随机指数退避重新排队；local 模式下每个进程处理第一个请求时派发一次，
+接手进程重启前遗留的等待中任务和超时未完成的任务。
+暂存目录需要被Web进程和worker进程共同访问。
+"""
+import os
+import shutil
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, List
+import logging
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import transaction, connection
+from django.db.models import F, Q, Min
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import UploadJob
+from .image_records import record_image
+from .resilience import backoff_delay
+from .background import DispatchTimer, get_executor
+
+logger = logging.getLogger(__name__)
+
+
+def get_spool_dir() -> Path:
+    """暂存目录 UPLOAD_JOB_SPOOL_DIR"""
+    return Path(getattr(settings, 'UPLOAD_JOB_SPOOL_DIR', Path(settings.BASE_DIR) / 'upload_spool'))
+
+
+def create_upload_job(user, images: list, folder: str) -> UploadJob:
+    """
+    暂存上传文件并创建后台上传任务
+
+    Args:
+        user: 上传用户
+        images: 已校验的上传文件列表
+        folder: 存储文件夹
+
+    Returns:
+        创建的上传任务
+    """
+    job = UploadJob(user=user, folder=folder)
+    job_dir = get_spool_dir() / str(job.id)
+    job_dir.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    try:
+        for index, image in enumerate(images):
+            path = job_dir / f"{index}{os.path.splitext(image.name)[1].lower()}"
+            with open(path, 'wb') as f:
+                for chunk in image.chunks():
+                    f.write(chunk)
+            files.append({
+                'filename': image.name,
+                'path': str(path),
+                'size': image.size,
+                'image_info': getattr(image, 'image_info', None),
+            })
+        job.files = files
+        job.save()
+    except Exception:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"上传任务已创建: {job.id}, {len(files)}个文件")
+    if getattr(settings, 'UPLOAD_JOB_WORKER', 'local') == 'local':
+        transaction.on_commit(dispatch_local)
+    return job
+
+
+def dispatch_local():
+    """在当前进程的线程池中处理等待中的任务"""
+    get_executor('upload-job', getattr(settings, 'UPLOAD_JOB_LOCAL_WORKERS', 2)).submit(_process_in_thread)
+
+
+# 等待重试或超时的任务到期后再次派发（每个进程一个Timer）
+dispatch_timer = DispatchTimer(dispatch_local)
+
+
+@receiver(request_started)
+def dispatch_on_first_request(sender, **kwargs):
+    """进程处理第一个请求时派发一次（request_started 信号，只触发一次）"""
+    request_started.disconnect(dispatch_on_first_request)
+    if getattr(settings, 'UPLOAD_JOB_WORKER', 'local') == 'local':
+        dispatch_local()
+
+
+def next_due_at() -> Optional[datetime]:
+    """队列中最早到期的时间：等待重试的任务的下次执行时间，或处理中的任务超时可被重新领取的时间"""
+    stale_timeout = timedelta(seconds=getattr(settings, 'UPLOAD_JOB_STALE_TIMEOUT', 600))
+    due = UploadJob.objects.filter(
+        status__in=[UploadJob.STATUS_PENDING, UploadJob.STATUS_RUNNING]
+    ).aggregate(
+        pending=Min('next_attempt_at', filter=Q(status=UploadJob.STATUS_PENDING)),
+        running=Min('started_at', filter=Q(status=UploadJob.STATUS_RUNNING)),
+    )
+    candidates = [due['pending']]
+    if due['running'] is not None:
+        candidates.append(due['running'] + stale_timeout)
+    candidates = [value for value in candidates if value is not None]
+    return min(candidates) if candidates else None
+
+
+def _process_in_thread():
+    """线程池中执行，结束后关闭该线程的数据库连接；队列中还有未到期的任务时在到期后再次派发"""
+    try:
+        process_pending_jobs()
+        due = next_due_at()
+        if due is not None:
+            dispatch_timer.schedule((due - timezone.now()).total_seconds())
+    except Exception as e:
+        logger.error(f"处理上传任务失败: {str(e)}")
+    finally:
+        connection.close()
+
+
+def claim_next_job(worker: Optional[str] = None) -> Optional[UploadJob]:
+    """
+    领取一个等待中的任务
+
+    使用条件UPDATE把到期的任务从 pending 改为 running 并写入本次的领取标识，多个worker同时领取时只有一个成功；
+    处理中超过 UPLOAD_JOB_STALE_TIMEOUT 秒的任务视为worker已退出，可以重新领取。
+
+    Args:
+        worker: worker标识，仅用于日志
+
+    Returns:
+        领取到的任务，没有可处理的任务时返回None
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=getattr(settings, 'UPLOAD_JOB_STALE_TIMEOUT', 600))
+    claimable = Q(status=UploadJob.STATUS_PENDING, next_attempt_at__lte=now) | Q(status=UploadJob.STATUS_RUNNING, started_at__lt=stale_before)
+
+    for _ in range(5):
+        candidate = UploadJob.objects.filter(claimable).order_by('created_at').values('id', 'status', 'started_at').first()
+        if candidate is None:
+            return None
+        claimed = UploadJob.objects.filter(
+            id=candidate['id'],
+            status=candidate['status'],
+            started_at=candidate['started_at'],
+        ).update(
+            status=UploadJob.STATUS_RUNNING,
+            claim_token=uuid.uuid4(),
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            logger.info(f"领取上传任务: {candidate['id']}, worker: {worker or socket.gethostname()}")
+            return UploadJob.objects.get(id=candidate['id'])
+    return None
+
+
+def run_job(job: UploadJob):
+    """
+    执行上传任务
+
+    已成功的文件不会重复上传；仍有失败文件且未超过 UPLOAD_JOB_MAX_ATTEMPTS 次时任务按随机指数退避回到等待状态，
+    否则任务完成并删除暂存文件，每个文件的结果保存在 results 中。
+    只保存仍由本次领取的任务，超时后被其他worker重新领取的任务不会被覆盖。
+
+    Args:
+        job: 已领取的任务
+    """
+    from .oss_service import oss_service
+
+    results = {result['index']: result for result in job.results}
+    pending = [(index, file) for index, file in enumerate(job.files) if not results.get(index, {}).get('success')]
+
+    try:
+        if not oss_service:
+            raise RuntimeError('OSS服务未初始化')
+
+        for index, file in pending:
+            with open(file['path'], 'rb') as f:
+                result = oss_service.upload_file(
+                    file_content=f,
+                    filename=file['filename'],
+                    folder=job.folder
+                )
+            result['index'] = index
+            result['original_filename'] = file['filename']
+            results[index] = result
+            record_image(job.user, result, job.folder, file.get('image_info'))
+        error = ''
+    except Exception as e:
+        logger.error(f"上传任务执行失败: {job.id}, {str(e)}")
+        error = str(e)
+
+    job.results = [results[index] for index in sorted(results)]
+    failed = len(job.files) - sum(1 for result in job.results if result.get('success'))
+    now = timezone.now()
+    if failed and job.attempts < getattr(settings, 'UPLOAD_JOB_MAX_ATTEMPTS', 3):
+        delay = backoff_delay(
+            job.attempts,
+            getattr(settings, 'UPLOAD_JOB_RETRY_BASE_DELAY', 5),
+            getattr(settings, 'UPLOAD_JOB_RETRY_MAX_DELAY', 300),
+        )
+        job.status = UploadJob.STATUS_PENDING
+        job.next_attempt_at = now + timedelta(seconds=delay)
+        job.started_at = None
+    else:
+        job.status = UploadJob.STATUS_FAILED if error else UploadJob.STATUS_COMPLETED
+        job.finished_at = now
+    job.error = error
+
+    saved = UploadJob.objects.filter(id=job.id, claim_token=job.claim_token).update(
+        results=job.results,
+        status=job.status,
+        next_attempt_at=job.next_attempt_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error,
+        claim_token=None,
+    )
+    if not saved:
+        logger.warning(f"上传任务已被其他worker重新领取，放弃本次结果: {job.id}")
+        return
+
+    if job.finished_at:
+        shutil.rmtree(get_spool_dir() / str(job.id), ignore_errors=True)
+        logger.info(f"上传任务完成: {job.id}, 失败{failed}个")
+
+
+def process_pending_jobs(limit: Optional[int] = None, worker: Optional[str] = None) -> int:
+    """
+    依次领取并执行等待中的任务
+
+    Args:
+        limit: 最多处理的任务数，None表示处理到队列为空
+        worker: worker标识
+
+    Returns:
+        处理的任务数
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job(worker)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def job_results(job: UploadJob, storage=None) -> List[dict]:
+    """
+    任务结果转换为与批量上传接口一致的格式
+
+    Args:
+        job: 上传任务
+        storage: 存储服务，传入时按对象key重新生成访问URL（私有模式下保存的签名URL可能已过期）
+
+    Returns:
+        每个文件的上传结果
+    """
+    results = []
+    for result in job.results:
+        if result.get('success'):
+            if storage is not None:
+                result = storage.refresh_urls(result)
+            results.append({
+                'success': True,
+                'file_url': result['file_url'],
+                'object_key': result['object_key'],
+                'original_filename': result['original_filename'],
+                'size': result['size'],
+                'deduplicated': result.get('deduplicated', False),
+                'derivatives': result.get('derivatives', {}),
+            })
+        else:
+            results.append({
+                'success': False,
+                'original_filename': result['original_filename'],
+                'error': result.get('error', '上传失败')
+            })
+    return results
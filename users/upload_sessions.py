@@ -0,0 +1,280 @@
+"""
+断点续传上传会话
+
+客户端先创建会话，再按顺序 PUT 编号的分块，网络中断后查询已接收的字节数并从下一个分块继续，
+全部接收后调用完成接口，服务端校验图片文件头后把暂存文件交给存储层上传（超过阈值时自动分片上传）。
+分块暂存在 UPLOAD_SESSION_DIR，多台服务器部署时需要放在共享存储上；
+超过 UPLOAD_SESSION_EXPIRE 秒没有新分块的会话会过期，由 `python manage.py purge_upload_sessions` 清理。
+"""
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, IO
+import logging
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .image_records import record_image
+from .image_sniffing import validate_image_header, read_image_header
+from .models import UploadSession
+from .streaming import LimitedChunkReader, UploadTooLarge
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSessionError(Exception):
+    """上传会话操作失败，status_code 为对应的HTTP状态码"""
+
+    def __init__(self, message: str, status_code: int = 400, received: Optional[int] = None):
+        self.status_code = status_code
+        self.received = received
+        super().__init__(message)
+
+
+def get_session_dir() -> Path:
+    """分块暂存目录 UPLOAD_SESSION_DIR"""
+    return Path(getattr(settings, 'UPLOAD_SESSION_DIR', Path(settings.BASE_DIR) / 'upload_sessions'))
+
+
+def get_session_path(session: UploadSession) -> Path:
+    """会话的暂存文件路径"""
+    return get_session_dir() / f"{session.id}.part"
+
+
+def get_expire_delta() -> timedelta:
+    """会话在最后一个分块之后的有效期 UPLOAD_SESSION_EXPIRE"""
+    return timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_EXPIRE', 24 * 3600))
+
+
+def create_session(user, filename: str, folder: str, size: int) -> UploadSession:
+    """
+    创建上传会话并预先创建暂存文件
+
+    Args:
+        user: 上传用户
+        filename: 原始文件名
+        folder: 存储文件夹
+        size: 文件总大小
+
+    Returns:
+        创建的会话
+    """
+    session = UploadSession.objects.create(
+        user=user,
+        filename=filename,
+        folder=folder,
+        size=size,
+        chunk_size=getattr(settings, 'UPLOAD_SESSION_CHUNK_SIZE', 256 * 1024),
+        expires_at=timezone.now() + get_expire_delta(),
+    )
+    get_session_dir().mkdir(parents=True, exist_ok=True)
+    get_session_path(session).touch()
+    logger.info(f"创建上传会话: {session.id}, {filename}, {size}字节")
+    return session
+
+
+def get_active_session(user, session_id) -> UploadSession:
+    """
+    获取用户未过期的会话
+
+    Raises:
+        UploadSessionError: 会话不存在（404）或已过期（410）
+    """
+    session = UploadSession.objects.filter(id=session_id, user=user).first()
+    if session is None:
+        raise UploadSessionError('上传会话不存在', status_code=404)
+    if session.status != UploadSession.STATUS_COMPLETED and session.expires_at <= timezone.now():
+        raise UploadSessionError('上传会话已过期', status_code=410)
+    session.user = user
+    return session
+
+
+def write_chunk(session: UploadSession, index: int, stream: IO, content_length: Optional[int]) -> int:
+    """
+    写入一个分块
+
+    分块必须按顺序上传：第 index 块从 index * chunk_size 开始，除最后一块外长度都等于 chunk_size。
+    已经接收过的分块直接返回（客户端没收到响应而重发时不会重复写入）。
+    请求体先完整接收到临时文件，再用条件UPDATE领取该分块的写入位置（chunk_claimed_at），
+    只有领取到的请求写入暂存文件并推进已接收字节数；并发重发同一分块时其他请求不会写入暂存文件，
+    也就不会截断或覆盖已经写入的数据。领取超过 UPLOAD_SESSION_CHUNK_TIMEOUT 秒视为处理进程已退出，可以重新领取。
+
+    Args:
+        session: 上传会话
+        index: 分块编号，从0开始
+        stream: 请求体数据流
+        content_length: 请求的 Content-Length
+
+    Returns:
+        写入后已接收的字节数
+
+    Raises:
+        UploadSessionError: 会话状态、分块编号或分块长度不正确，或同一分块正在写入
+    """
+    if session.status != UploadSession.STATUS_ACTIVE:
+        raise UploadSessionError('上传会话已完成', status_code=409, received=session.received)
+
+    offset = index * session.chunk_size
+    if offset >= session.size:
+        raise UploadSessionError('分块编号超出文件大小', received=session.received)
+    if offset < session.received:
+        return session.received
+    if offset > session.received:
+        raise UploadSessionError('分块顺序错误，请从已接收的位置继续上传', status_code=409, received=session.received)
+
+    expected = min(session.chunk_size, session.size - offset)
+    if content_length != expected:
+        raise UploadSessionError(f"分块大小错误，应为{expected}字节", received=session.received)
+
+    chunk_size = getattr(settings, 'OSS_STREAM_CHUNK_SIZE', 64 * 1024)
+    reader = LimitedChunkReader(stream, max_size=expected, chunk_size=chunk_size)
+    with tempfile.SpooledTemporaryFile(max_size=expected, dir=get_session_dir()) as buffer:
+        try:
+            for data in reader:
+                buffer.write(data)
+        except UploadTooLarge:
+            raise UploadSessionError(f"分块大小错误，应为{expected}字节", received=session.received)
+        if reader.bytes_read != expected:
+            raise UploadSessionError('分块数据不完整', received=session.received)
+
+        claimed_at = timezone.now()
+        stale_before = claimed_at - timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_CHUNK_TIMEOUT', 60))
+        claimed = UploadSession.objects.filter(
+            Q(chunk_claimed_at__isnull=True) | Q(chunk_claimed_at__lt=stale_before),
+            id=session.id,
+            status=UploadSession.STATUS_ACTIVE,
+            received=offset,
+        ).update(chunk_claimed_at=claimed_at)
+        if not claimed:
+            session.refresh_from_db(fields=['received'])
+            if session.received > offset:
+                return session.received
+            raise UploadSessionError('分块正在写入，请稍后重试', status_code=409, received=session.received)
+
+        owned = UploadSession.objects.filter(id=session.id, received=offset, chunk_claimed_at=claimed_at)
+        received = offset + expected
+        try:
+            buffer.seek(0)
+            with open(get_session_path(session), 'r+b') as f:
+                f.seek(offset)
+                shutil.copyfileobj(buffer, f, chunk_size)
+                # 丢弃之前中断的写入留下的多余数据
+                f.truncate(received)
+        except FileNotFoundError:
+            owned.update(chunk_claimed_at=None)
+            raise UploadSessionError('上传会话已过期', status_code=410)
+        except Exception:
+            owned.update(chunk_claimed_at=None)
+            raise
+
+    updated = owned.update(
+        received=received,
+        chunk_claimed_at=None,
+        expires_at=timezone.now() + get_expire_delta(),
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        session.refresh_from_db(fields=['received'])
+        return session.received
+    session.received = received
+    return received
+
+
+def complete_session(session: UploadSession, storage) -> Dict[str, Any]:
+    """
+    全部分块接收完成后校验图片、上传并记录图片
+
+    已完成的会话直接返回保存的上传结果，客户端重复调用是安全的；
+    合并中超过 UPLOAD_SESSION_COMPLETE_TIMEOUT 秒的会话可以重新调用完成接口。
+
+    Args:
+        session: 上传会话
+        storage: 存储服务
+
+    Returns:
+        upload_file 的上传结果
+
+    Raises:
+        UploadSessionError: 分块未接收完整、正在合并或图片无效
+    """
+    if session.status == UploadSession.STATUS_COMPLETED:
+        return storage.refresh_urls(session.result)
+    if session.received < session.size:
+        raise UploadSessionError('分块尚未全部上传', status_code=409, received=session.received)
+
+    # 合并中超过 UPLOAD_SESSION_COMPLETE_TIMEOUT 秒的会话视为处理进程已退出，可以重新领取；
+    # 领取时写入的 updated_at 作为本次领取的标识，之后的状态更新只在仍由本次领取时生效
+    claimed_at = timezone.now()
+    stale_before = claimed_at - timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_COMPLETE_TIMEOUT', 300))
+    claimed = UploadSession.objects.filter(
+        Q(status=UploadSession.STATUS_ACTIVE) | Q(status=UploadSession.STATUS_COMPLETING, updated_at__lt=stale_before),
+        id=session.id,
+    ).update(status=UploadSession.STATUS_COMPLETING, updated_at=claimed_at)
+    if not claimed:
+        raise UploadSessionError('上传会话正在合并，请稍后查询', status_code=409, received=session.received)
+    owned = UploadSession.objects.filter(id=session.id, status=UploadSession.STATUS_COMPLETING, updated_at=claimed_at)
+
+    path = get_session_path(session)
+    result = None
+    try:
+        with open(path, 'rb') as f:
+            image_info = validate_image_header(read_image_header(f))
+            result = storage.upload_file(
+                file_content=f,
+                filename=session.filename,
+                folder=session.folder
+            )
+    finally:
+        if result is not None and result.get('success'):
+            if owned.update(status=UploadSession.STATUS_COMPLETED, result=result, updated_at=timezone.now()):
+                session.status = UploadSession.STATUS_COMPLETED
+                session.result = result
+                path.unlink(missing_ok=True)
+                record_image(session.user, result, session.folder, image_info)
+                logger.info(f"上传会话完成: {session.id}, {result['object_key']}")
+            else:
+                # 超时后已被其他请求重新领取，由该请求完成会话，撤销本次上传
+                logger.warning(f"上传会话已被重新领取，撤销本次上传: {session.id}")
+                storage.delete_file(result['object_key'])
+                result = None
+        else:
+            # 校验或上传失败时回到上传中状态，客户端可以重新调用完成接口
+            owned.update(status=UploadSession.STATUS_ACTIVE)
+    if result is None:
+        raise UploadSessionError('上传会话正在合并，请稍后查询', status_code=409, received=session.received)
+    return result
+
+
+def abort_session(session: UploadSession):
+    """取消会话并删除暂存文件"""
+    get_session_path(session).unlink(missing_ok=True)
+    session.delete()
+
+
+def purge_expired_sessions(batch_size: int = 500) -> int:
+    """
+    删除过期的未完成会话及其暂存文件，以及过期的已完成会话记录
+
+    Args:
+        batch_size: 每批删除的会话数
+
+    Returns:
+        删除的会话数
+    """
+    purged = 0
+    now = timezone.now()
+    while True:
+        sessions = list(UploadSession.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not sessions:
+            return purged
+        for session_id in sessions:
+            try:
+                os.remove(get_session_dir() / f"{session_id}.part")
+            except FileNotFoundError:
+                pass
+        UploadSession.objects.filter(id__in=sessions).delete()
+        purged += len(sessions)
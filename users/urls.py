@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, aio_views
 
 app_name = 'users'
 
@@ -12,5 +12,23 @@ urlpatterns = [
     path('upload-images/', views.BatchImageUploadView.as_view(), name='upload-images'),
     path('upload-binary-image/', views.BinaryImageUploadView.as_view(), name='upload-binary-image'),
     path('upload-raw-binary-image/', views.RawBinaryImageUploadView.as_view(), name='upload-raw-binary-image'),
+    path('images/', views.ImageListView.as_view(), name='images'),
     path('delete-image/', views.DeleteImageView.as_view(), name='delete-image'),
+    path('delete-images/', views.BatchDeleteImageView.as_view(), name='delete-images'),
+    path('direct-upload/', views.DirectUploadView.as_view(), name='direct-upload'),
+    path('direct-upload/confirm/', views.DirectUploadConfirmView.as_view(), name='direct-upload-confirm'),
+    path('upload-sessions/', views.UploadSessionView.as_view(), name='upload-sessions'),
+    path('upload-sessions/<uuid:session_id>/', views.UploadSessionDetailView.as_view(), name='upload-session'),
+    path('upload-sessions/<uuid:session_id>/chunks/<int:index>/', views.UploadSessionChunkView.as_view(), name='upload-session-chunk'),
+    path('upload-sessions/<uuid:session_id>/complete/', views.UploadSessionCompleteView.as_view(), name='upload-session-complete'),
+    path('upload-jobs/<uuid:job_id>/', views.UploadJobStatusView.as_view(), name='upload-job'),
+    path('oss/circuit-status/', views.OSSCircuitStatusView.as_view(), name='oss-circuit-status'),
+
+    # 异步上传接口（ASGI部署时使用）
+    path('aio/upload-image/', aio_views.AsyncImageUploadView.as_view(), name='aio-upload-image'),
+    path('aio/upload-images/', aio_views.AsyncBatchImageUploadView.as_view(), name='aio-upload-images'),
+    path('aio/upload-binary-image/', aio_views.AsyncBinaryImageUploadView.as_view(), name='aio-upload-binary-image'),
+    path('aio/upload-raw-binary-image/', aio_views.AsyncRawBinaryImageUploadView.as_view(), name='aio-upload-raw-binary-image'),
+    path('aio/delete-image/', aio_views.AsyncDeleteImageView.as_view(), name='aio-delete-image'),
+    path('aio/delete-images/', aio_views.AsyncBatchDeleteImageView.as_view(), name='aio-delete-images'),
 ] 
\ No newline at end of file
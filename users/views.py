@@ -2,18 +2,29 @@ from django.shortcuts import render
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework import parsers
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
-from .serializers import SendSmsCodeSerializer, LoginSerializer, UserProfileSerializer, ImageUploadSerializer, BatchImageUploadSerializer, BinaryImageUploadSerializer, RawBinaryImageUploadSerializer
+from .serializers import SendSmsCodeSerializer, LoginSerializer, UserProfileSerializer, ImageUploadSerializer, BatchImageUploadSerializer, BinaryImageUploadSerializer, RawBinaryImageUploadSerializer, BatchDeleteImageSerializer, DirectUploadSerializer, DirectUploadConfirmSerializer, ImageListQuerySerializer, UploadedImageSerializer, UploadSessionSerializer
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import traceback
 import logging
 from django.conf import settings
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.utils import timezone
+from django.urls import reverse
 from rest_framework_simplejwt.tokens import RefreshToken
-from .oss_service import oss_service
+from .oss_service import oss_service, oss_circuit_breaker
+from .storage import DirectUploadNotSupported
+from .models import DirectUpload, UploadJob, UploadSession, User
+from .upload_jobs import create_upload_job, job_results
+from .upload_sessions import UploadSessionError, create_session, get_active_session, write_chunk, complete_session, abort_session
+from .image_sniffing import InvalidImage, validate_image_header, sniff_image, get_sniff_bytes
+from .image_records import NOT_OWNED_ERROR, DELETING_ERROR, InvalidCursor, record_image, record_images, delete_images, list_images
+from .streaming import LimitedChunkReader, UploadTooLarge
+from .throttling import SmsRateThrottle, SmsIpRateThrottle, SmsPhoneRateThrottle
+from .token_revocation import revoke_token, is_token_revoked
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +33,17 @@ logger = logging.getLogger(__name__)
 class SendSmsCodeView(APIView):
     """发送验证码视图"""
     permission_classes = [AllowAny]
+    throttle_classes = [SmsIpRateThrottle, SmsPhoneRateThrottle]
+
+    def check_throttles(self, request):
+        """任一限流拒绝请求时，撤回其他限流已经计入的本次请求，被拒绝的请求不占用任何配额"""
+        throttles = self.get_throttles()
+        durations = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, self)]
+        if durations:
+            for throttle in throttles:
+                if isinstance(throttle, SmsRateThrottle):
+                    throttle.undo()
+            self.throttled(request, max((duration for duration in durations if duration is not None), default=None))
 
     @swagger_auto_schema(
         operation_description="发送手机验证码",
@@ -45,6 +67,7 @@ class SendSmsCodeView(APIView):
                 ),
             ),
             400: "请求参数错误",
+            429: "发送过于频繁，请稍后再试",
         },
     )
     def post(self, request):
@@ -177,6 +200,14 @@ class LoginView(APIView):
 
     def delete(self, request):
         """登出视图"""
+        # 撤销 refresh token，登出后不能再用它换取新的 access token
+        refresh_token = request.COOKIES.get(settings.SIMPLE_JWT['AUTH_COOKIE_REFRESH'])
+        if refresh_token:
+            try:
+                revoke_token(RefreshToken(refresh_token))
+            except TokenError:
+                pass
+
         response = Response({'message': '登出成功'})
         
         # 清除认证 cookie
@@ -216,10 +247,18 @@ class RefreshTokenView(APIView):
             # 使用 refresh token 获取新的 access token
             try:
                 refresh = RefreshToken(refresh_token)
+                if is_token_revoked(refresh):
+                    raise TokenError('刷新令牌已被撤销')
                 access_token = str(refresh.access_token)
                 
                 # 如果需要刷新 refresh token
                 if settings.SIMPLE_JWT.get('ROTATE_REFRESH_TOKENS', False):
+                    # 撤销旧令牌，同一个 refresh token 并发刷新时只有一个请求成功
+                    if settings.SIMPLE_JWT.get('BLACKLIST_AFTER_ROTATION', False) and not revoke_token(refresh):
+                        raise TokenError('刷新令牌已被使用')
+                    refresh.set_jti()
+                    refresh.set_exp()
+                    refresh.set_iat()
                     refresh_token = str(refresh)
                 
                 response = Response({
@@ -285,7 +324,9 @@ class ProfileView(APIView):
     def post(self, request):
         """使用POST方法更新用户资料"""
         try:
-            serializer = UserProfileSerializer(request.user, data=request.data, partial=True)
+            # request.user 来自认证缓存，可能不是最新数据，修改前从数据库重新读取
+            user = User.objects.get(pk=request.user.pk)
+            serializer = UserProfileSerializer(user, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
                 return Response({
@@ -304,6 +345,18 @@ class ProfileView(APIView):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def upload_job_accepted(request, job):
+    """后台上传任务已提交的202响应"""
+    return Response({
+        'message': '上传任务已提交',
+        'data': {
+            'job_id': str(job.id),
+            'status': job.status,
+            'status_url': request.build_absolute_uri(reverse('users:upload-job', args=[job.id])),
+        }
+    }, status=status.HTTP_202_ACCEPTED)
+
+
 class ImageUploadView(APIView):
     """图片上传视图"""
     permission_classes = [IsAuthenticated]
@@ -329,6 +382,7 @@ class ImageUploadView(APIView):
         request_body=ImageUploadSerializer,
         responses={
             200: ImageUploadSerializer,
+            202: "已提交后台上传任务",
             400: "请求参数错误",
             401: "未认证或token已过期",
             500: "服务器内部错误",
@@ -356,17 +410,18 @@ class ImageUploadView(APIView):
             image = serializer.validated_data['image']
             folder = serializer.validated_data.get('folder', 'images')
 
-            # 读取文件内容
-            file_content = image.read()
+            if serializer.validated_data.get('async_upload'):
+                return upload_job_accepted(request, create_upload_job(request.user, [image], folder))
 
-            # 上传到OSS
+            # 上传到OSS（直接传入文件对象，大文件自动分片上传）
             result = oss_service.upload_file(
-                file_content=file_content,
+                file_content=image,
                 filename=image.name,
                 folder=folder
             )
 
             if result.get('success'):
+                record_image(request.user, result, folder, getattr(image, 'image_info', None))
                 return Response({
                     'message': '图片上传成功',
                     'data': {
@@ -374,6 +429,8 @@ class ImageUploadView(APIView):
                         'object_key': result['object_key'],
                         'original_filename': result['original_filename'],
                         'size': result['size'],
+                        'deduplicated': result.get('deduplicated', False),
+                        'derivatives': result.get('derivatives', {}),
                     }
                 })
             else:
@@ -417,6 +474,7 @@ class BatchImageUploadView(APIView):
         request_body=BatchImageUploadSerializer,
         responses={
             200: BatchImageUploadSerializer,
+            202: "已提交后台上传任务",
             400: "请求参数错误",
             401: "未认证或token已过期",
             500: "服务器内部错误",
@@ -444,46 +502,38 @@ class BatchImageUploadView(APIView):
             images = serializer.validated_data['images']
             folder = serializer.validated_data.get('folder', 'images')
 
-            # 批量上传
+            if serializer.validated_data.get('async_upload'):
+                return upload_job_accepted(request, create_upload_job(request.user, images, folder))
+
+            # 批量上传（按 OSS_UPLOAD_CONCURRENCY 并发，结果保持原顺序）
+            upload_results = oss_service.upload_files(
+                [(image, image.name) for image in images],
+                folder=folder
+            )
+            record_images(request.user, zip(upload_results, [getattr(image, 'image_info', None) for image in images]), folder)
+
             results = []
             success_count = 0
             failed_count = 0
 
-            for image in images:
-                try:
-                    # 读取文件内容
-                    file_content = image.read()
-
-                    # 上传到OSS
-                    result = oss_service.upload_file(
-                        file_content=file_content,
-                        filename=image.name,
-                        folder=folder
-                    )
-
-                    if result.get('success'):
-                        success_count += 1
-                        results.append({
-                            'success': True,
-                            'file_url': result['file_url'],
-                            'object_key': result['object_key'],
-                            'original_filename': result['original_filename'],
-                            'size': result['size'],
-                        })
-                    else:
-                        failed_count += 1
-                        results.append({
-                            'success': False,
-                            'original_filename': image.name,
-                            'error': result.get('error', '上传失败')
-                        })
-
-                except Exception as e:
+            for result in upload_results:
+                if result.get('success'):
+                    success_count += 1
+                    results.append({
+                        'success': True,
+                        'file_url': result['file_url'],
+                        'object_key': result['object_key'],
+                        'original_filename': result['original_filename'],
+                        'size': result['size'],
+                        'deduplicated': result.get('deduplicated', False),
+                        'derivatives': result.get('derivatives', {}),
+                    })
+                else:
                     failed_count += 1
                     results.append({
                         'success': False,
-                        'original_filename': image.name,
-                        'error': str(e)
+                        'original_filename': result['original_filename'],
+                        'error': result.get('error', '上传失败')
                     })
 
             return Response({
@@ -529,6 +579,8 @@ class DeleteImageView(APIView):
             ),
             400: "请求参数错误",
             401: "未认证或token已过期",
+            404: "图片不存在或不属于当前用户",
+            409: "图片正在被另一个请求删除",
             500: "服务器内部错误",
         },
     )
@@ -550,13 +602,23 @@ class DeleteImageView(APIView):
                     'error': 'object_key 参数不能为空'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # 删除文件
-            result = oss_service.delete_file(object_key)
+            # 删除文件（只释放当前用户持有的引用）
+            result = delete_images(request.user, [object_key], oss_service.delete_files)[0]
 
             if result.get('success'):
                 return Response({
                     'message': '图片删除成功'
                 })
+            elif result.get('error') == NOT_OWNED_ERROR:
+                return Response({
+                    'message': '图片不存在',
+                    'error': NOT_OWNED_ERROR
+                }, status=status.HTTP_404_NOT_FOUND)
+            elif result.get('error') == DELETING_ERROR:
+                return Response({
+                    'message': '图片正在删除',
+                    'error': DELETING_ERROR
+                }, status=status.HTTP_409_CONFLICT)
             else:
                 return Response({
                     'message': '图片删除失败',
@@ -572,6 +634,91 @@ class DeleteImageView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class BatchDeleteImageView(APIView):
+    """批量删除图片视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="批量删除OSS中的图片（每1000个对象合并为一次OSS请求）",
+        request_body=BatchDeleteImageSerializer,
+        responses={
+            200: openapi.Response(
+                description="批量删除完成",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'message': openapi.Schema(type=openapi.TYPE_STRING),
+                        'data': openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'success_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'failed_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'results': openapi.Schema(
+                                    type=openapi.TYPE_ARRAY,
+                                    items=openapi.Schema(
+                                        type=openapi.TYPE_OBJECT,
+                                        properties={
+                                            'success': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                                            'object_key': openapi.Schema(type=openapi.TYPE_STRING),
+                                            'error': openapi.Schema(type=openapi.TYPE_STRING),
+                                        }
+                                    )
+                                ),
+                            }
+                        ),
+                    },
+                ),
+            ),
+            400: "请求参数错误",
+            401: "未认证或token已过期",
+            404: "图片不存在或不属于当前用户",
+            500: "服务器内部错误",
+        },
+    )
+    def delete(self, request):
+        """批量删除图片"""
+        try:
+            # 检查OSS服务是否可用
+            if not oss_service:
+                return Response({
+                    'message': 'OSS服务未初始化',
+                    'error': '请检查阿里云配置'
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            serializer = BatchDeleteImageSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            results = delete_images(request.user, serializer.validated_data['object_keys'], oss_service.delete_files)
+            if all(result.get('error') == NOT_OWNED_ERROR for result in results):
+                return Response({
+                    'message': '图片不存在',
+                    'error': NOT_OWNED_ERROR
+                }, status=status.HTTP_404_NOT_FOUND)
+            success_count = sum(1 for result in results if result['success'])
+            failed_count = len(results) - success_count
+
+            return Response({
+                'message': f'批量删除完成，成功{success_count}张，失败{failed_count}张',
+                'data': {
+                    'success_count': success_count,
+                    'failed_count': failed_count,
+                    'results': results
+                }
+            })
+
+        except Exception as e:
+            logger.error(f"批量删除图片时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return Response({
+                'message': '批量删除图片失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class BinaryImageUploadView(APIView):
     """二进制图片上传视图（支持Base64和原始二进制数据）"""
     permission_classes = [IsAuthenticated]
@@ -619,6 +766,7 @@ class BinaryImageUploadView(APIView):
             )
 
             if result.get('success'):
+                record_image(request.user, result, folder, sniff_image(bytes(image_bytes[:get_sniff_bytes()])))
                 return Response({
                     'message': '图片上传成功',
                     'data': {
@@ -626,6 +774,8 @@ class BinaryImageUploadView(APIView):
                         'object_key': result['object_key'],
                         'original_filename': result['original_filename'],
                         'size': result['size'],
+                        'deduplicated': result.get('deduplicated', False),
+                        'derivatives': result.get('derivatives', {}),
                     }
                 })
             else:
@@ -649,7 +799,7 @@ class RawBinaryImageUploadView(APIView):
     parser_classes = [parsers.MultiPartParser, parsers.FormParser, parsers.FileUploadParser]
 
     @swagger_auto_schema(
-        operation_description="直接上传原始二进制图片数据到阿里云OSS",
+        operation_description="直接上传原始二进制图片数据到阿里云OSS（application/octet-stream 请求体按块流式转发，不读入内存）",
         request_body=RawBinaryImageUploadSerializer,
         responses={
             200: RawBinaryImageUploadSerializer,
@@ -668,6 +818,10 @@ class RawBinaryImageUploadView(APIView):
                     'error': '请检查阿里云配置'
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+            # application/octet-stream 请求体按块读取并直接转发给OSS
+            if request.content_type == 'application/octet-stream':
+                return self.stream_upload(request)
+
             # 获取请求体中的二进制数据
             if hasattr(request, 'FILES') and request.FILES:
                 # 如果是multipart/form-data格式
@@ -723,15 +877,12 @@ class RawBinaryImageUploadView(APIView):
                     'message': '图片数据大小不能超过5MB'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # 验证是否为有效图片（可选）
+            # 验证是否为有效图片（只解析文件头）
             try:
-                from PIL import Image
-                import io
-                img = Image.open(io.BytesIO(image_data))
-                img.verify()
-            except Exception:
+                image_info = validate_image_header(image_data[:get_sniff_bytes()])
+            except InvalidImage as e:
                 return Response({
-                    'message': '无效的图片数据'
+                    'message': str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
 
             # 上传到OSS
@@ -740,28 +891,577 @@ class RawBinaryImageUploadView(APIView):
                 filename=filename,
                 folder=folder
             )
+            record_image(request.user, result, serializer.validated_data['folder'], image_info)
+            return self.upload_response(result)
 
-            if result.get('success'):
+        except Exception as e:
+            logger.error(f"原始二进制图片上传时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return Response({
+                'message': '图片上传失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def stream_upload(self, request):
+        """
+        流式上传 application/octet-stream 请求体
+
+        先根据 Content-Length 拒绝过大的请求，读取开头的 IMAGE_SNIFF_BYTES 字节校验图片文件头和像素数，
+        再把数据块边读边交给存储层，读取过程中超过大小限制时立即中止。
+        """
+        filename = request.GET.get('filename') or request.META.get('HTTP_X_FILENAME')
+        folder = request.GET.get('folder', 'images')
+        if not filename:
+            return Response({
+                'message': '缺少必要参数',
+                'error': 'filename 参数不能为空'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = RawBinaryImageUploadSerializer(data={
+            'filename': filename,
+            'folder': folder,
+            'content_type': request.content_type
+        })
+        if not serializer.is_valid():
+            return Response({
+                'message': '参数验证失败',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length <= 0 or request.stream is None:
+            return Response({
+                'message': '未找到图片数据',
+                'error': '请在请求体中提供图片的二进制数据'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        max_size = 5 * 1024 * 1024  # 5MB
+        if content_length > max_size:
+            return Response({
+                'message': '图片数据大小不能超过5MB'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        reader = LimitedChunkReader(
+            request.stream,
+            max_size=max_size,
+            chunk_size=getattr(settings, 'OSS_STREAM_CHUNK_SIZE', 64 * 1024)
+        )
+        try:
+            header = reader.read_header(min_size=get_sniff_bytes())
+        except UploadTooLarge:
+            return Response({
+                'message': '图片数据大小不能超过5MB'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            image_info = validate_image_header(header)
+        except InvalidImage as e:
+            return Response({
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        result = oss_service.upload_file(
+            file_content=reader,
+            filename=serializer.validated_data['filename'],
+            folder=serializer.validated_data['folder'],
+            size=content_length
+        )
+        if reader.exceeded:
+            return Response({
+                'message': '图片数据大小不能超过5MB'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        record_image(request.user, result, serializer.validated_data['folder'], image_info)
+        return self.upload_response(result)
+
+    @staticmethod
+    def upload_response(result):
+        """把上传结果转换为响应"""
+        if result.get('success'):
+            return Response({
+                'message': '图片上传成功',
+                'data': {
+                    'file_url': result['file_url'],
+                    'object_key': result['object_key'],
+                    'original_filename': result['original_filename'],
+                    'size': result['size'],
+                    'deduplicated': result.get('deduplicated', False),
+                    'derivatives': result.get('derivatives', {}),
+                }
+            })
+        return Response({
+            'message': '图片上传失败',
+            'error': result.get('error', '未知错误')
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class DirectUploadView(APIView):
+    """客户端直传OSS签名视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="获取直传OSS的签名URL（PUT）或表单policy（POST），客户端上传完成后调用确认接口",
+        request_body=DirectUploadSerializer,
+        responses={
+            200: openapi.Response(
+                description="签名生成成功",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'message': openapi.Schema(type=openapi.TYPE_STRING),
+                        'data': openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'object_key': openapi.Schema(type=openapi.TYPE_STRING, description='OSS对象键'),
+                                'method': openapi.Schema(type=openapi.TYPE_STRING, description='上传方式'),
+                                'upload_url': openapi.Schema(type=openapi.TYPE_STRING, description='上传地址'),
+                                'headers': openapi.Schema(type=openapi.TYPE_OBJECT, description='PUT上传必须携带的请求头'),
+                                'fields': openapi.Schema(type=openapi.TYPE_OBJECT, description='POST上传的表单字段'),
+                                'expires_in': openapi.Schema(type=openapi.TYPE_INTEGER, description='签名有效期（秒）'),
+                            },
+                        ),
+                    },
+                ),
+            ),
+            400: "请求参数错误",
+            401: "未认证或token已过期",
+            500: "服务器内部错误",
+            501: "当前存储后端不支持客户端直传",
+        },
+    )
+    def post(self, request):
+        """生成直传签名"""
+        try:
+            # 检查OSS服务是否可用
+            if not oss_service:
                 return Response({
-                    'message': '图片上传成功',
-                    'data': {
-                        'file_url': result['file_url'],
-                        'object_key': result['object_key'],
-                        'original_filename': result['original_filename'],
-                        'size': result['size'],
-                    }
-                })
-            else:
+                    'message': 'OSS服务未初始化',
+                    'error': '请检查阿里云配置'
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            serializer = DirectUploadSerializer(data=request.data)
+            if not serializer.is_valid():
                 return Response({
-                    'message': '图片上传失败',
-                    'error': result.get('error', '未知错误')
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            filename = serializer.validated_data['filename']
+            folder = serializer.validated_data.get('folder', 'images')
+            content_type = serializer.validated_data['content_type']
+
+            object_key = oss_service.generate_object_key(filename, folder)
+            upload = oss_service.create_direct_upload(
+                object_key,
+                content_type,
+                method=serializer.validated_data.get('method', 'PUT')
+            )
+
+            DirectUpload.objects.create(
+                user=request.user,
+                object_key=object_key,
+                filename=filename,
+                folder=folder,
+                content_type=content_type,
+                expires_at=timezone.now() + timedelta(seconds=upload['expires_in'])
+            )
+
+            return Response({
+                'message': '签名生成成功',
+                'data': {
+                    'object_key': object_key,
+                    **upload
+                }
+            })
+
+        except DirectUploadNotSupported as e:
+            logger.warning(f"生成直传签名失败: {str(e)}")
+            return Response({
+                'message': '当前存储后端不支持客户端直传',
+                'error': str(e)
+            }, status=status.HTTP_501_NOT_IMPLEMENTED)
+        except Exception as e:
+            logger.error(f"生成直传签名时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return Response({
+                'message': '生成直传签名失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class DirectUploadConfirmView(APIView):
+    """客户端直传完成确认视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="确认直传OSS已完成，校验对象存在且大小合法后记录上传",
+        request_body=DirectUploadConfirmSerializer,
+        responses={
+            200: "图片上传成功",
+            400: "请求参数错误或文件尚未上传",
+            401: "未认证或token已过期",
+            404: "上传记录不存在",
+            500: "服务器内部错误",
+        },
+    )
+    def post(self, request):
+        """确认直传完成"""
+        try:
+            # 检查OSS服务是否可用
+            if not oss_service:
+                return Response({
+                    'message': 'OSS服务未初始化',
+                    'error': '请检查阿里云配置'
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+            serializer = DirectUploadConfirmSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({
+                    'message': '参数验证失败',
+                    'errors': serializer.errors
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            object_key = serializer.validated_data['object_key']
+            upload = DirectUpload.objects.filter(user=request.user, object_key=object_key).first()
+            if not upload:
+                return Response({
+                    'message': '上传记录不存在'
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            if upload.status != DirectUpload.STATUS_CONFIRMED:
+                size = oss_service.get_object_size(object_key)
+                if size is None:
+                    return Response({
+                        'message': '文件尚未上传'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                # PUT签名无法限制大小，确认时再次检查
+                max_size = getattr(settings, 'OSS_DIRECT_UPLOAD_MAX_SIZE', 5 * 1024 * 1024)
+                if size > max_size:
+                    oss_service.delete_file(object_key)
+                    upload.delete()
+                    return Response({
+                        'message': f'图片文件大小不能超过{max_size // (1024 * 1024)}MB'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                upload.status = DirectUpload.STATUS_CONFIRMED
+                upload.size = size
+                upload.confirmed_at = timezone.now()
+                upload.save(update_fields=['status', 'size', 'confirmed_at'])
+                record_image(request.user, {
+                    'success': True,
+                    'object_key': object_key,
+                    'original_filename': upload.filename,
+                    'size': size,
+                }, upload.folder)
+
+            return Response({
+                'message': '图片上传成功',
+                'data': {
+                    'file_url': oss_service.get_file_url(object_key),
+                    'object_key': object_key,
+                    'original_filename': upload.filename,
+                    'size': upload.size,
+                }
+            })
+
         except Exception as e:
-            logger.error(f"原始二进制图片上传时发生错误: {str(e)}")
+            logger.error(f"确认直传时发生错误: {str(e)}")
             logger.error(f"错误详情: {traceback.format_exc()}")
             return Response({
-                'message': '图片上传失败',
+                'message': '确认直传失败',
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+class OSSCircuitStatusView(APIView):
+    """OSS熔断器状态视图（监控用）"""
+    permission_classes = [IsAdminUser]
+
+    @swagger_auto_schema(
+        operation_description="获取当前worker进程的OSS熔断器状态和调用计数",
+        responses={
+            200: "获取成功",
+            401: "未认证或token已过期",
+            403: "没有权限",
+        },
+    )
+    def get(self, request):
+        """获取熔断器状态"""
+        return Response({
+            'message': '获取成功',
+            'data': oss_circuit_breaker.snapshot()
+        })
+
+
+class UploadJobStatusView(APIView):
+    """后台上传任务状态视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="查询后台上传任务的状态和每个文件的上传结果",
+        responses={
+            200: "获取成功",
+            401: "未认证或token已过期",
+            404: "上传任务不存在",
+        },
+    )
+    def get(self, request, job_id):
+        """查询上传任务"""
+        job = UploadJob.objects.filter(id=job_id, user=request.user).first()
+        if not job:
+            return Response({
+                'message': '上传任务不存在'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        results = job_results(job, oss_service)
+        success_count = sum(1 for result in results if result['success'])
+        return Response({
+            'message': '获取成功',
+            'data': {
+                'job_id': str(job.id),
+                'status': job.status,
+                'total_count': len(job.files),
+                'success_count': success_count,
+                'failed_count': len(results) - success_count,
+                'results': results,
+                'error': job.error,
+                'attempts': job.attempts,
+                'created_at': job.created_at,
+                'started_at': job.started_at,
+                'finished_at': job.finished_at,
+            }
+        })
+
+
+class ImageListView(APIView):
+    """我的图片列表视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="按上传时间倒序分页获取当前用户上传的图片，使用 next_cursor 获取下一页",
+        query_serializer=ImageListQuerySerializer,
+        responses={
+            200: UploadedImageSerializer(many=True),
+            400: "请求参数错误",
+            401: "未认证或token已过期",
+        },
+    )
+    def get(self, request):
+        """获取图片列表"""
+        serializer = ImageListQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response({
+                'message': '参数验证失败',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            images, next_cursor = list_images(
+                request.user,
+                folder=serializer.validated_data.get('folder'),
+                cursor=serializer.validated_data.get('cursor'),
+                limit=serializer.validated_data['limit']
+            )
+        except InvalidCursor as e:
+            return Response({
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'message': '获取成功',
+            'data': {
+                'results': UploadedImageSerializer(images, many=True, context={'storage': oss_service}).data,
+                'next_cursor': next_cursor,
+            }
+        })
+
+
+def upload_session_data(request, session):
+    """上传会话的响应数据"""
+    return {
+        'session_id': str(session.id),
+        'status': session.status,
+        'size': session.size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': -(-session.size // session.chunk_size),
+        'received': session.received,
+        'next_chunk': -(-session.received // session.chunk_size),
+        'expires_at': session.expires_at,
+        'upload_url': request.build_absolute_uri(reverse('users:upload-session', args=[session.id])),
+    }
+
+
+def upload_session_error_response(error):
+    """上传会话错误的响应，带上已接收的字节数方便客户端继续上传"""
+    data = {'message': str(error)}
+    if error.received is not None:
+        data['received'] = error.received
+    return Response(data, status=error.status_code)
+
+
+class UploadSessionView(APIView):
+    """断点续传会话创建视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="创建断点续传上传会话，之后按 chunk_size 把文件分块 PUT 到 upload_url/chunks/<编号>/",
+        request_body=UploadSessionSerializer,
+        responses={
+            201: "会话创建成功",
+            400: "请求参数错误",
+            401: "未认证或token已过期",
+        },
+    )
+    def post(self, request):
+        """创建上传会话"""
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'message': '参数验证失败',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        session = create_session(
+            request.user,
+            filename=serializer.validated_data['filename'],
+            folder=serializer.validated_data['folder'],
+            size=serializer.validated_data['size']
+        )
+        return Response({
+            'message': '上传会话创建成功',
+            'data': upload_session_data(request, session)
+        }, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionDetailView(APIView):
+    """断点续传会话查询和取消视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="查询上传会话已接收的字节数，断线后从 next_chunk 继续上传",
+        responses={
+            200: "获取成功",
+            401: "未认证或token已过期",
+            404: "上传会话不存在",
+            410: "上传会话已过期",
+        },
+    )
+    def get(self, request, session_id):
+        """查询上传进度"""
+        try:
+            session = get_active_session(request.user, session_id)
+        except UploadSessionError as e:
+            return upload_session_error_response(e)
+
+        data = upload_session_data(request, session)
+        if session.status == UploadSession.STATUS_COMPLETED:
+            data['file_url'] = oss_service.get_file_url(session.result['object_key']) if oss_service else session.result['file_url']
+            data['object_key'] = session.result['object_key']
+        return Response({
+            'message': '获取成功',
+            'data': data
+        })
+
+    @swagger_auto_schema(
+        operation_description="取消上传会话并删除已上传的分块",
+        responses={
+            200: "取消成功",
+            401: "未认证或token已过期",
+            404: "上传会话不存在",
+        },
+    )
+    def delete(self, request, session_id):
+        """取消上传会话"""
+        session = UploadSession.objects.filter(id=session_id, user=request.user).first()
+        if not session:
+            return Response({
+                'message': '上传会话不存在'
+            }, status=status.HTTP_404_NOT_FOUND)
+        abort_session(session)
+        return Response({
+            'message': '上传会话已取消'
+        })
+
+
+class UploadSessionChunkView(APIView):
+    """断点续传分块上传视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="上传第 index 个分块（从0开始），请求体为分块的原始二进制数据（application/octet-stream）",
+        responses={
+            200: "分块上传成功",
+            400: "分块大小错误",
+            401: "未认证或token已过期",
+            404: "上传会话不存在",
+            409: "分块顺序错误，响应中的 received 为已接收的字节数",
+            410: "上传会话已过期",
+        },
+    )
+    def put(self, request, session_id, index):
+        """上传分块"""
+        try:
+            session = get_active_session(request.user, session_id)
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                content_length = None
+            received = write_chunk(session, index, request.stream, content_length)
+        except UploadSessionError as e:
+            return upload_session_error_response(e)
+
+        return Response({
+            'message': '分块上传成功',
+            'data': {
+                'received': received,
+                'next_chunk': -(-received // session.chunk_size),
+                'completed': received >= session.size,
+            }
+        })
+
+
+class UploadSessionCompleteView(APIView):
+    """断点续传完成视图"""
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="全部分块上传后校验图片并上传到OSS，重复调用返回同一结果",
+        responses={
+            200: "图片上传成功",
+            400: "图片无效",
+            401: "未认证或token已过期",
+            404: "上传会话不存在",
+            409: "分块尚未全部上传",
+            410: "上传会话已过期",
+            500: "服务器内部错误",
+        },
+    )
+    def post(self, request, session_id):
+        """完成上传"""
+        try:
+            # 检查OSS服务是否可用
+            if not oss_service:
+                return Response({
+                    'message': 'OSS服务未初始化',
+                    'error': '请检查阿里云配置'
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            session = get_active_session(request.user, session_id)
+            result = complete_session(session, oss_service)
+            return RawBinaryImageUploadView.upload_response(result)
+
+        except UploadSessionError as e:
+            return upload_session_error_response(e)
+        except InvalidImage as e:
+            return Response({
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"完成分块上传时发生错误: {str(e)}")
+            logger.error(f"错误详情: {traceback.format_exc()}")
+            return Response({
+                'message': '图片上传失败',
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)